@@ -1,57 +1,97 @@
-import pickle
-import time
-from dimod import ConstrainedQuadraticModel, Binary
+from dimod import ConstrainedQuadraticModel, SampleSet
+from Local_Annealer import LocalAnnealer, LocalPolyAnnealer
+from Instrumentation import stage
+from Results_Store import ResultsStore
 
-def annealer(bqm):
-    cqm = ConstrainedQuadraticModel().from_bqm(bqm)
+def annealer(bqm, gates, sampler='hybrid', profile=None, constraint_labels=False, verbose=False,
+             **sampler_parameters):
+    # sampler='local' anneals the BQM offline with LocalAnnealer (sampler_parameters are passed to it). The BQM
+    # carries the gate penalties, so its ground states are consistent; the gate variables of every local sample
+    # are set to their circuit values before the feasibility filter.
+    # constraint_labels names the constraints after their gate variables and prints them, verbose prints the BQM
+    if verbose:
+        print(bqm.to_polystring())
+        print(bqm.variables)
 
-    linear_variables = []
-    ancillary_variables = []
-    variables = []
+    with stage(profile, 'cqm_constraints') as entry:
+        cqm = create_cqm(bqm, gates, constraint_labels)
+        entry['constraints'] = len(cqm.constraints)
 
-    print(bqm.to_polystring())
-    print(bqm.variables)
+    print(f'{len(cqm.constraints)} constraints on {len(gates)} gate variables')
+    if constraint_labels:
+        for label, constraint in cqm.constraints.items():
+            print(f"Constraint '{label}': {constraint.lhs} {constraint.sense} {constraint.rhs}")
 
-    for var in bqm.variables:
-        variables.append(var)
-        if '*' in var:
-            ancillary_variables.append(var)
+    with stage(profile, 'sample') as entry:
+        if sampler == 'local':
+            local_samples = LocalAnnealer().sample(bqm, **sampler_parameters)
+            variables = list(local_samples.variables)
+            sampleset = SampleSet.from_samples_cqm((gates.complete(local_samples.record.sample, variables),
+                                                    variables), cqm)
         else:
-            linear_variables.append(var)
+            api_token = '' # Insert your API token here
 
-    binary_variables = {var: Binary(var) for var in variables}
+            from dwave.system import LeapHybridCQMSampler
+            sampler = LeapHybridCQMSampler(token=api_token)
+            sampleset = sampler.sample_cqm(cqm)
+        entry['samples'] = len(sampleset)
 
-    for ancillary in ancillary_variables:
-        stripped_bit = ancillary.replace(' ', '')
-        base_bits = stripped_bit.split('*')
-        a = binary_variables[ancillary]
-        for bit in base_bits:
-            b = binary_variables[bit]
-            cqm.add_constraint(a - b <= 0, label=f'{ancillary} >= {bit}')
+    with stage(profile, 'filter') as entry:
+        filtered_samples = sampleset.filter(lambda row: row.is_feasible)
+        filtered_samples = filtered_samples.aggregate()
+        entry['unique_feasible_samples'] = len(filtered_samples)
 
-        sum_base_bits = sum(binary_variables[base_bit] for base_bit in base_bits)
-        length_constraint = -1 * (len(base_bits) - 1)
-        cqm.add_constraint(a - sum_base_bits >= length_constraint, label=f'{ancillary} >= {base_bits}')
+    return filtered_samples
 
-    # Print all constraints
-    for label, constraint in cqm.constraints.items():
-        print(f"Constraint '{label}': {constraint.lhs} {constraint.sense} {constraint.rhs}")
 
-    api_token = '' # Insert your API token here
+def hubo_annealer(polynomial, profile=None, verbose=False, **sampler_parameters):
+    # Anneals the higher-order polynomial offline with LocalPolyAnnealer. The polynomial is over the free
+    # qubits only, so there are no constraints and every sample is feasible
+    if verbose:
+        print(polynomial)
 
-    from dwave.system import LeapHybridCQMSampler
-    sampler = LeapHybridCQMSampler(token=api_token)
-    sampleset = sampler.sample_cqm(cqm)
+    with stage(profile, 'sample') as entry:
+        sampleset = LocalPolyAnnealer().sample_poly(polynomial, **sampler_parameters).aggregate()
+        entry['samples'] = len(sampleset)
 
-    filtered_samples = sampleset.filter(lambda row: row.is_feasible)
-    filtered_samples = filtered_samples.aggregate()
+    return sampleset
 
-    print(filtered_samples.record.sample)
-    print(filtered_samples.record.num_occurrences)
-    print(filtered_samples.record.energy)
 
-    # Pickle the filtered samples
-    with open(f'Results/Samples_{int(time.time())}.pkl', 'wb') as f:
-        pickle.dump(filtered_samples, f)
+def save_samples(samples, name='Samples', store=None, **metadata):
+    # Prints the samples and stores them as a new run of the results store (Results_Store.py), metadata
+    # goes to its catalog. Returns the run id
+    print(samples.record.sample)
+    print(samples.record.num_occurrences)
+    print(samples.record.energy)
 
-    return filtered_samples
+    return (store or ResultsStore()).save(samples, name, **metadata)
+
+
+def create_cqm(bqm, gates, labels=False):
+    """
+    CQM of the BQM objective plus one equality constraint per gate variable.
+
+    Every gate variable g is constrained to its circuit, g - R == c with R the definition of
+    the gate over its inputs (at most quadratic) and c its constant term. The constraints are
+    added one add_constraint_from_iterable call per gate, from the term lists of
+    GateTable.constraints, without symbolic expressions.
+
+    Parameters
+    ----------
+    bqm : dimod.BinaryQuadraticModel
+        Model over the free qubits and the gate variables of gates.
+    gates : QUBO.Gate_Table.GateTable
+        Gate variables of bqm, from the same build.
+    labels : bool
+        Name the constraints after their gate variable; by default dimod assigns short
+        generated labels.
+
+    Returns
+    -------
+    dimod.ConstrainedQuadraticModel
+        The constrained model.
+    """
+    cqm = ConstrainedQuadraticModel().from_bqm(bqm)
+    for label, terms, rhs in gates.constraints():
+        cqm.add_constraint_from_iterable(terms, '==', rhs, label=label if labels else None)
+    return cqm
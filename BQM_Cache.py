@@ -0,0 +1,324 @@
+"""
+Content-addressed on-disk cache of compiled BQMs and their gate tables.
+
+Entries are keyed by a SHA-256 over everything that determines the compiled model: the
+encoded sequence, lattice type, energy model, penalty, compile strength, build mode and a
+digest of the builder sources (the code version). A change to any builder therefore misses
+instead of returning a stale model. The cache is bounded in bytes and evicts the least
+recently used entries first. Hit/miss counts persist in the index next to the entries.
+Index updates hold a file lock and re-read the index, so pool workers can share a cache.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process use only
+    fcntl = None
+
+from Energy import encode_sequence
+from Instrumentation import stage, bqm_sizes, polynomial_sizes
+from QUBO import Parametric_QUBO
+from QUBO.BitOps_QUBO import DEFAULT_ADDER, adder_scope
+from QUBO.Direct_BQM import compile_bqm, compile_polynomial, expand_polynomial, free_qubits, qubit_label
+
+CACHE_DIRECTORY = 'Cache'
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+
+# Sources whose contents decide the compiled BQM
+SOURCE_FILES = [
+    'Energy.py',
+    'Lattices.py',
+    'QUBO/BitOps_QUBO.py',
+    'QUBO/HCOMB4_QUBO.py',
+    'QUBO/HCOMB6_QUBO.py',
+    'QUBO/HCOMB8_QUBO.py',
+    'QUBO/HCOMB12_QUBO.py',
+    'QUBO/Direct_BQM.py',
+    'QUBO/Gate_Table.py',
+    'QUBO/Parametric_QUBO.py',
+]
+
+
+def code_version():
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for source_file in SOURCE_FILES:
+        with open(os.path.join(root, source_file), 'rb') as f:
+            digest.update(source_file.encode())
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_key(sequence, energy_model, lattice_type, penalty, compile_strength, build_mode='pyqubo'):
+    """
+    Content address of a compiled BQM.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence. Sequences with the same encoding share an entry.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    penalty : float
+        Constraint penalty of the build.
+    compile_strength : float
+        Strength passed to model.compile().
+    build_mode : str
+        Builder that produced the BQM (e.g. 'pyqubo', 'pyqubo_shared', 'direct', 'parametric_tree').
+
+    Returns
+    -------
+    str
+        Hex digest of the key fields.
+    """
+    fields = {
+        'encoded_sequence': encode_sequence(sequence, energy_model),
+        'energy_model': energy_model,
+        'lattice_type': int(lattice_type),
+        'penalty': float(penalty),
+        'compile_strength': float(compile_strength),
+        'build_mode': build_mode,
+        'code_version': code_version(),
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+class BQMCache:
+    """
+    Size-bounded LRU cache of pickled (BQM, GateTable) entries in a directory.
+
+    Parameters
+    ----------
+    directory : str
+        Directory holding the entries and the index.
+    max_bytes : int
+        Upper bound on the total size of the stored entries.
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index = self.load_index()
+
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def load_index(self):
+        if os.path.exists(self.index_path()):
+            with open(self.index_path()) as f:
+                return json.load(f)
+        return {'entries': {}, 'hits': 0, 'misses': 0}
+
+    def save_index(self):
+        # Write then rename so an interrupted run never leaves a truncated index
+        temporary_path = f'{self.index_path()}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(temporary_path, self.index_path())
+
+    @contextmanager
+    def locked(self):
+        # Serialize index updates between processes and pick up their changes first
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.index = self.load_index()
+                yield self.index
+                self.save_index()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, key):
+        with self.locked() as index:
+            entries = index['entries']
+            if key in entries and os.path.exists(self.entry_path(key)):
+                with open(self.entry_path(key), 'rb') as f:
+                    bqm = pickle.load(f)
+                entries[key]['last_access'] = time.time()
+                index['hits'] += 1
+                return bqm
+
+            entries.pop(key, None)
+            index['misses'] += 1
+            return None
+
+    def put(self, key, bqm, metadata=None):
+        temporary_path = f'{self.entry_path(key)}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(bqm, f)
+        os.replace(temporary_path, self.entry_path(key))
+        with self.locked() as index:
+            index['entries'][key] = {
+                'size': os.path.getsize(self.entry_path(key)),
+                'last_access': time.time(),
+                'metadata': metadata or {},
+            }
+            self.evict(keep=key)
+
+    def get_or_build(self, key, build, metadata=None):
+        bqm = self.get(key)
+        if bqm is None:
+            bqm = build()
+            self.put(key, bqm, metadata)
+        return bqm
+
+    def evict(self, keep=None):
+        entries = self.index['entries']
+        total_bytes = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_access']):
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total_bytes -= entries[key]['size']
+            if os.path.exists(self.entry_path(key)):
+                os.remove(self.entry_path(key))
+            del entries[key]
+
+    def stats(self):
+        lookups = self.index['hits'] + self.index['misses']
+        return {
+            'hits': self.index['hits'],
+            'misses': self.index['misses'],
+            'hit_rate': self.index['hits'] / lookups if lookups else 0.0,
+            'entries': len(self.index['entries']),
+            'bytes': sum(entry['size'] for entry in self.index['entries'].values()),
+        }
+
+
+def get_build_mode(shared_registers=False, direct=False, parametric=False, signed_displacements=False,
+                   adder=DEFAULT_ADDER):
+    if direct:
+        build_mode = 'direct'
+    elif parametric:
+        build_mode = 'parametric'
+    else:
+        build_mode = 'pyqubo'
+    if shared_registers:
+        build_mode += '_shared'
+    if signed_displacements:
+        build_mode += '_signed'
+    if adder != DEFAULT_ADDER:
+        build_mode += f'_{adder}'
+    return build_mode
+
+
+def build_bqm(sequence, energy_model, lattice_type, shared_registers=False, direct=False, parametric=False,
+              profile=None, adder=DEFAULT_ADDER, signed_displacements=False):
+    if direct or parametric:
+        with stage(profile, 'direct_compile' if direct else 'parametric_feed') as entry, adder_scope(adder):
+            if direct:
+                bqm, gates = compile_bqm(sequence, energy_model, lattice_type, shared_registers,
+                                         signed_displacements)
+            else:
+                bqm, gates = Parametric_QUBO.create_bqm(sequence, energy_model, lattice_type, shared_registers,
+                                                        signed_displacements)
+            entry.update(bqm_sizes(bqm))
+        return bqm, gates
+    builder = Parametric_QUBO.BUILDERS[lattice_type]
+    with adder_scope(adder):
+        model, bqm, qubo, ising, gates = builder.create_energy_function(sequence, energy_model, shared_registers,
+                                                                        profile=profile,
+                                                                        signed_displacements=signed_displacements)
+    return bqm, gates
+
+
+def build_polynomial(sequence, energy_model, lattice_type, shared_registers=False, direct=False, profile=None,
+                     adder=DEFAULT_ADDER, signed_displacements=False):
+    """
+    Higher-order binary polynomial of a sequence, the energy function before quadratization.
+
+    Parameters
+    ----------
+    sequence, energy_model, lattice_type, shared_registers, direct, profile, adder, signed_displacements
+        As in get_bqm. Polynomials are not cached.
+
+    Returns
+    -------
+    dimod.BinaryPolynomial
+        Binary polynomial over the free qubits, without gate variables.
+    """
+    if direct:
+        with stage(profile, 'direct_compile') as entry:
+            polynomial = compile_polynomial(sequence, energy_model, lattice_type,
+                                            shared_registers or signed_displacements)
+            entry.update(polynomial_sizes(polynomial))
+        return polynomial
+    builder = Parametric_QUBO.BUILDERS[lattice_type]
+    with adder_scope(adder):
+        objective, gates = builder.create_polynomial(sequence, energy_model, shared_registers, profile=profile,
+                                                     signed_displacements=signed_displacements)
+    with stage(profile, 'to_polynomial') as entry:
+        # The gate variables are set by their circuits, so the objective expands over the free qubits
+        labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+        polynomial = expand_polynomial(objective, gates, labels)
+        entry.update(polynomial_sizes(polynomial))
+    return polynomial
+
+
+def get_bqm(sequence, energy_model, lattice_type, shared_registers=False, direct=False, parametric=False,
+            cache=None, profile=None, adder=DEFAULT_ADDER, signed_displacements=False):
+    """
+    BQM of a sequence, read from the cache when present and built and stored otherwise.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    shared_registers, direct, parametric : bool
+        Build options, see main.py.
+    cache : BQMCache or None
+        Cache to use, None always builds.
+    profile : Instrumentation.Profile or None
+        Records the build stages (or the cache hit) when given.
+    adder : str
+        Population count construction of the direction sums ('cascade' or 'tree'). They build
+        different gate variables, so it is part of the build mode.
+    signed_displacements : bool
+        Compare one two's complement displacement per axis against constants, see main.py.
+
+    Returns
+    -------
+    bqm : dimod.BinaryQuadraticModel
+        The compiled model, gate penalties included.
+    gates : GateTable
+        The gate variables of the model.
+    """
+    if cache is None:
+        return build_bqm(sequence, energy_model, lattice_type, shared_registers, direct, parametric, profile, adder,
+                         signed_displacements)
+
+    builder = Parametric_QUBO.BUILDERS[lattice_type]
+    penalty = Parametric_QUBO.create_feed_dict(sequence, energy_model, lattice_type)['penalty']
+    build_mode = get_build_mode(shared_registers, direct, parametric, signed_displacements, adder)
+    key = cache_key(sequence, energy_model, lattice_type, penalty, builder.COMPILE_STRENGTH, build_mode)
+    metadata = {'sequence': sequence, 'energy_model': energy_model, 'lattice_type': lattice_type,
+                'build_mode': build_mode}
+    with stage(profile, 'cache_lookup') as entry:
+        built = cache.get(key)
+        entry['hit'] = built is not None
+    if built is None:
+        built = build_bqm(sequence, energy_model, lattice_type, shared_registers, direct, parametric, profile, adder,
+                          signed_displacements)
+        cache.put(key, built, metadata)
+    return built
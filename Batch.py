@@ -0,0 +1,284 @@
+"""
+Batch folding of many sequences from a FASTA or CSV file.
+
+Sequences are streamed from the input file and folded on a process pool sized to the
+machine, so the imports and interpreter start-up are paid once per worker instead of once
+per sequence. Every finished job is appended to a JSON Lines output file as soon as it
+completes, so partial results survive an interrupted run. Sequences with the same canonical
+key (see Canonical.py) are solved once and the result is mapped back onto each of them.
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from BQM_Cache import BQMCache, get_bqm
+from Canonical import canonical_form, reverse_conformations
+from Local_Annealer import LocalAnnealer
+from QUBO.BitOps_QUBO import ADDERS, DEFAULT_ADDER
+from QUBO.Direct_BQM import consistent_energies, free_qubits, qubit_label
+
+FASTA_EXTENSIONS = ('.fa', '.fasta', '.faa')
+NUM_READS = 100
+SOLVED_CACHE_SIZE = 1024
+
+
+def read_fasta(path):
+    name = None
+    chunks = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('>'):
+                if chunks:
+                    yield name, ''.join(chunks).upper()
+                name = line[1:].split()[0] if len(line) > 1 else None
+                chunks = []
+            else:
+                chunks.append(line)
+    if chunks:
+        yield name, ''.join(chunks).upper()
+
+
+def read_csv(path):
+    # Needs a 'sequence' column, an optional 'name' or 'id' column labels the rows
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        columns = {column.lower(): column for column in reader.fieldnames or []}
+        if 'sequence' not in columns:
+            raise ValueError(f'{path} has no sequence column.')
+        name_column = columns.get('name', columns.get('id'))
+        for row_number, row in enumerate(reader, start=1):
+            sequence = row[columns['sequence']].strip().upper()
+            if sequence:
+                yield (row[name_column] if name_column else str(row_number)), sequence
+
+
+def read_sequences(path):
+    """
+    Stream (name, sequence) pairs from a FASTA or CSV file.
+
+    Parameters
+    ----------
+    path : str
+        FASTA file (.fa, .fasta, .faa or any file starting with '>') or CSV file with a
+        'sequence' column.
+
+    Returns
+    -------
+    generator
+        (name, sequence) pairs in file order. Unnamed records are numbered from 1.
+    """
+    if path.lower().endswith(FASTA_EXTENSIONS):
+        records = read_fasta(path)
+    elif path.lower().endswith('.csv'):
+        records = read_csv(path)
+    else:
+        with open(path) as f:
+            first_character = f.read(1)
+        records = read_fasta(path) if first_character == '>' else read_csv(path)
+
+    for record_number, (name, sequence) in enumerate(records, start=1):
+        yield name or str(record_number), sequence
+
+
+def solve(bqm, gates, solver, num_reads=NUM_READS):
+    if solver == 'hybrid':
+        from Annealer import annealer
+        return annealer(bqm, gates)
+
+    # The BQM carries the gate penalties, the samples are ranked with consistent gate variables below
+    return LocalAnnealer().sample(bqm, num_reads=num_reads)
+
+
+def fold_sequence(job):
+    """
+    Build and solve one sequence. Runs in a pool worker.
+
+    Parameters
+    ----------
+    job : dict
+        name, sequence, energy_model, lattice_type, solver, num_reads, use_cache and the
+        build options of get_bqm.
+
+    Returns
+    -------
+    dict
+        The job description with the best energy (gate variables at their consistent values), its
+        conformation bitstring over the free move qubits, the build and solve times, and the
+        error message of a failed job.
+    """
+    result = {key: job[key] for key in ('name', 'sequence', 'energy_model', 'lattice_type', 'solver')}
+    try:
+        start = time.time()
+        cache = BQMCache() if job['use_cache'] else None
+        bqm, gates = get_bqm(job['sequence'], job['energy_model'], job['lattice_type'], job['shared_registers'],
+                             job['direct'], job['parametric'], cache, adder=job['adder'],
+                             signed_displacements=job['signed_displacements'])
+        result['build_seconds'] = time.time() - start
+
+        start = time.time()
+        samples = solve(bqm, gates, job['solver'], job['num_reads'])
+        result['solve_seconds'] = time.time() - start
+
+        # Rank the samples by their energy with consistent gate variables, a penalty-strength gate
+        # violation can otherwise look better than every valid assignment
+        labels = [qubit_label(t, q) for t, q in free_qubits(len(job['sequence']), job['lattice_type'])]
+        columns = [samples.variables.index(label) if label in samples.variables else None for label in labels]
+        bits = np.array([[row[column] if column is not None else 0 for column in columns]
+                         for row in samples.record.sample], dtype=np.int8)
+        energies = consistent_energies(bqm, gates, labels, bits)
+        best = int(np.argmin(energies))
+        result['best_energy'] = float(energies[best])
+        result['bitstring'] = ''.join(str(int(bit)) for bit in bits[best])
+        result['num_variables'] = len(bqm.variables)
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def run_batch(input_path, output_path, energy_model, lattice_type, solver='local', workers=None,
+              num_reads=NUM_READS, shared_registers=False, direct=False, parametric=False, use_cache=True,
+              adder=DEFAULT_ADDER, signed_displacements=False):
+    """
+    Fold every sequence of a file on a process pool and append the results as they finish.
+
+    Parameters
+    ----------
+    input_path : str
+        FASTA or CSV file of sequences.
+    output_path : str
+        JSON Lines file, opened in append mode. One line per sequence, in completion order. Lines
+        of sequences that reused an equivalent solve have reused set.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    solver : str
+        'local' for the built-in simulated annealer or 'hybrid' for the Leap hybrid CQM sampler.
+    workers : int or None
+        Pool size, the number of CPUs by default.
+    num_reads : int
+        Reads of the simulated annealer.
+    shared_registers, direct, parametric, use_cache, signed_displacements : bool
+        Build options, see main.py.
+    adder : str
+        Population count construction, see main.py.
+
+    Returns
+    -------
+    int
+        Number of sequences written.
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {'energy_model': energy_model, 'lattice_type': lattice_type, 'solver': solver,
+               'num_reads': num_reads, 'shared_registers': shared_registers, 'direct': direct,
+               'parametric': parametric, 'use_cache': use_cache, 'adder': adder,
+               'signed_displacements': signed_displacements}
+
+    written = 0
+    # Equivalent sequences share one solve: the most recent finished results by canonical key,
+    # and the (name, sequence, reversed) records waiting on each submitted key
+    solved = OrderedDict()
+    waiting = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(output_path, 'a') as output:
+        # Keep a bounded window of submitted jobs so huge inputs are never read into memory at once
+        pending = {}
+        for name, sequence in read_sequences(input_path):
+            try:
+                key, canonical_sequence, reverse = canonical_form(sequence, energy_model, lattice_type,
+                                                                  shared_registers or signed_displacements)
+            except ValueError as error:
+                # An invalid record (e.g. an unknown residue) fails alone, the batch goes on
+                result = {'name': name, 'sequence': sequence, 'energy_model': energy_model,
+                          'lattice_type': lattice_type, 'solver': solver,
+                          'error': f'{type(error).__name__}: {error}'}
+                written += write_results([result], output)
+                continue
+            record = (name, sequence, reverse)
+            if key in solved:
+                solved.move_to_end(key)
+                written += write_results([map_result(solved[key], record, lattice_type)], output)
+            elif key in waiting:
+                waiting[key].append(record)
+            else:
+                waiting[key] = [record]
+                job = {'name': name, 'sequence': canonical_sequence, **options}
+                pending[executor.submit(fold_sequence, job)] = key
+                if len(pending) >= 2 * workers:
+                    written += collect(pending, solved, waiting, lattice_type, output)
+        while pending:
+            written += collect(pending, solved, waiting, lattice_type, output)
+
+    return written
+
+
+def collect(pending, solved, waiting, lattice_type, output):
+    # Wait for at least one job and write the results of every sequence waiting on it
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    results = []
+    for future in done:
+        key = pending.pop(future)
+        result = future.result()
+        results += [map_result(result, record, lattice_type) for record in waiting.pop(key)]
+        solved[key] = result
+        if len(solved) > SOLVED_CACHE_SIZE:
+            solved.popitem(last=False)
+    return write_results(results, output)
+
+
+def map_result(result, record, lattice_type):
+    # Result of the canonical sequence for an equivalent sequence, reversed back when needed
+    name, sequence, reverse = record
+    result = {**result, 'name': name, 'sequence': sequence, 'reused': result['name'] != name}
+    if reverse and 'bitstring' in result:
+        bits = np.array([[int(bit) for bit in result['bitstring']]], dtype=np.uint8)
+        bits, resolved = reverse_conformations(bits, len(sequence), lattice_type)
+        # An infeasible best sample may have no image on the original chain
+        result['bitstring'] = ''.join(str(int(bit)) for bit in bits[0]) if resolved[0] else None
+    return result
+
+
+def write_results(results, output):
+    for result in results:
+        output.write(json.dumps(result) + '\n')
+    output.flush()
+    return len(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='QuantumHoneycombPSP batch CLI')
+    parser.add_argument('input', type=str, help='FASTA or CSV file of sequences')
+    parser.add_argument('output', type=str, help='JSON Lines file the results are appended to')
+    parser.add_argument('energy_model', type=str, choices=['HP', 'HPAB', 'WHPAB', 'MJ'], help='Energy model')
+    parser.add_argument('lattice_type', type=int, choices=[4, 6, 8, 12], help='Lattice type')
+    parser.add_argument('--solver', type=str, choices=['local', 'hybrid'], default='local',
+                        help='Built-in simulated annealer or the Leap hybrid CQM sampler')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: CPU count)')
+    parser.add_argument('--num-reads', type=int, default=NUM_READS, help='Reads of the simulated annealer')
+    parser.add_argument('--shared-registers', action='store_true',
+                        help='Derive pair displacements from shared per-amino position registers')
+    parser.add_argument('--signed-displacements', action='store_true',
+                        help="Compare one two's complement displacement per axis against constants")
+    parser.add_argument('--direct', action='store_true',
+                        help='Compile the BQM directly from NumPy arrays instead of the pyqubo expression')
+    parser.add_argument('--parametric', action='store_true',
+                        help='Feed the sequence energies into a model compiled once per lattice and length')
+    parser.add_argument('--no-cache', action='store_true', help='Rebuild the BQM instead of using the BQM cache')
+    parser.add_argument('--adder', type=str, choices=ADDERS, default=DEFAULT_ADDER,
+                        help='Population count of the direction sums: half adder cascade or compressor tree')
+
+    args = parser.parse_args()
+    start = time.time()
+    count = run_batch(args.input, args.output, args.energy_model, args.lattice_type, args.solver, args.workers,
+                      args.num_reads, args.shared_registers, args.direct, args.parametric, not args.no_cache,
+                      args.adder, args.signed_displacements)
+    print(f'{count} sequences folded in {time.time() - start:.2f}s')
@@ -0,0 +1,277 @@
+"""
+Reproducible benchmark sweep over lattice types, energy models and chain lengths.
+
+The corpus is drawn from a seeded generator, so every run on every machine benchmarks the
+same sequences. Each case records the expression build, compile and conversion times, the
+BQM and CQM sizes and the local annealer's time to reach the ground state. The ground state
+comes from evaluating every free-qubit assignment with QUBO/Direct_BQM.py. Results go to a
+JSON file, and --compare reports the change of every metric against a saved baseline and
+flags regressions. With --hubo every case also solves the unquadratized polynomial with
+LocalPolyAnnealer, so both paths are compared on the same ground state.
+
+Examples
+--------
+python Benchmark.py --output bench.json
+python Benchmark.py --output bench_new.json --compare bench.json
+python Benchmark.py --output bench_hubo.json --hubo
+"""
+
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+
+import numpy as np
+
+from Annealer import create_cqm
+from BQM_Cache import build_bqm, build_polynomial, code_version, get_build_mode
+from Instrumentation import Profile
+from Local_Annealer import LocalAnnealer, LocalPolyAnnealer
+from QUBO.BitOps_QUBO import ADDERS, DEFAULT_ADDER
+from QUBO.Direct_BQM import CHUNK_ROWS, evaluate_energy_function, free_qubits, truth_table
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+LATTICE_TYPES = [4, 6, 8, 12]
+ENERGY_MODELS = ['HP', 'HPAB', 'WHPAB', 'MJ']
+LENGTHS = [4, 5]
+SEQUENCES_PER_LENGTH = 2
+CORPUS_SEED = 2024
+SOLVER_SEED = 7
+NUM_READS = 100
+NUM_SWEEPS = 1000
+MAX_EXACT_QUBITS = 22
+
+# Fraction by which a metric may grow before --compare flags it
+TIME_TOLERANCE = 0.10
+SIZE_TOLERANCE = 0.0
+# Time changes below this many seconds are timer noise and never flagged
+TIME_FLOOR = 0.01
+
+TIME_METRICS = ['build_seconds', 'compile_seconds', 'conversion_seconds', 'solve_seconds', 'tts99_seconds',
+                'hubo_build_seconds', 'hubo_solve_seconds', 'hubo_tts99_seconds']
+SIZE_METRICS = ['gate_nodes', 'variables', 'ancillas', 'quadratic_terms', 'cqm_constraints', 'hubo_variables',
+                'hubo_terms']
+
+BUILD_STAGES = ['position_registers', 'interactions', 'redundancy', 'overlap', 'back', 'direct_compile',
+                'parametric_feed']
+CONVERSION_STAGES = ['to_bqm', 'to_qubo', 'to_ising']
+
+
+def make_corpus(lengths=LENGTHS, per_length=SEQUENCES_PER_LENGTH, seed=CORPUS_SEED):
+    rng = np.random.default_rng(seed)
+    return [''.join(rng.choice(list(AMINO_ACIDS), size=length)) for length in lengths for _ in range(per_length)]
+
+
+def ground_state_energy(sequence, energy_model, lattice_type, shared_registers=False):
+    num_free = len(free_qubits(len(sequence), lattice_type))
+    if num_free > MAX_EXACT_QUBITS:
+        return None
+    ground_energy = np.inf
+    for start in range(0, 1 << num_free, CHUNK_ROWS):
+        bits = truth_table(num_free, start, min(start + CHUNK_ROWS, 1 << num_free))
+        energies = evaluate_energy_function(sequence, energy_model, lattice_type, bits, shared_registers)
+        ground_energy = min(ground_energy, float(energies.min()))
+    return ground_energy
+
+
+def time_to_solution(run_seconds, num_reads, success_probability, target=0.99):
+    # Expected time until one batch of reads contains a ground state with probability target
+    if success_probability <= 0:
+        return None
+    if success_probability >= 1:
+        return run_seconds
+    batch_failure = (1 - success_probability) ** num_reads
+    if batch_failure <= 1 - target:
+        return run_seconds
+    return run_seconds * math.log(1 - target) / math.log(batch_failure)
+
+
+def benchmark_case(sequence, energy_model, lattice_type, shared_registers=False, direct=False, parametric=False,
+                   num_reads=NUM_READS, num_sweeps=NUM_SWEEPS, seed=SOLVER_SEED, adder=DEFAULT_ADDER,
+                   signed_displacements=False, hubo=False):
+    """
+    Measure one (sequence, energy model, lattice) case.
+
+    Returns
+    -------
+    dict
+        Case description, stage times, model sizes and local solver results, and with hubo the
+        same for the unquadratized polynomial under the 'hubo_' keys.
+    """
+    profile = Profile(sequence)
+    bqm, gates = build_bqm(sequence, energy_model, lattice_type, shared_registers, direct, parametric, profile,
+                           adder, signed_displacements)
+    stages = {entry['stage']: entry for entry in profile.record['stages']}
+
+    result = {
+        'sequence': sequence,
+        'length': len(sequence),
+        'energy_model': energy_model,
+        'lattice_type': lattice_type,
+        'build_mode': get_build_mode(shared_registers, direct, parametric, signed_displacements, adder),
+        'adder': adder,
+        'build_seconds': sum(stages[name]['seconds'] for name in BUILD_STAGES if name in stages),
+        'compile_seconds': stages['compile']['seconds'] if 'compile' in stages else 0.0,
+        'conversion_seconds': sum(stages[name]['seconds'] for name in CONVERSION_STAGES if name in stages),
+        'gate_nodes': sum(entry['gate_nodes'] for entry in stages.values()),
+        'variables': len(bqm.variables),
+        'ancillas': len(gates),
+        'quadratic_terms': len(bqm.quadratic),
+        'cqm_constraints': len(create_cqm(bqm, gates).constraints),
+    }
+
+    start = time.perf_counter()
+    sampleset = LocalAnnealer().sample(bqm, num_reads=num_reads, num_sweeps=num_sweeps, seed=seed)
+    # Gate variables at their consistent values, a read is scored by its move qubits
+    variables = list(sampleset.variables)
+    energies = bqm.energies((gates.complete(sampleset.record.sample, variables), variables))
+    result['solve_seconds'] = time.perf_counter() - start
+    result['best_energy'] = float(energies.min())
+
+    ground_energy = ground_state_energy(sequence, energy_model, lattice_type, shared_registers or signed_displacements)
+    result['ground_energy'] = ground_energy
+    if ground_energy is not None:
+        success_probability = float(np.mean(np.isclose(energies, ground_energy)))
+        result['success_probability'] = success_probability
+        result['tts99_seconds'] = time_to_solution(result['solve_seconds'], num_reads, success_probability)
+
+    if hubo:
+        start = time.perf_counter()
+        polynomial = build_polynomial(sequence, energy_model, lattice_type, shared_registers, direct, None, adder,
+                                      signed_displacements)
+        result['hubo_build_seconds'] = time.perf_counter() - start
+        result['hubo_variables'] = len(polynomial.variables)
+        result['hubo_terms'] = len(polynomial)
+        result['hubo_degree'] = polynomial.degree
+
+        start = time.perf_counter()
+        sampleset = LocalPolyAnnealer().sample_poly(polynomial, num_reads=num_reads, num_sweeps=num_sweeps,
+                                                    seed=seed)
+        result['hubo_solve_seconds'] = time.perf_counter() - start
+        energies = sampleset.record.energy
+        result['hubo_best_energy'] = float(energies.min())
+        if ground_energy is not None:
+            success_probability = float(np.mean(np.isclose(energies, ground_energy)))
+            result['hubo_success_probability'] = success_probability
+            result['hubo_tts99_seconds'] = time_to_solution(result['hubo_solve_seconds'], num_reads,
+                                                            success_probability)
+    return result
+
+
+def run_benchmark(lattice_types=LATTICE_TYPES, energy_models=ENERGY_MODELS, lengths=LENGTHS,
+                  per_length=SEQUENCES_PER_LENGTH, corpus_seed=CORPUS_SEED, **options):
+    corpus = make_corpus(lengths, per_length, corpus_seed)
+    results = []
+    for lattice_type in lattice_types:
+        for energy_model in energy_models:
+            for sequence in corpus:
+                result = benchmark_case(sequence, energy_model, lattice_type, **options)
+                print(f"HCOMB{lattice_type} {energy_model} {sequence}: build {result['build_seconds']:.3f}s "
+                      f"compile {result['compile_seconds']:.3f}s {result['variables']} variables "
+                      f"solve {result['solve_seconds']:.3f}s" +
+                      (f" hubo {result['hubo_terms']} terms solve {result['hubo_solve_seconds']:.3f}s"
+                       if 'hubo_terms' in result else ''), flush=True)
+                results.append(result)
+
+    meta = {
+        'corpus_seed': corpus_seed,
+        'corpus': corpus,
+        'code_version': code_version(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'options': options,
+    }
+    return {'meta': meta, 'results': results}
+
+
+def case_key(result):
+    return result['lattice_type'], result['energy_model'], result['sequence'], result['build_mode']
+
+
+def compare(current, baseline, time_tolerance=TIME_TOLERANCE, size_tolerance=SIZE_TOLERANCE):
+    """
+    Relative change of every metric against a baseline run.
+
+    Parameters
+    ----------
+    current, baseline : dict
+        Benchmark runs as written by run_benchmark.
+    time_tolerance, size_tolerance : float
+        Allowed relative growth of the time and size metrics.
+
+    Returns
+    -------
+    list of dict
+        One row per case and metric present in both runs, with the baseline and current
+        values, their ratio and whether the change is a regression.
+    """
+    baseline_results = {case_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        previous = baseline_results.get(case_key(result))
+        if previous is None:
+            continue
+        for metric in TIME_METRICS + SIZE_METRICS:
+            old, new = previous.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            tolerance = time_tolerance if metric in TIME_METRICS else size_tolerance
+            ratio = new / old if old else (1.0 if not new else math.inf)
+            regression = ratio > 1 + tolerance and (metric in SIZE_METRICS or new - old > TIME_FLOOR)
+            rows.append({'case': case_key(result), 'metric': metric, 'baseline': old, 'current': new,
+                         'ratio': ratio, 'regression': regression})
+        if previous.get('best_energy') is not None and result['best_energy'] > previous['best_energy']:
+            rows.append({'case': case_key(result), 'metric': 'best_energy', 'baseline': previous['best_energy'],
+                         'current': result['best_energy'], 'ratio': None, 'regression': True})
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        ratio = f"{row['ratio']:.2f}x" if row['ratio'] is not None else '-'
+        lattice_type, energy_model, sequence, build_mode = row['case']
+        print(f"HCOMB{lattice_type} {energy_model} {sequence} {build_mode} {row['metric']}: "
+              f"{row['baseline']} -> {row['current']} ({ratio}) {flag}")
+    regressions = sum(row['regression'] for row in rows)
+    print(f'{regressions} regressions in {len(rows)} compared metrics')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='QuantumHoneycombPSP benchmark')
+    parser.add_argument('--output', type=str, default='benchmark.json', help='Results file')
+    parser.add_argument('--compare', type=str, default=None, metavar='BASELINE',
+                        help='Compare against a saved results file, exit 1 on regressions')
+    parser.add_argument('--lattices', type=int, nargs='+', choices=LATTICE_TYPES, default=LATTICE_TYPES)
+    parser.add_argument('--energy-models', type=str, nargs='+', choices=ENERGY_MODELS, default=ENERGY_MODELS)
+    parser.add_argument('--lengths', type=int, nargs='+', default=LENGTHS)
+    parser.add_argument('--per-length', type=int, default=SEQUENCES_PER_LENGTH, help='Sequences per length')
+    parser.add_argument('--corpus-seed', type=int, default=CORPUS_SEED)
+    parser.add_argument('--num-reads', type=int, default=NUM_READS)
+    parser.add_argument('--num-sweeps', type=int, default=NUM_SWEEPS)
+    parser.add_argument('--shared-registers', action='store_true')
+    parser.add_argument('--direct', action='store_true')
+    parser.add_argument('--parametric', action='store_true')
+    parser.add_argument('--signed-displacements', action='store_true')
+    parser.add_argument('--adder', type=str, choices=ADDERS, default=DEFAULT_ADDER)
+    parser.add_argument('--hubo', action='store_true',
+                        help='Also solve the unquadratized polynomial with the higher-order local annealer')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+
+    args = parser.parse_args()
+    run = run_benchmark(args.lattices, args.energy_models, args.lengths, args.per_length, args.corpus_seed,
+                        shared_registers=args.shared_registers, direct=args.direct, parametric=args.parametric,
+                        num_reads=args.num_reads, num_sweeps=args.num_sweeps, adder=args.adder,
+                        signed_displacements=args.signed_displacements, hubo=args.hubo)
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if print_comparison(compare(run, baseline, args.time_tolerance)):
+            sys.exit(1)
@@ -1,6 +1,24 @@
+from functools import wraps
+
 from sympy import And, Xor, true, symbols
 
 
+def shared_output(function):
+    # Memoizes an adder on the builder owning its direction functions, sympy expressions are
+    # immutable so outputs can be shared, and they are released together with the builder
+    @wraps(function)
+    def wrapper(dir_func, *args):
+        builder = getattr(dir_func, '__self__', None)
+        if builder is None:
+            return function(dir_func, *args)
+        outputs = builder.__dict__.setdefault('adder_outputs', {})
+        key = (function.__name__, dir_func.__name__) + tuple(getattr(arg, '__name__', arg) for arg in args)
+        if key not in outputs:
+            outputs[key] = tuple(function(dir_func, *args))
+        return list(outputs[key])
+    return wrapper
+
+
 def initialize_q_vars(num_amino, qubits_per_amino):
     # Initialize the q variables as Boolean symbols
     q_vars = {}
@@ -29,6 +47,7 @@ def half_adder_loader(bit_list):
     sum_bit_list.append(bit_list[0])
     return sum_bit_list
 
+@shared_output
 def sum_of_directions(dir_func, amino_start, amino_end):
     bit_list = []
     for i in range(amino_end - amino_start):
@@ -37,6 +56,7 @@ def sum_of_directions(dir_func, amino_start, amino_end):
     return half_adder_loader(bit_list)
 
 
+@shared_output
 def sum_of_directions_plus_one(dir_func, amino_start, amino_end):
     bit_list = [true]
     for i in range(amino_end - amino_start):
@@ -45,6 +65,7 @@ def sum_of_directions_plus_one(dir_func, amino_start, amino_end):
     return half_adder_loader(bit_list)
 
 
+@shared_output
 def sum_of_y(dir_func1, dir_func2, amino_start, amino_end):
     bit_list = []
     for i in range(amino_end - amino_start):
@@ -54,6 +75,7 @@ def sum_of_y(dir_func1, dir_func2, amino_start, amino_end):
     return half_adder_loader(bit_list)
 
 
+@shared_output
 def sum_of_y_plus_one(dir_func1, dir_func2, amino_start, amino_end):
     bit_list = [true]
     for i in range(amino_end - amino_start):
@@ -63,6 +85,7 @@ def sum_of_y_plus_one(dir_func1, dir_func2, amino_start, amino_end):
     return half_adder_loader(bit_list)
 
 
+@shared_output
 def sum_of_y_plus_two(dir_func1, dir_func2, amino_start, amino_end):
     bit_list = [true, true]
     for i in range(amino_end - amino_start):
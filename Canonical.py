@@ -0,0 +1,178 @@
+"""
+Canonical problem keys, so equivalent sequences share one model and one solve.
+
+Two sequences pose the same folding problem when they have the same encoding under the
+energy model (many amino acid sequences share an HP or HPAB string). A sequence and its
+reverse also pose the same problem when the contact energies of the sequence are symmetric:
+the reversed chain folds into the same conformation walked backwards. The HP, HPAB and
+WHPAB tables are symmetric, the MJ table is not, so MJ sequences are only reversed when the
+energies of their own residue pairs happen to be symmetric. HCOMB8 sequences are only
+reversed in the exact builds (shared registers or signed displacements).
+
+A reversed solution is mapped back by walking its moves backwards and applying the lattice
+symmetry that restores the preset moves of the builders, which leaves every contact and so
+the energy unchanged.
+"""
+
+import itertools
+from functools import lru_cache
+
+import dimod
+import numpy as np
+
+from Energy import encode_sequence, get_energy_matrix
+from Lattices import QUBITS_PER_AMINO, PRESETS, MOVES, move_table
+from QUBO.Direct_BQM import free_qubits, move_codes, qubit_label
+
+
+def canonical_form(sequence, energy_model, lattice_type, shared_registers=False):
+    """
+    Canonical key and orientation of a sequence.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    shared_registers : bool
+        Whether the build compares displacements exactly, i.e. uses shared registers or signed
+        displacements, see main.py.
+
+    Returns
+    -------
+    tuple
+        (key, canonical_sequence, reversed). Sequences with equal keys have identical energy
+        functions in their canonical orientation. canonical_sequence is the sequence in that
+        orientation and reversed tells whether it is the reverse of the input.
+    """
+    encoded_sequence = encode_sequence(sequence, energy_model)
+    reverse = False
+    if is_reversible(sequence, energy_model, lattice_type, shared_registers):
+        reverse = encoded_sequence[::-1] < encoded_sequence
+    if reverse:
+        sequence = sequence[::-1]
+        encoded_sequence = encoded_sequence[::-1]
+    return f'{energy_model}:{encoded_sequence}', sequence, reverse
+
+
+def is_reversible(sequence, energy_model, lattice_type, shared_registers=False):
+    # The truncated pairwise comparisons of HCOMB8 alias long y displacements, so only its exact
+    # builds are invariant under the lattice symmetries
+    if lattice_type == 8 and not shared_registers:
+        return False
+    # Reversal keeps the energy function when every contact energy is symmetric in the pair
+    energy_matrix = get_energy_matrix(sequence, energy_model)
+    return bool(np.array_equal(energy_matrix, energy_matrix.T))
+
+
+@lru_cache(maxsize=None)
+def lattice_symmetries(lattice_type):
+    # Linear maps permuting the move vectors, found from the images of a basis of moves. They
+    # map contacts to contacts and self-avoiding walks to self-avoiding walks
+    moves = np.array(sorted(MOVES[lattice_type].values()), dtype=np.float64)
+    move_set = {tuple(move) for move in moves.astype(np.int64)}
+
+    basis = []
+    for move in moves:
+        if np.linalg.matrix_rank(np.array(basis + [move])) > len(basis):
+            basis.append(move)
+    basis = np.array(basis)
+    inverse = np.linalg.pinv(basis)
+
+    symmetries = []
+    for images in itertools.permutations(moves, len(basis)):
+        matrix = np.array(images).T @ inverse.T
+        mapped = moves @ matrix.T
+        if not np.allclose(mapped, np.rint(mapped)):
+            continue
+        if {tuple(move) for move in np.rint(mapped).astype(np.int64)} == move_set:
+            symmetries.append(matrix)
+
+    # Identity first, so conformations already satisfying the presets are left alone
+    symmetries.sort(key=lambda matrix: not np.allclose(moves @ matrix.T, moves))
+    return symmetries
+
+
+@lru_cache(maxsize=None)
+def vector_codes(lattice_type):
+    # Move code of every move vector, keyed by the vector offset into a 5x5x5 cube
+    codes = np.full(125, -1, dtype=np.int64)
+    for code, vector in MOVES[lattice_type].items():
+        codes[vector_index(np.array(vector))] = int(code, 2)
+    return codes
+
+
+def vector_index(vectors):
+    vectors = np.clip(vectors + 2, 0, 4)
+    return vectors[..., 0] * 25 + vectors[..., 1] * 5 + vectors[..., 2]
+
+
+def reverse_conformations(bits, num_amino, lattice_type):
+    """
+    Map conformations of the reversed chain back onto the original chain.
+
+    Parameters
+    ----------
+    bits : np.ndarray
+        (num_samples, num_free) 0/1 array of the reversed chain, ordered like
+        QUBO.Direct_BQM.free_qubits.
+    num_amino : int
+        Chain length.
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+
+    Returns
+    -------
+    bits : np.ndarray
+        (num_samples, num_free) 0/1 array of the same conformations walked from the other end
+        and rotated onto the preset moves, so they have the same contacts and energy.
+    resolved : np.ndarray
+        Whether each conformation has such an image. Conformations using redundant move codes
+        or walking back onto a preset move have none (they are infeasible); their rows hold
+        their valid moves reversed without a rotation and the presets cut off, a different walk.
+    """
+    bits = np.asarray(bits)
+    qubits = QUBITS_PER_AMINO[lattice_type]
+    codes = move_codes(bits, num_amino, lattice_type)
+    vectors = -move_table(lattice_type)[codes][:, ::-1]
+    reversed_codes = codes[:, ::-1]
+
+    result = None
+    unresolved = np.ones(len(bits), dtype=bool)
+    for symmetry in lattice_symmetries(lattice_type):
+        images = np.rint(vectors @ symmetry.T).astype(np.int64)
+        image_codes = vector_codes(lattice_type)[vector_index(images)]
+        image_codes = np.where(image_codes >= 0, image_codes, reversed_codes)
+        if result is None:
+            result = image_codes.copy()
+
+        matches = unresolved.copy()
+        for (t, q), value in PRESETS[lattice_type].items():
+            if t < num_amino - 1:
+                matches &= (image_codes[:, t] >> (qubits - 1 - q) & 1) == value
+        result[matches] = image_codes[matches]
+        unresolved &= ~matches
+        if not unresolved.any():
+            break
+
+    t, q = np.array(free_qubits(num_amino, lattice_type), dtype=np.int64).reshape(-1, 2).T
+    return (result[:, t] >> (qubits - 1 - q) & 1).astype(np.uint8), ~unresolved
+
+
+def reverse_sampleset(sampleset, num_amino, lattice_type):
+    # Samples of the reversed chain as samples of the original chain over its free move qubits.
+    # Energies carry over, occurrences add up where samples coincide, missing qubits read as 0.
+    # Samples without an image on the original chain are infeasible walks and are dropped, mapping
+    # them anyway would pair their energy with a different conformation
+    labels = [qubit_label(t, q) for t, q in free_qubits(num_amino, lattice_type)]
+    bits = np.zeros((len(sampleset), len(labels)), dtype=np.uint8)
+    for column, label in enumerate(labels):
+        if label in sampleset.variables:
+            bits[:, column] = sampleset.record.sample[:, sampleset.variables.index(label)]
+    bits, resolved = reverse_conformations(bits, num_amino, lattice_type)
+    return dimod.SampleSet.from_samples((bits[resolved], labels), dimod.BINARY,
+                                        energy=sampleset.record.energy[resolved],
+                                        num_occurrences=sampleset.record.num_occurrences[resolved]).aggregate()
@@ -0,0 +1,269 @@
+"""
+Vectorized decoding of whole sample sets into lattice conformations.
+
+Every row of samples.record.sample is decoded independently of what the solver reports:
+the preset qubits of set_default are restored, the move codes are mapped to integer
+displacements through the lattice's move table and summed with cumsum into coordinates.
+A row is feasible when every move code is a real move and no two aminos share a site, and
+its true energy is the sum of the interaction matrix over all non-consecutive pairs whose
+displacement is a single lattice move. Long chains find their contacts and shared sites in
+an occupancy hash of the sites (lattice_contacts), linear in the chain length rather than in
+the number of pairs. All steps work on (rows, aminos) arrays in chunks,
+so millions of samples decode in seconds and any disagreement with the model's energies
+points at an encoding or penalty bug.
+
+Examples
+--------
+python Decoder.py Samples_1731334129_0f3a9c2e YGGFM MJ 12
+"""
+
+import argparse
+
+import numpy as np
+
+from Energy import get_energy_matrix
+from Lattices import move_table, neighbour_offsets
+from QUBO.Direct_BQM import CHUNK_ROWS, free_qubits, move_codes, qubit_label
+from Results_Store import load_samples
+
+# Smallest index separation of two aminos in contact, consecutive aminos are bonded
+CONTACT_GAP = 2
+# decode switches from checking every interacting pair to the occupancy hash once there are more pairs
+# than this many per neighbour lookup (num_amino * offsets), measured on HCOMB6 and HCOMB12
+HASH_PAIR_RATIO = 3
+
+
+def free_bits(samples, variables, num_amino, lattice_type):
+    """
+    Free move qubits of every sample, ancillas dropped.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        (num_samples, num_variables) 0/1 array, e.g. samples.record.sample.
+    variables : list
+        Label of every column of samples.
+    num_amino : int
+        Chain length.
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+
+    Returns
+    -------
+    np.ndarray
+        (num_samples, num_free) array ordered like free_qubits, qubits missing from the
+        samples read as 0.
+    """
+    index = {var: i for i, var in enumerate(variables)}
+    columns = [index.get(qubit_label(t, q), -1) for t, q in free_qubits(num_amino, lattice_type)]
+    bits = np.zeros((len(samples), len(columns)), dtype=np.uint8)
+    present = [column for column, source in enumerate(columns) if source >= 0]
+    bits[:, present] = np.asarray(samples)[:, [columns[column] for column in present]]
+    return bits
+
+
+def lattice_positions(bits, num_amino, lattice_type):
+    """
+    Integer lattice coordinates of every amino.
+
+    Parameters
+    ----------
+    bits : np.ndarray
+        (num_samples, num_free) free move qubits ordered like free_qubits.
+    num_amino : int
+        Chain length.
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+
+    Returns
+    -------
+    positions : np.ndarray
+        (num_samples, num_amino, 3) coordinates, the first amino at the origin.
+    valid_moves : np.ndarray
+        Whether every move code of the sample is a real move and not a redundant encoding.
+    """
+    table = move_table(lattice_type)
+    codes = move_codes(bits, num_amino, lattice_type)
+    vectors = table[codes]
+    positions = np.zeros((len(bits), num_amino, 3), dtype=np.int64)
+    positions[:, 1:] = np.cumsum(vectors, axis=1)
+    valid_moves = table.any(axis=1)[codes].all(axis=1)
+    return positions, valid_moves
+
+
+def site_keys(coordinates, width):
+    # One integer per coordinate triple. Linear in the coordinates, so the key difference of two
+    # sites is the key of their displacement, unique while the components stay within width / 2
+    return (coordinates[..., 0] * width + coordinates[..., 1]) * width + coordinates[..., 2]
+
+
+def lattice_contacts(positions, lattice_type):
+    """
+    Contacts and collisions of a batch of conformations from an occupancy hash.
+
+    The sites of all conformations are hashed into one sorted array of integer keys (row and
+    site). The neighbours of every amino are then looked up with one searchsorted per lattice
+    neighbour offset, so the work grows linearly with the chain length instead of with the
+    number of amino pairs.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        (num_samples, num_amino, 3) integer lattice coordinates, e.g. from lattice_positions.
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+
+    Returns
+    -------
+    rows, amino1, amino2 : np.ndarray
+        Every pair of aminos at least CONTACT_GAP apart in the chain that sits one lattice move
+        apart, with amino1 < amino2, once per sample. Aminos that share a site are matched
+        individually.
+    collided : np.ndarray
+        Whether two aminos of the sample share a site.
+    """
+    num_rows, num_amino = positions.shape[:2]
+    offsets = neighbour_offsets(lattice_type)
+    # Shift the sites to non-negative coordinates with room for one move on every side
+    margin = int(np.abs(offsets).max())
+    low = positions.min(initial=0)
+    width = int(positions.max(initial=0)) - int(low) + 2 * margin + 1
+    row_keys = width ** 3
+    if num_rows * row_keys >= 1 << 62:
+        raise ValueError(f'{num_rows} conformations of {num_amino} aminos overflow the occupancy keys, decode '
+                         'fewer rows at once.')
+
+    keys = site_keys(positions - low + margin, width) + np.arange(num_rows)[:, None] * row_keys
+    keys = keys.ravel()
+    order = np.argsort(keys, kind='stable')
+    occupied = keys[order]
+    shared = occupied[1:] == occupied[:-1]
+    collided = np.zeros(num_rows, dtype=bool)
+    collided[order[1:][shared] // num_amino] = True
+    # Occupied sites with the first entry and number of aminos of each
+    run_starts = np.flatnonzero(np.concatenate(([True], ~shared)))
+    sites = occupied[run_starts]
+    run_lengths = np.diff(run_starts, append=len(occupied))
+
+    rows, amino1, amino2 = [], [], []
+    for offset_key in site_keys(offsets, width).tolist():
+        targets = occupied + offset_key
+        site = np.minimum(np.searchsorted(sites, targets), len(sites) - 1)
+        counts = np.where(sites[site] == targets, run_lengths[site], 0)
+        # One entry per amino occupying the neighbouring site, several where walks collide
+        starts = np.cumsum(counts) - counts
+        sources = order[np.repeat(np.arange(len(keys)), counts)]
+        partners = order[np.repeat(run_starts[site] - starts, counts) + np.arange(len(sources))]
+        source_amino, partner_amino = sources % num_amino, partners % num_amino
+        # Both aminos of a contact find each other, keep the direction towards the chain end
+        keep = partner_amino >= source_amino + CONTACT_GAP
+        rows.append(sources[keep] // num_amino)
+        amino1.append(source_amino[keep])
+        amino2.append(partner_amino[keep])
+    return np.concatenate(rows), np.concatenate(amino1), np.concatenate(amino2), collided
+
+
+def decode(samples, variables, sequence, energy_model, lattice_type, chunk_rows=CHUNK_ROWS):
+    """
+    Conformations, feasibility and true contact energies of a batch of samples.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        (num_samples, num_variables) 0/1 array, e.g. samples.record.sample.
+    variables : list
+        Label of every column of samples.
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    chunk_rows : int
+        Samples decoded at once, bounds the memory of the pair arrays.
+
+    Returns
+    -------
+    positions : np.ndarray
+        (num_samples, num_amino, 3) integer coordinates.
+    feasible : np.ndarray
+        Every move is real and the walk is self-avoiding.
+    energies : np.ndarray
+        Sum of the interaction energies of the pairs in contact, whether feasible or not.
+    """
+    num_amino = len(sequence)
+    energy_matrix = np.asarray(get_energy_matrix(sequence, energy_model), dtype=float)
+    amino1, amino2 = np.triu_indices(num_amino, CONTACT_GAP)
+    interacting = energy_matrix[amino1, amino2] != 0
+    amino1, amino2 = amino1[interacting], amino2[interacting]
+    pair_energies = energy_matrix[amino1, amino2]
+
+    # Short chains compare their few pairs directly, long chains look their contacts up in lattice_contacts
+    offsets = neighbour_offsets(lattice_type)
+    hashed = len(amino1) > HASH_PAIR_RATIO * num_amino * len(offsets)
+    # A walk never leaves [-2n, 2n] (HCOMB8 moves two units along y), displacements span twice that
+    width = 8 * num_amino + 1
+    contact_keys = site_keys(offsets, width)
+
+    bits = free_bits(samples, variables, num_amino, lattice_type)
+    positions = np.empty((len(bits), num_amino, 3), dtype=np.int64)
+    feasible = np.empty(len(bits), dtype=bool)
+    energies = np.empty(len(bits))
+    for start in range(0, len(bits), chunk_rows):
+        chunk = slice(start, start + chunk_rows)
+        chunk_positions, valid_moves = lattice_positions(bits[chunk], num_amino, lattice_type)
+        if hashed:
+            rows, contact1, contact2, collided = lattice_contacts(chunk_positions, lattice_type)
+            energies[chunk] = np.bincount(rows, weights=energy_matrix[contact1, contact2],
+                                          minlength=len(chunk_positions))
+        else:
+            sites = site_keys(chunk_positions, width)
+            contacts = np.isin(sites[:, amino2] - sites[:, amino1], contact_keys, kind='table')
+            sites.sort(axis=1)
+            collided = (sites[:, 1:] == sites[:, :-1]).any(axis=1)
+            energies[chunk] = contacts @ pair_energies
+
+        positions[chunk] = chunk_positions
+        feasible[chunk] = valid_moves & ~collided
+    return positions, feasible, energies
+
+
+def validate(sampleset, sequence, energy_model, lattice_type):
+    """
+    Check the energies of a sample set against its decoded conformations.
+
+    Parameters
+    ----------
+    sampleset : dimod.SampleSet
+        Samples over the move qubits of sequence (ancillas are ignored).
+    sequence, energy_model, lattice_type
+        Problem the samples solve.
+
+    Returns
+    -------
+    dict
+        Sample and feasible counts, the lowest true energy of a feasible sample, and the
+        feasible samples whose model energy differs from their true energy.
+    """
+    positions, feasible, energies = decode(sampleset.record.sample, list(sampleset.variables), sequence,
+                                           energy_model, lattice_type)
+    mismatches = feasible & ~np.isclose(sampleset.record.energy, energies)
+    return {
+        'samples': len(feasible),
+        'feasible': int(feasible.sum()),
+        'best_true_energy': float(energies[feasible].min()) if feasible.any() else None,
+        'energy_mismatches': int(mismatches.sum()),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decode and validate a stored sample set')
+    parser.add_argument('samples', type=str,
+                        help='Run id or run directory of the results store, or a legacy Results/*.pkl pickle')
+    parser.add_argument('sequence', type=str, help='Protein sequence')
+    parser.add_argument('energy_model', type=str, choices=['HP', 'HPAB', 'WHPAB', 'MJ'], help='Energy model')
+    parser.add_argument('lattice_type', type=int, choices=[4, 6, 8, 12], help='Lattice type')
+
+    args = parser.parse_args()
+    sampleset = load_samples(args.samples)
+    print(validate(sampleset, args.sequence, args.energy_model, args.lattice_type))
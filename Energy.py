@@ -1,48 +1,128 @@
+from functools import lru_cache
+
 import numpy as np
 
+HYDROPHOBIC = 'AGILMFPWV'
+POLAR = 'NQSTY'
+ACIDIC = 'DE'
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+AMINO_ACID_BYTES = AMINO_ACIDS.encode()
+
+# Letters of every model's alphabet, in the row order of its energy matrix
+ALPHABETS = {
+    'HP': 'HP',
+    'HPAB': 'HPAB',
+    'WHPAB': 'HPAB',
+    'MJ': 'CMFILVWYAGTSNQDEHRKP',
+}
+
+
+def translation_table(classes, default):
+    # 256-byte table for bytes.translate, letters of classes[letter] map to letter, everything else to default
+    table = bytearray(default.encode() * 256)
+    for letter, members in classes.items():
+        for member in members.encode():
+            table[member] = ord(letter)
+    return bytes(table)
+
+
+HP_TRANSLATION = translation_table({'H': HYDROPHOBIC}, 'P')
+HPAB_TRANSLATION = translation_table({'H': HYDROPHOBIC, 'P': POLAR, 'A': ACIDIC}, 'B')
+
+
 def get_energy_matrix(sequence, energy_model):
+    """
+    Pairwise contact energies of a sequence.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+
+    Returns
+    -------
+    np.ndarray
+        (len(sequence), len(sequence)) matrix. MJ energies are replaced by their rank among
+        the distinct values of the matrix, -1 for the weakest contact down to -k for the
+        strongest.
+    """
+    codes = encode_codes(sequence, energy_model)
+    energy_matrix = get_energy_table_matrix(energy_model)[np.ix_(codes, codes)]
+
+    if energy_model == 'MJ':
+        # np.unique sorts ascending, so the strongest (most negative) energy gets rank -k
+        energies, ranks = np.unique(energy_matrix, return_inverse=True)
+        energy_matrix = (ranks.reshape(energy_matrix.shape) - len(energies)).astype(np.float64)
+
+    return energy_matrix
+
+
+def encode_codes(sequence, energy_model):
+    """
+    Encode a sequence as indices into the alphabet of an energy model.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+
+    Returns
+    -------
+    np.ndarray
+        int array of alphabet indices, ALPHABETS[energy_model][code] is the encoded letter.
+    """
+    codes = get_code_table(energy_model)[np.frombuffer(sequence.encode('ascii'), dtype=np.uint8)]
+    if codes.size and codes.min() < 0:
+        unknown = sorted(set(letter for letter, code in zip(sequence, codes) if code < 0))
+        raise ValueError(f'Unknown amino acids {unknown} for the {energy_model} model.')
+    return codes
+
+
+@lru_cache(maxsize=None)
+def get_code_table(energy_model):
+    # Byte value -> alphabet index. HP and HPAB map letters outside their classes to the last
+    # class like encode_hp and encode_hpab, MJ rejects them with -1
+    if energy_model == 'HP':
+        code_table = np.full(256, 1, dtype=np.intp)
+        code_table[np.frombuffer(HYDROPHOBIC.encode(), dtype=np.uint8)] = 0
+    elif energy_model in ('HPAB', 'WHPAB'):
+        code_table = np.full(256, 3, dtype=np.intp)
+        for code, letters in enumerate((HYDROPHOBIC, POLAR, ACIDIC)):
+            code_table[np.frombuffer(letters.encode(), dtype=np.uint8)] = code
+    elif energy_model == 'MJ':
+        code_table = np.full(256, -1, dtype=np.intp)
+        code_table[np.frombuffer(ALPHABETS['MJ'].encode(), dtype=np.uint8)] = np.arange(len(ALPHABETS['MJ']))
+    else:
+        raise ValueError('Invalid energy model.')
+    code_table.flags.writeable = False
+    return code_table
+
+
+@lru_cache(maxsize=None)
+def get_energy_table_matrix(energy_model):
+    # Energy table of a model as a matrix over its alphabet
     if energy_model == 'HP':
         energy_table = get_energy_hp_table()
-        encoded_sequence = encode_hp(sequence)
     elif energy_model == 'HPAB':
         energy_table = get_energy_hpab_table()
-        encoded_sequence = encode_hpab(sequence)
     elif energy_model == 'WHPAB':
         energy_table = get_energy_whpab_table()
-        encoded_sequence = encode_hpab(sequence)
     elif energy_model == 'MJ':
         energy_table = get_energy_mj_table()
-        encoded_sequence = sequence
     else:
         raise ValueError('Invalid energy model.')
 
-    # create a df to store the energy matrix
-    energy_matrix = np.zeros((len(sequence), len(sequence)))
-    energy_values = []
-    for i in range(len(encoded_sequence)):
-        for j in range(len(encoded_sequence)):
-            if energy_model == 'MJ':
-                energy_value = energy_table[encoded_sequence[i]][encoded_sequence[j]]
-                energy_matrix[i][j] = energy_value
-                energy_values.append(energy_value)
-            else:
-                energy_matrix[i][j] = energy_table[encoded_sequence[i] + encoded_sequence[j]]
-
+    alphabet = ALPHABETS[energy_model]
     if energy_model == 'MJ':
-        energies = list(set(energy_values))
-        energies.sort(reverse = True)
-        ranked_energy_values = []
-        for i in range(len(energies)):
-            ranked_energy_values.append(-1 - i)
-
-        energy_dict = dict(zip(energies, ranked_energy_values))
-
-        for i in range(len(encoded_sequence)):
-            for j in range(len(encoded_sequence)):
-                energy_matrix[i][j] = energy_dict[energy_matrix[i][j]]
-
-
-    return energy_matrix
+        table_matrix = np.array([[energy_table[a][b] for b in alphabet] for a in alphabet], dtype=np.float64)
+    else:
+        table_matrix = np.array([[energy_table[a + b] for b in alphabet] for a in alphabet], dtype=np.float64)
+    table_matrix.flags.writeable = False
+    return table_matrix
 
 
 def encode_hp(sequence):
@@ -59,13 +139,7 @@ def encode_hp(sequence):
     str
         Encoded sequence in the HP model.
     """
-    hp_sequence = ''
-    for amino_acid in sequence:
-        if amino_acid in 'AGILMFPWV':
-            hp_sequence += 'H'
-        else:
-            hp_sequence += 'P'
-    return hp_sequence
+    return sequence.encode('ascii').translate(HP_TRANSLATION).decode('ascii')
 
 
 def encode_hpab(sequence):
@@ -82,17 +156,50 @@ def encode_hpab(sequence):
     str
         Encoded sequence in the HPAB model.
     """
-    hpab_sequence = ''
-    for amino_acid in sequence:
-        if amino_acid in 'AGILMFPWV':
-            hpab_sequence += 'H'
-        elif amino_acid in 'NQSTY':
-            hpab_sequence += 'P'
-        elif amino_acid in 'DE':
-            hpab_sequence += 'A'
-        else:
-            hpab_sequence += 'B'
-    return hpab_sequence
+    return sequence.encode('ascii').translate(HPAB_TRANSLATION).decode('ascii')
+
+
+def encode_sequence(sequence, energy_model):
+    if energy_model == 'HP':
+        return encode_hp(sequence)
+    elif energy_model in ('HPAB', 'WHPAB'):
+        return encode_hpab(sequence)
+    return sequence
+
+
+def encode_sequences(sequences, energy_model):
+    """
+    Lazily encode a stream of sequences.
+
+    Parameters
+    ----------
+    sequences : iterable of str
+        Sequences, e.g. a list or an open file with one sequence per line. Surrounding
+        whitespace is stripped, letters are upper-cased and blank lines are skipped.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+
+    Returns
+    -------
+    generator
+        (encoded sequence, alphabet indices) per sequence, see encode_sequence and
+        encode_codes. Only one sequence is held in memory at a time.
+
+    Raises
+    ------
+    ValueError
+        On a letter that is not one of the 20 standard amino acids.
+    """
+    code_table = get_code_table(energy_model)
+    for number, sequence in enumerate(sequences, start=1):
+        raw = sequence.strip().upper().encode('ascii')
+        if not raw:
+            continue
+        unknown = raw.translate(None, AMINO_ACID_BYTES)
+        if unknown:
+            raise ValueError(f'Sequence {number} has unknown amino acids {sorted(set(unknown.decode()))}.')
+        yield encode_sequence(raw.decode('ascii'), energy_model), code_table[np.frombuffer(raw, dtype=np.uint8)]
+
 
 def get_energy_hp_table():
     """
@@ -0,0 +1,126 @@
+"""
+Opt-in per-stage instrumentation of the model builders and the annealer.
+
+A Profile collects one entry per stage with its wall time, the resident set size of the
+process after the stage, how much the stage raised the process peak resident set size, and the
+number of logic gates built (counted by the gate wrappers of QUBO/BitOps_QUBO.py). Memory is
+read from the kernel counters before and after a stage, nothing is traced while it runs, so the
+times carry no measurement overhead and nested stages do not disturb each other. Stages that
+produce a model also record its variable, ancilla and term counts. The whole run is emitted as
+one JSON record, appended to a JSON Lines file so runs can be trended across releases.
+
+Passing profile=None, the default everywhere, skips all measurement.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from QUBO.BitOps_QUBO import gate_count
+from QUBO.Direct_BQM import is_ancilla
+
+
+class Profile:
+    """
+    Stage records of one run.
+
+    Parameters
+    ----------
+    name : str
+        Name of the run, e.g. the sequence.
+    **context
+        Extra fields stored with the record (lattice type, energy model, build options...).
+    """
+
+    def __init__(self, name, **context):
+        self.record = {'name': name, 'timestamp': time.time(), **context, 'stages': []}
+
+    @contextmanager
+    def stage(self, name):
+        peak = max_rss_bytes()
+        gates = gate_count()
+        start = time.perf_counter()
+
+        entry = {'stage': name}
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            entry['rss_bytes'] = rss_bytes()
+            entry['max_rss_bytes'] = max_rss_bytes()
+            # The peak only ever grows, a stage that stays below an earlier peak adds nothing
+            entry['peak_growth_bytes'] = None if peak is None else entry['max_rss_bytes'] - peak
+            entry['gate_nodes'] = gate_count() - gates
+            self.record['stages'].append(entry)
+
+    def total_seconds(self):
+        return sum(entry['seconds'] for entry in self.record['stages'])
+
+    def emit(self, path=None):
+        # Appends the record to a JSON Lines file, or prints it without a path
+        self.record['total_seconds'] = self.total_seconds()
+        line = json.dumps(self.record)
+        if path is None:
+            print(line)
+        else:
+            with open(path, 'a') as f:
+                f.write(line + '\n')
+        return self.record
+
+
+@contextmanager
+def stage(profile, name):
+    # Profile.stage when profiling, otherwise an unmeasured entry so callers can still fill in sizes
+    if profile is None:
+        yield {}
+    else:
+        with profile.stage(name) as entry:
+            yield entry
+
+
+def max_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def rss_bytes():
+    # Current resident set size, from the second field of /proc/self/statm (in pages) on Linux
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def bqm_sizes(bqm):
+    return {
+        'variables': len(bqm.variables),
+        'ancillas': sum(1 for var in bqm.variables if is_ancilla(var)),
+        'linear_terms': len(bqm.linear),
+        'quadratic_terms': len(bqm.quadratic),
+    }
+
+
+def polynomial_sizes(polynomial):
+    return {
+        'variables': len(polynomial.variables),
+        'terms': len(polynomial),
+        'degree': polynomial.degree,
+    }
+
+
+def qubo_sizes(qubo):
+    # to_qubo returns (qubo dict, offset), to_ising returns (h, J, offset)
+    if len(qubo) == 2:
+        terms, _ = qubo
+        return {'qubo_terms': len(terms)}
+    h, J, _ = qubo
+    return {'ising_linear_terms': len(h), 'ising_quadratic_terms': len(J)}
@@ -0,0 +1,88 @@
+"""
+Integer move tables for the four honeycomb lattices.
+
+The encodings mirror the direction tables documented at the top of QUBO/HCOMB*_QUBO.py.
+Vectors use the integer approximation of each lattice (HCOMB8 north/south move two units
+along y, HCOMB12 moves one unit along two axes) and HCOMB4 keeps z = 0. Codes missing from
+a table are redundant encodings that the builders penalize.
+"""
+
+import numpy as np
+
+QUBITS_PER_AMINO = {4: 2, 6: 3, 8: 3, 12: 4}
+
+MOVES = {
+    4: {
+        '01': (1, 0, 0),     # E
+        '10': (-1, 0, 0),    # W
+        '11': (0, 1, 0),     # N
+        '00': (0, -1, 0),    # S
+    },
+    6: {
+        '000': (1, 0, 0),    # E
+        '001': (-1, 0, 0),   # W
+        '010': (0, 1, 0),    # N
+        '011': (0, -1, 0),   # S
+        '100': (0, 0, 1),    # U
+        '101': (0, 0, -1),   # D
+    },
+    8: {
+        '111': (0, 2, 0),    # N
+        '000': (0, -2, 0),   # S
+        '011': (1, 1, 0),    # NE
+        '100': (-1, -1, 0),  # SW
+        '101': (-1, 1, 0),   # NW
+        '010': (1, -1, 0),   # SE
+        '001': (0, 0, 1),    # U
+        '110': (0, 0, -1),   # D
+    },
+    12: {
+        '1011': (1, 1, 0),   # NE
+        '1111': (-1, 1, 0),  # NW
+        '1010': (1, -1, 0),  # SE
+        '1110': (-1, -1, 0), # SW
+        '0111': (0, 1, 1),   # UN
+        '0101': (0, -1, 1),  # US
+        '0110': (0, 1, -1),  # DN
+        '0100': (0, -1, -1), # DS
+        '1001': (1, 0, 1),   # UE
+        '1101': (-1, 0, 1),  # UW
+        '1000': (1, 0, -1),  # DE
+        '1100': (-1, 0, -1), # DW
+    },
+}
+
+# Qubits fixed by set_default in the QUBO builders, keyed by (amino, qubit)
+PRESETS = {
+    4: {(0, 0): 0, (0, 1): 1, (1, 1): 1},
+    6: {(0, 0): 0, (0, 1): 0, (0, 2): 0, (1, 1): 0, (1, 2): 0},
+    8: {(0, 0): 0, (0, 1): 0},
+    12: {(0, 0): 1, (0, 1): 0, (0, 2): 1, (0, 3): 1, (1, 0): 1, (1, 3): 1},
+}
+
+
+def move_table(lattice_type):
+    """
+    Displacement of every move code of a lattice.
+
+    Parameters
+    ----------
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+
+    Returns
+    -------
+    np.ndarray
+        (2 ** qubits, 3) integer array indexed by the move code read with the first qubit as
+        the most significant bit. Redundant codes map to the zero vector.
+    """
+    qubits = QUBITS_PER_AMINO[lattice_type]
+    table = np.zeros((2 ** qubits, 3), dtype=np.int64)
+    for code, vector in MOVES[lattice_type].items():
+        table[int(code, 2)] = vector
+    return table
+
+
+def neighbour_offsets(lattice_type):
+    # Displacements between two aminos in contact are exactly the single-move vectors
+    return np.array(sorted(MOVES[lattice_type].values()), dtype=np.int64)
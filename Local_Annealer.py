@@ -0,0 +1,319 @@
+"""
+NumPy-vectorized simulated annealing over the array form of a BQM.
+
+All reads anneal together as columns of one state matrix. Variables are grouped into colour
+classes of the interaction graph; no two variables of a class share a quadratic term, so a
+whole class is Metropolis-updated in one vectorized step with the same result as updating
+its variables one by one. Couplings are kept as neighbour lists, and as a dense block only
+for a colour class whose couplings fill enough of it, so memory grows with the number of
+couplings and not with the square of the number of variables. The sampler follows the
+dimod.Sampler interface and returns a dimod.SampleSet, so it can stand in for the D-Wave
+samplers offline.
+
+LocalPolyAnnealer anneals a higher-order binary polynomial the same way without quadratizing
+it. The polynomials of BQM_Cache.build_polynomial are over the free qubits only, so there are
+no gate variables to penalize or complete. Every read keeps the number of zero variables
+of every term; a term is active when the count is 0, and flipping a variable only touches
+the counts of the terms it appears in.
+"""
+
+import dimod
+import numpy as np
+
+NUM_READS = 100
+NUM_SWEEPS = 1000
+# A colour class keeps its couplings as a dense block when at least 1/DENSE_BLOCK_RATIO of the
+# block is nonzero, so the blocks never hold more than DENSE_BLOCK_RATIO times the couplings
+DENSE_BLOCK_RATIO = 8
+
+
+class LocalAnnealer(dimod.Sampler):
+    """
+    Classical simulated annealer running every read at once.
+
+    Examples
+    --------
+    >>> sampleset = LocalAnnealer().sample(bqm, num_reads=200, num_sweeps=2000, seed=7)
+    """
+
+    parameters = {
+        'num_reads': [],
+        'num_sweeps': [],
+        'beta_range': [],
+        'beta_schedule_type': ['beta_schedule_options'],
+        'beta_schedule': [],
+        'seed': [],
+    }
+    properties = {'beta_schedule_options': ('geometric', 'linear', 'custom')}
+
+    def sample(self, bqm, num_reads=NUM_READS, num_sweeps=NUM_SWEEPS, beta_range=None,
+               beta_schedule_type='geometric', beta_schedule=None, seed=None, **kwargs):
+        """
+        Anneal a binary quadratic model.
+
+        Parameters
+        ----------
+        bqm : dimod.BinaryQuadraticModel
+            Model to sample. SPIN models are annealed in BINARY form and their samples
+            returned as spins.
+        num_reads : int
+            Number of independent reads, annealed together.
+        num_sweeps : int
+            Sweeps over all variables per read. Ignored when beta_schedule is given.
+        beta_range : tuple of float or None
+            (hot, cold) inverse temperatures. By default derived from the biases: the hot end
+            accepts the largest single-flip increase with probability 1/2 and the cold end
+            the smallest with probability 1/100.
+        beta_schedule_type : str
+            'geometric' or 'linear' interpolation over beta_range, or 'custom'.
+        beta_schedule : array-like or None
+            Explicit inverse temperature of every sweep, requires beta_schedule_type 'custom'.
+        seed : int or None
+            Seed of the random number generator.
+
+        Returns
+        -------
+        dimod.SampleSet
+            One sample per read with its energy.
+        """
+        vartype = bqm.vartype
+        bqm = bqm.change_vartype(dimod.BINARY, inplace=False)
+        variables = list(bqm.variables)
+        if not variables:
+            return dimod.SampleSet.from_samples(([], []), vartype, energy=[])
+
+        linear, (row, col, biases), offset = bqm.to_numpy_vectors(variable_order=variables)
+        num_variables = len(variables)
+        # Both directions of every coupling as neighbour lists, memory grows with the couplings only
+        indptr, neighbours, weights = neighbour_lists(np.concatenate([row, col]), np.concatenate([col, row]),
+                                                      np.concatenate([biases, biases]), num_variables)
+
+        max_delta = np.max(np.abs(linear) + np.bincount(row, np.abs(biases), num_variables)
+                           + np.bincount(col, np.abs(biases), num_variables))
+        betas = get_beta_schedule(max_delta, np.concatenate([np.abs(linear), np.abs(biases)]), num_sweeps,
+                                  beta_range, beta_schedule_type, beta_schedule)
+        updates = [class_neighbours(colour_class, indptr, neighbours, weights)
+                   for colour_class in colour_variables(indptr, neighbours)]
+
+        # Variable-major state and field matrices, so the neighbour gathers and sums run over rows
+        rng = np.random.default_rng(seed)
+        states = rng.integers(0, 2, size=(num_variables, num_reads)).astype(np.float64)
+        fields = np.repeat(linear[:, None], num_reads, axis=1)
+        for colour_class, targets, couplings in updates:
+            if len(targets):
+                fields[targets] += field_change(states[colour_class], couplings)
+
+        for beta in betas:
+            for colour_class, targets, couplings in updates:
+                class_states = states[colour_class]
+                delta = (1 - 2 * class_states) * fields[colour_class]
+                accept = delta <= 0
+                uphill = ~accept
+                accept[uphill] = rng.random(np.count_nonzero(uphill)) < np.exp(-beta * delta[uphill])
+                if not accept.any():
+                    continue
+                change = np.where(accept, 1 - 2 * class_states, 0.0)
+                states[colour_class] = class_states + change
+                if len(targets):
+                    fields[targets] += field_change(change, couplings)
+
+        states = states.T
+        states = states.astype(np.int8)
+        energies = bqm.energies((states, variables))
+        sampleset = dimod.SampleSet.from_samples((states, variables), dimod.BINARY, energy=energies,
+                                                 info={'beta_range': (float(betas[0]), float(betas[-1])),
+                                                       'num_sweeps': len(betas)})
+        # Energies do not depend on the vartype, only the sample values change
+        return sampleset.change_vartype(vartype, inplace=False)
+
+
+class LocalPolyAnnealer(dimod.PolySampler):
+    """
+    Classical simulated annealer of higher-order binary polynomials, running every read at once.
+
+    Examples
+    --------
+    >>> sampleset = LocalPolyAnnealer().sample_poly(polynomial, num_reads=200, num_sweeps=2000, seed=7)
+    """
+
+    parameters = LocalAnnealer.parameters
+    properties = LocalAnnealer.properties
+
+    def sample_poly(self, polynomial, num_reads=NUM_READS, num_sweeps=NUM_SWEEPS, beta_range=None,
+                    beta_schedule_type='geometric', beta_schedule=None, seed=None, **kwargs):
+        """
+        Anneal a binary polynomial without reducing it to quadratic form.
+
+        Parameters
+        ----------
+        polynomial : dimod.BinaryPolynomial
+            Model to sample. SPIN polynomials are annealed in BINARY form and their samples
+            returned as spins.
+        num_reads, num_sweeps, beta_range, beta_schedule_type, beta_schedule, seed
+            As in LocalAnnealer.sample. The default beta_range bounds a flip by the sum of the
+            absolute coefficients of the terms of a variable.
+
+        Returns
+        -------
+        dimod.SampleSet
+            One sample per read with its energy.
+        """
+        vartype = polynomial.vartype
+        polynomial = polynomial.to_binary()
+        variables = sorted(polynomial.variables, key=str)
+        if not variables:
+            return dimod.SampleSet.from_samples(([], []), vartype, energy=[])
+
+        index = {var: i for i, var in enumerate(variables)}
+        terms = [(term, bias) for term, bias in polynomial.items() if term and bias != 0]
+        coefficients = np.array([bias for _, bias in terms], dtype=np.float64)
+        sizes = np.array([len(term) for term, _ in terms], dtype=np.int64)
+        # Incidence as (term, variable) pairs, the terms of variable v are term_index[variable_index == v]
+        term_index = np.repeat(np.arange(len(terms)), sizes)
+        variable_index = np.array([index[var] for term, _ in terms for var in term], dtype=np.int64)
+
+        num_variables = len(variables)
+        max_delta = np.bincount(variable_index, np.abs(coefficients[term_index]), num_variables).max()
+        betas = get_beta_schedule(max_delta, np.abs(coefficients), num_sweeps, beta_range, beta_schedule_type,
+                                  beta_schedule)
+
+        # Two variables sharing a term are never updated in the same step. Pair every incidence
+        # entry with each member of its term (members of a term are contiguous in variable_index)
+        term_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        repeats = sizes[term_index]
+        entries = np.repeat(np.arange(len(variable_index)), repeats)
+        offsets = np.arange(len(entries)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        first = variable_index[entries]
+        second = variable_index[term_starts[term_index[entries]] + offsets]
+        pairs = np.unique(first[first != second] * num_variables + second[first != second])
+        indptr, neighbours, _ = neighbour_lists(pairs // num_variables, pairs % num_variables,
+                                                np.ones(len(pairs)), num_variables)
+        updates = [class_incidence(colour_class, term_index, variable_index, num_variables)
+                   for colour_class in colour_variables(indptr, neighbours)]
+        updates = [update + (coefficients[update[1]],) for update in updates if len(update[0])]
+
+        rng = np.random.default_rng(seed)
+        states = rng.integers(0, 2, size=(num_reads, num_variables)).astype(np.int8)
+        # One reduceat over the contiguous members counts the ones of every term
+        zeros = np.zeros((num_reads, len(terms)), dtype=np.int16)
+        if len(terms):
+            zeros = (sizes - np.add.reduceat(states[:, variable_index], term_starts, axis=1)).astype(np.int16)
+
+        for beta in betas:
+            for colour_class, class_terms, owners, starts, class_coefficients in updates:
+                class_states = states[:, colour_class]
+                # A term changes with the flip when every other variable is 1: zero count 1 - x_v
+                active = zeros[:, class_terms] == 1 - class_states[:, owners]
+                fields = np.add.reduceat(active * class_coefficients, starts, axis=1)
+                delta = (1 - 2 * class_states) * fields
+                accept = delta <= 0
+                uphill = ~accept
+                accept[uphill] = rng.random(np.count_nonzero(uphill)) < np.exp(-beta * delta[uphill])
+                if not accept.any():
+                    continue
+                change = np.where(accept, 1 - 2 * class_states, 0).astype(np.int8)
+                states[:, colour_class] = class_states + change
+                zeros[:, class_terms] -= change[:, owners]
+
+        energies = polynomial.energies((states, variables))
+        sampleset = dimod.SampleSet.from_samples((states, variables), dimod.BINARY, energy=energies,
+                                                 info={'beta_range': (float(betas[0]), float(betas[-1])),
+                                                       'num_sweeps': len(betas)})
+        # Energies do not depend on the vartype, only the sample values change
+        return sampleset.change_vartype(vartype, inplace=False)
+
+
+def get_beta_schedule(max_delta, magnitudes, num_sweeps, beta_range, beta_schedule_type, beta_schedule):
+    # max_delta bounds a single-flip energy change, magnitudes are the absolute biases
+    if beta_schedule_type == 'custom':
+        if beta_schedule is None:
+            raise ValueError('A custom beta schedule needs beta_schedule.')
+        return np.asarray(beta_schedule, dtype=np.float64)
+
+    if beta_range is None:
+        beta_range = default_beta_range(max_delta, magnitudes)
+
+    hot, cold = beta_range
+    if beta_schedule_type == 'geometric':
+        return np.geomspace(hot, cold, num_sweeps)
+    elif beta_schedule_type == 'linear':
+        return np.linspace(hot, cold, num_sweeps)
+    raise ValueError(f'Unknown beta schedule type {beta_schedule_type}.')
+
+
+def default_beta_range(max_delta, magnitudes):
+    # The hot end accepts the largest single-flip increase with probability 1/2, the cold end the smallest
+    # nonzero bias with probability 1/100
+    magnitudes = magnitudes[magnitudes > 0]
+    min_delta = magnitudes.min() if magnitudes.size else 1.0
+    return np.log(2) / max(max_delta, 1e-9), np.log(100) / min_delta
+
+
+def class_incidence(colour_class, term_index, variable_index, num_variables):
+    # Terms of the variables of one colour class grouped by variable: no term holds two of them, so
+    # the groups are disjoint. Variables without terms are dropped, flipping them changes nothing
+    position = np.full(num_variables, -1)
+    position[colour_class] = np.arange(len(colour_class))
+    member = position[variable_index] >= 0
+    order = np.argsort(position[variable_index[member]], kind='stable')
+    owners = position[variable_index[member]][order]
+    class_terms = term_index[member][order]
+    present, starts = np.unique(owners, return_index=True)
+    owners = np.searchsorted(present, owners)
+    return colour_class[present], class_terms, owners, starts
+
+
+def neighbour_lists(sources, targets, weights, num_variables):
+    # Compressed rows of a directed edge list: the neighbours of v are neighbours[indptr[v]:indptr[v + 1]]
+    order = np.argsort(sources, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=num_variables))]).astype(np.int64)
+    return indptr, np.asarray(targets, dtype=np.int64)[order], np.asarray(weights, dtype=np.float64)[order]
+
+
+def class_neighbours(colour_class, indptr, neighbours, weights):
+    # Couplings leaving one colour class grouped by the neighbour they reach. Dense enough groups
+    # become a (class x targets) block for a matrix product, the others stay as (sources, starts,
+    # weights) for one reduceat of change[sources] * weights over the groups starting at starts
+    counts = indptr[colour_class + 1] - indptr[colour_class]
+    sources = np.repeat(np.arange(len(colour_class)), counts)
+    edges = np.repeat(indptr[colour_class] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    order = np.argsort(neighbours[edges], kind='stable')
+    targets, starts, inverse = np.unique(neighbours[edges][order], return_index=True, return_inverse=True)
+    sources, class_weights = sources[order], weights[edges][order]
+
+    if len(class_weights) * DENSE_BLOCK_RATIO >= len(colour_class) * len(targets):
+        block = np.zeros((len(colour_class), len(targets)))
+        block[sources, inverse] = class_weights
+        return colour_class, targets, block
+    return colour_class, targets, (sources, starts, class_weights[:, None])
+
+
+def field_change(change, couplings):
+    # Field change of the targets of a colour class when its variables change by change (class x reads)
+    if isinstance(couplings, np.ndarray):
+        return couplings.T @ change
+    sources, starts, class_weights = couplings
+    return np.add.reduceat(change[sources] * class_weights, starts)
+
+
+def colour_variables(indptr, neighbours):
+    # Greedy colouring in decreasing degree order, each class holds mutually uncoupled variables
+    num_variables = len(indptr) - 1
+    colours = np.full(num_variables, -1)
+    for variable in np.argsort(-np.diff(indptr), kind='stable'):
+        used = set(colours[neighbours[indptr[variable]:indptr[variable + 1]]].tolist())
+        colour = 0
+        while colour in used:
+            colour += 1
+        colours[variable] = colour
+    return [np.flatnonzero(colours == colour) for colour in range(colours.max() + 1)]
+
+
+if __name__ == '__main__':
+    import time
+    from QUBO.Direct_BQM import compile_bqm
+
+    bqm, gates = compile_bqm('YGGFM', 'MJ', 12)
+    start = time.time()
+    sampleset = LocalAnnealer().sample(bqm, num_reads=100, num_sweeps=1000, seed=1)
+    print(f'{len(bqm.variables)} variables, lowest energy {sampleset.first.energy} in {time.time() - start:.2f}s')
@@ -0,0 +1,202 @@
+"""
+Classical local-search polishing of annealer samples on the lattice.
+
+Every sample is decoded into its move codes (Decoder.py) and improved by steepest descent
+over lattice-native moves that change a few aminos and keep the rest of the chain in place:
+
+- end moves: the first or last move takes another code, moving the end amino
+- corner flips: two consecutive moves are replaced by another pair with the same vector sum,
+  moving the amino between them
+- crankshafts: three consecutive moves are replaced by another triple with the same sum,
+  moving the two aminos between them
+
+Only codes that agree with the preset qubits of set_default are used, so every polished
+conformation is a valid sample of the same model. A move is scored by the change of the
+true contact energy plus a penalty per colliding pair over the moved aminos only, for all
+samples at once. Redundant move codes are replaced by the first allowed move before the
+search, so infeasible samples are repaired where a few local moves suffice. Samples that stay
+infeasible are returned with a penalized energy, they never rank above a feasible one.
+"""
+
+import itertools
+
+import dimod
+import numpy as np
+
+from Decoder import CONTACT_GAP, decode, free_bits, site_keys
+from Energy import get_energy_matrix
+from Lattices import PRESETS, QUBITS_PER_AMINO, move_table, neighbour_offsets
+from QUBO.Direct_BQM import free_qubits, move_codes, qubit_label
+
+MAX_SWEEPS = 50
+
+
+def allowed_codes(num_amino, lattice_type):
+    # Real move codes of every move that agree with its preset qubits
+    qubits = QUBITS_PER_AMINO[lattice_type]
+    moving = np.flatnonzero(move_table(lattice_type).any(axis=1))
+    allowed = []
+    for t in range(num_amino - 1):
+        codes = [code for code in moving.tolist()
+                 if all(code >> (qubits - 1 - q) & 1 == value for (move, q), value in PRESETS[lattice_type].items()
+                        if move == t)]
+        allowed.append(np.array(codes, dtype=np.int64))
+    return allowed
+
+
+def encode_moves(codes, num_amino, lattice_type):
+    # Free move qubits of move code rows, the inverse of move_codes
+    qubits = QUBITS_PER_AMINO[lattice_type]
+    t, q = np.array(free_qubits(num_amino, lattice_type), dtype=np.int64).reshape(-1, 2).T
+    return (codes[:, t] >> (qubits - 1 - q) & 1).astype(np.uint8)
+
+
+def create_windows(allowed, lattice_type):
+    # (first move, moved aminos, candidate tuples, candidate groups) of every move type. A sample's
+    # candidates are the group of its current tuple: every tuple for end moves, the tuples with the same
+    # vector sum for corner flips and crankshafts
+    table = move_table(lattice_type)
+    num_moves = len(allowed)
+    windows = []
+    for length in (1, 2, 3):
+        for first in range(num_moves - length + 1):
+            end = length == 1 and first in (0, num_moves - 1)
+            if length == 1 and not end:
+                continue
+            if first == 0 and end:
+                moved = [0]
+            elif end:
+                moved = [num_moves]
+            else:
+                moved = list(range(first + 1, first + length))
+            tuples = np.array(list(itertools.product(*allowed[first:first + length])), dtype=np.int64)
+            if end:
+                groups = np.zeros(len(tuples), dtype=np.int64)
+            else:
+                sums = table[tuples].sum(axis=1)
+                _, groups = np.unique(sums, axis=0, return_inverse=True)
+                groups = groups.ravel()
+            members = [np.flatnonzero(groups == group) for group in range(groups.max() + 1)]
+            if max(len(member) for member in members) < 2:
+                continue
+            padded = np.full((len(members), max(len(member) for member in members)), -1, dtype=np.int64)
+            for group, member in enumerate(members):
+                padded[group, :len(member)] = member
+            windows.append((first, moved, tuples, groups, padded))
+    return windows
+
+
+def polish(sampleset, sequence, energy_model, lattice_type, max_sweeps=MAX_SWEEPS):
+    """
+    Improve every sample of a sample set by local search on its lattice conformation.
+
+    Parameters
+    ----------
+    sampleset : dimod.SampleSet
+        Samples over the move qubits of sequence (ancillas are ignored).
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    max_sweeps : int
+        Passes over all moves, the search stops earlier once no sample improves.
+
+    Returns
+    -------
+    dimod.SampleSet
+        Polished samples over the free move qubits, aggregated. Feasible rows (self-avoiding
+        with real moves) have their true energy, infeasible ones their contact energy plus a
+        penalty above every feasible energy, so rankings and best energies see feasible rows
+        first. Vectors: is_feasible, contact_energy (unpenalized) and the occurrences of the raw
+        samples they came from.
+    """
+    num_amino = len(sequence)
+    labels = [qubit_label(t, q) for t, q in free_qubits(num_amino, lattice_type)]
+    bits = free_bits(sampleset.record.sample, list(sampleset.variables), num_amino, lattice_type)
+    if num_amino < 3 or not len(bits):
+        return decoded_sampleset(bits, labels, sampleset.record.num_occurrences, sequence, energy_model,
+                                 lattice_type)
+
+    table = move_table(lattice_type)
+    allowed = allowed_codes(num_amino, lattice_type)
+    codes = move_codes(bits, num_amino, lattice_type)
+    for t, codes_t in enumerate(allowed):
+        codes[~np.isin(codes[:, t], codes_t), t] = codes_t[0]
+    rank = np.full((len(allowed), len(table)), -1, dtype=np.int64)
+    for t, codes_t in enumerate(allowed):
+        rank[t, codes_t] = np.arange(len(codes_t))
+
+    positions = np.zeros((len(codes), num_amino, 3), dtype=np.int64)
+    positions[:, 1:] = np.cumsum(table[codes], axis=1)
+
+    # Pair weights of the score: contact energies beyond the bonded neighbours, and a collision penalty
+    # larger than any energy gain
+    energy_matrix = np.triu(get_energy_matrix(sequence, energy_model), CONTACT_GAP)
+    contact_weights = energy_matrix + energy_matrix.T
+    penalty = 1 + np.abs(energy_matrix).sum()
+    width = 8 * num_amino + 1
+    contact_keys = site_keys(neighbour_offsets(lattice_type), width)
+
+    windows = create_windows(allowed, lattice_type)
+    rows = np.arange(len(codes))
+    for _ in range(max_sweeps):
+        improved = False
+        for first, moved, tuples, groups, members in windows:
+            length = tuples.shape[1]
+            current = np.zeros(len(codes), dtype=np.int64)
+            for t in range(first, first + length):
+                current = current * len(allowed[t]) + rank[t, codes[:, t]]
+            candidates = members[groups[current]]
+
+            # Moved aminos of every candidate, walked from the fixed amino before the window (or back
+            # from the one after it for the first move)
+            vectors = table[tuples[np.maximum(candidates, 0)]]
+            if moved == [0]:
+                new_positions = positions[:, None, None, 1] - vectors[:, :, :1]
+            else:
+                new_positions = positions[:, None, None, first] + np.cumsum(vectors, axis=2)[:, :, :len(moved)]
+
+            fixed = np.ones(num_amino, dtype=bool)
+            fixed[moved] = False
+            sites = site_keys(positions, width)
+            weights = contact_weights[moved][:, fixed]
+
+            def score(moved_sites):
+                # Contact energy and collisions of the moved aminos with the fixed ones
+                displacements = moved_sites[..., None] - sites[:, fixed].reshape(
+                    (len(sites),) + (1,) * (moved_sites.ndim - 1) + (-1,))
+                contacts = np.isin(displacements, contact_keys, kind='table')
+                collisions = displacements == 0
+                return (contacts * weights + penalty * collisions).sum(axis=(-1, -2))
+
+            old_score = score(sites[:, moved])
+            new_score = score(site_keys(new_positions, width))
+            new_score[(candidates < 0) | (candidates == current[:, None])] = np.inf
+            best = np.argmin(new_score, axis=1)
+            better = new_score[rows, best] < old_score - 1e-9
+            if not better.any():
+                continue
+
+            improved = True
+            chosen = candidates[better, best[better]]
+            codes[better, first:first + length] = tuples[chosen]
+            positions[np.ix_(better, moved)] = new_positions[better, best[better]]
+        if not improved:
+            break
+
+    return decoded_sampleset(encode_moves(codes, num_amino, lattice_type), labels,
+                             sampleset.record.num_occurrences, sequence, energy_model, lattice_type)
+
+
+def decoded_sampleset(bits, labels, num_occurrences, sequence, energy_model, lattice_type):
+    # Sample set of free move qubits with the contact energy and feasibility of their conformations.
+    # Infeasible rows are ranked by their contact energy plus a penalty above every feasible energy,
+    # a collision otherwise scores like the contacts it fakes
+    _, feasible, contact_energies = decode(bits, labels, sequence, energy_model, lattice_type)
+    penalty = 1 + 2 * np.abs(np.triu(get_energy_matrix(sequence, energy_model), CONTACT_GAP)).sum()
+    energies = np.where(feasible, contact_energies, contact_energies + penalty)
+    return dimod.SampleSet.from_samples((bits, labels), dimod.BINARY, energy=energies, is_feasible=feasible,
+                                        contact_energy=contact_energies,
+                                        num_occurrences=num_occurrences).aggregate()
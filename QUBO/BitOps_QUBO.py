@@ -1,5 +1,269 @@
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+
+import pyqubo
 from pyqubo import *
-from pyqubo import Binary, And, Xor, Not
+from pyqubo import Binary
+
+from QUBO.Gate_Table import build_gate_table
+
+# Gates built by the current thread, read by Instrumentation to count expression nodes per stage
+gate_counter = threading.local()
+
+# Hash-consing tables of the current thread: every distinct polynomial exists once (interned
+# weakly) and, inside gate_scope, every distinct gate is built once and shared by reference
+gate_table = threading.local()
+
+# Population count constructions of the direction sums: the serial half adder cascade
+# (O(k^2) gates for k bits) or a carry-save compressor tree (O(k) gates, logarithmic depth).
+# The tree is opt-in: per-pair sums are short and memoized, so it builds about as many gate
+# nodes (-7% to +5%) while its full adders leave more gates for the objective to read. Measured
+# on direct MJ builds it needs 15-45% more variables than the cascade with the pairwise
+# comparisons (HCOMB4 YGGFMKQ 495 -> 588, 20 aminos 11680 -> 16950), and with signed
+# displacements it saves 2-6% on HCOMB4/8/12 but costs 8% on HCOMB6 (YGGFMKQH 1237 -> 1339).
+# Shared registers build no population counts, the adder does not change them
+ADDERS = ['cascade', 'tree']
+DEFAULT_ADDER = 'cascade'
+
+
+def gate_count():
+    return getattr(gate_counter, 'count', 0)
+
+
+def count_gate():
+    gate_counter.count = gate_count() + 1
+
+
+@contextmanager
+def gate_scope():
+    # Memoize gates for one build and record its gate variables, released when the build finishes
+    previous = tuple(getattr(gate_table, name, None) for name in ('gates', 'records', 'depths'))
+    gate_table.gates = {}
+    gate_table.records = []
+    gate_table.depths = {}
+    try:
+        yield
+    finally:
+        gate_table.gates, gate_table.records, gate_table.depths = previous
+
+
+def scope_gates(variables=None):
+    # GateTable of the gate variables built so far in the current gate_scope. With variables, only
+    # the gates they read (directly or through other gates) are kept: adders also build sum bits
+    # the comparisons never read, and their gate variables would only add penalties
+    records = gate_table.records
+    if variables is not None:
+        needed = set(variables)
+        kept = []
+        # Build order is topological, so back to front sees every reader before the gates it reads
+        for record in reversed(records):
+            label, _, penalty, _ = record
+            if label in needed:
+                kept.append(record)
+                needed.update(variable for term in penalty for variable in term)
+        records = kept[::-1]
+    return build_gate_table(records)
+
+
+def get_adder():
+    return getattr(gate_table, 'adder', DEFAULT_ADDER)
+
+
+@contextmanager
+def adder_scope(adder=DEFAULT_ADDER):
+    # Selects the population count construction of the builds run inside the block
+    if adder not in ADDERS:
+        raise ValueError(f'Unknown adder {adder!r}, expected one of {ADDERS}')
+    previous = get_adder()
+    gate_table.adder = adder
+    try:
+        yield
+    finally:
+        gate_table.adder = previous
+
+
+class Poly:
+    """
+    Hash-consed multilinear polynomial over binary variables.
+
+    Terms map sorted label tuples to their coefficients, with x * x = x. Inside gate_scope a
+    gate output above degree 1 is replaced by a gate variable (see QUBO/Gate_Table.py), so
+    polynomials stay small however deep the circuit behind them. Equal polynomials are the
+    same object, so gate results can be memoized on their inputs. Combining a Poly with a pyqubo expression (e.g. a Placeholder) or
+    compiling it converts it to a flat pyqubo expression.
+
+    Create instances with Num, Var and the gates, never directly.
+    """
+
+    __slots__ = ('terms', 'expression', '__weakref__')
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.expression = None
+
+    def __add__(self, other):
+        if isinstance(other, (int, float)):
+            other = Num(other)
+        elif not isinstance(other, Poly):
+            return self.to_expression() + other
+        terms = dict(self.terms)
+        for term, coefficient in other.terms.items():
+            terms[term] = terms.get(term, 0) + coefficient
+        return poly(terms)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return self * -1
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return poly({term: coefficient * other for term, coefficient in self.terms.items()})
+        elif not isinstance(other, Poly):
+            return self.to_expression() * other
+        terms = {}
+        for left, left_coefficient in self.terms.items():
+            for right, right_coefficient in other.terms.items():
+                term = left if left == right else tuple(sorted(set(left) | set(right)))
+                terms[term] = terms.get(term, 0) + left_coefficient * right_coefficient
+        return poly(terms)
+
+    __rmul__ = __mul__
+
+    def degree(self):
+        return max(map(len, self.terms), default=0)
+
+    def monomials(self):
+        # (labels, coefficient) of every term, labels sorted
+        for term, coefficient in self.terms.items():
+            yield list(term), coefficient
+
+    def to_expression(self):
+        # Flat pyqubo sum of products, built once per polynomial
+        if self.expression is None:
+            expression = pyqubo.Num(0)
+            for monomial, coefficient in self.monomials():
+                term = pyqubo.Num(coefficient)
+                for label in monomial:
+                    term = term * Binary(label)
+                expression = expression + term
+            self.expression = expression
+        return self.expression
+
+    def compile(self, strength=5.0):
+        return self.to_expression().compile(strength)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __repr__(self):
+        return repr(self.to_expression())
+
+
+def poly(terms):
+    # Interned Poly of a term dict, zero terms dropped so equal polynomials match
+    terms = {term: float(coefficient) for term, coefficient in terms.items() if coefficient != 0}
+    polys = getattr(gate_table, 'polys', None)
+    if polys is None:
+        polys = gate_table.polys = weakref.WeakValueDictionary()
+    key = frozenset(terms.items())
+    interned = polys.get(key)
+    if interned is None:
+        interned = polys[key] = Poly(terms)
+    return interned
+
+
+def Num(value):
+    return poly({(): value})
+
+
+def Var(label):
+    return poly({(label,): 1})
+
+
+def gate(name, *inputs, build, penalty=None):
+    # Builds a gate once per distinct (name, inputs) inside gate_scope; inputs are interned Polys,
+    # so identity is equality. Symmetric gates sort their inputs to share both argument orders.
+    # An output above degree 1 becomes a gate variable fixed by penalty
+    inputs = tuple(Num(x) if isinstance(x, (int, float)) else x for x in inputs)
+    gates = getattr(gate_table, 'gates', None)
+    key = (name,) + tuple(sorted(inputs, key=id))
+    if gates is not None and key in gates:
+        return gates[key]
+    count_gate()
+    result = build(*inputs)
+    if gates is not None:
+        if penalty is not None and result.degree() > 1:
+            result = gate_variable(name, result, penalty, inputs)
+        gates[key] = result
+    return result
+
+
+def gate_variable(name, definition, penalty, inputs):
+    # Binary variable standing for a gate output, recorded with its definition and penalty
+    label = f'{name}_{len(gate_table.depths)}'
+    depths = gate_table.depths
+    depths[label] = 1 + max((depths.get(variable, 0) for term in definition.terms for variable in term), default=0)
+    output = Var(label)
+    # The penalty may build helper gates (Xor needs And(a, b)), their records come first
+    penalty_terms = penalty(*inputs, output).terms
+    gate_table.records.append((label, definition.terms, penalty_terms, depths[label]))
+    return output
+
+
+def and_penalty(a, b, g):
+    return 3 * g + a * b - 2 * a * g - 2 * b * g
+
+
+def or_penalty(a, b, g):
+    return a + b + a * b + g - 2 * a * g - 2 * b * g
+
+
+def xor_penalty(a, b, g):
+    difference = a + b - 2 * And(a, b) - g
+    return difference * difference
+
+
+def And(a, b):
+    return gate('and', a, b, build=lambda a, b: a * b, penalty=and_penalty)
+
+
+def Or(a, b):
+    return gate('or', a, b, build=lambda a, b: a + b - a * b, penalty=or_penalty)
+
+
+def Xor(a, b):
+    return gate('xor', a, b, build=lambda a, b: a + b - 2 * a * b, penalty=xor_penalty)
+
+
+def Not(a):
+    return gate('not', a, build=lambda a: 1 - a)
+
+
+def Xnor(a, b):
+    return Not(Xor(a, b))
+
+
+def shared_output(function):
+    # Memoizes an adder inside gate_scope, so every distinct sum register is built once
+    @wraps(function)
+    def wrapper(*args):
+        gates = getattr(gate_table, 'gates', None)
+        if gates is None:
+            return function(*args)
+        key = (function.__name__, get_adder()) + args
+        if key not in gates:
+            gates[key] = function(*args)
+        return list(gates[key])
+    return wrapper
 
 
 def initialize_q_vars(num_amino, qubits_per_amino):
@@ -7,7 +271,7 @@ def initialize_q_vars(num_amino, qubits_per_amino):
     q_vars = {}
     for t in range(num_amino):
         for q in range(qubits_per_amino):
-            q_vars[(t, q)] = Binary(f'q_{t}{chr(ord('a') + q)}')
+            q_vars[(t, q)] = Var(f'q_{t}{chr(ord('a') + q)}')
     return q_vars
 
 def half_adder_array(bit_list):
@@ -30,48 +294,260 @@ def half_adder_loader(bit_list):
     sum_bit_list.append(bit_list[0])
     return sum_bit_list
 
+def full_adder(a, b, carry):
+    a_xor_b = Xor(a, b)
+    return Xor(a_xor_b, carry), Or(And(a, b), And(carry, a_xor_b))
+
+def compressor_tree(bit_list):
+    # Carry-save (Wallace style) population count: each column is reduced three bits at a time
+    # by full adders, sums queue behind the column's remaining bits and carries move to the next
+    # column, so every bit passes O(log k) adders. Little-endian like half_adder_loader and
+    # padded with zeros to its length
+    sum_bit_list = []
+    column = list(bit_list)
+    while column:
+        carries = []
+        while len(column) > 2:
+            sum_bit, carry = full_adder(column.pop(0), column.pop(0), column.pop(0))
+            column.append(sum_bit)
+            carries.append(carry)
+        if len(column) == 2:
+            carries.append(And(column[0], column[1]))
+            column = [Xor(column[0], column[1])]
+        sum_bit_list.append(column[0])
+        column = carries
+
+    sum_bit_list += [Num(0)] * (len(bit_list) - len(sum_bit_list))
+    return sum_bit_list
+
+def population_count(bit_list):
+    # Little-endian count of the set bits, built with the adder selected by adder_scope
+    if get_adder() == 'tree':
+        return compressor_tree(bit_list)
+    return half_adder_loader(bit_list)
+
+def energy_label(amino1, amino2):
+    return f'e_{amino1}_{amino2}'
+
+def placeholder_energy_matrix(num_amino):
+    # Pair energies as Placeholders, filled in per sequence through feed_dict
+    return [[Placeholder(energy_label(amino1, amino2)) for amino2 in range(num_amino)] for amino1 in range(num_amino)]
+
+@shared_output
 def sum_of_directions(dir_func, amino_start, amino_end):
     bit_list = []
     for i in range(amino_end - amino_start):
         bit_list.append(dir_func(amino_start + i))
 
-    return half_adder_loader(bit_list)
+    return population_count(bit_list)
 
 
+@shared_output
 def sum_of_directions_plus_one(dir_func, amino_start, amino_end):
     bit_list = [Num(1)]
     for i in range(amino_end - amino_start):
         bit_list.append(dir_func(amino_start + i))
 
-    return half_adder_loader(bit_list)
+    return population_count(bit_list)
 
 
+@shared_output
 def sum_of_y(dir_func1, dir_func2, amino_start, amino_end):
     bit_list = []
     for i in range(amino_end - amino_start):
         bit_list.append(dir_func1(amino_start + i))
         bit_list.append(dir_func2(amino_start + i))
 
-    return half_adder_loader(bit_list)
+    return population_count(bit_list)
 
 
+@shared_output
 def sum_of_y_plus_one(dir_func1, dir_func2, amino_start, amino_end):
     bit_list = [Num(1)]
     for i in range(amino_end - amino_start):
         bit_list.append(dir_func1(amino_start + i))
         bit_list.append(dir_func2(amino_start + i))
 
-    return half_adder_loader(bit_list)
+    return population_count(bit_list)
 
 
+@shared_output
 def sum_of_y_plus_two(dir_func1, dir_func2, amino_start, amino_end):
     bit_list = [Num(1), Num(1)]
     for i in range(amino_end - amino_start):
         bit_list.append(dir_func1(amino_start + i))
         bit_list.append(dir_func2(amino_start + i))
 
-    return half_adder_loader(bit_list)
+    return population_count(bit_list)
 
 
-def Xnor(a, b):
-    return 1 - a - b + 2 * a * b
+
+def increment_register(register, bit, width):
+    # Ripple a single bit into a little-endian register, keeping at most width bits
+    sum_bits = []
+    carry = bit
+    for reg_bit in register:
+        sum_bits.append(Xor(reg_bit, carry))
+        carry = And(reg_bit, carry)
+
+    if len(sum_bits) < width:
+        sum_bits.append(carry)
+    return sum_bits
+
+
+def prefix_registers(dir_funcs, num_amino):
+    # Running count of the direction predicates over the moves before each amino
+    # registers[a] holds the count over moves 0 .. a - 1 (little-endian bits)
+    # Shared registers are opt-in: their comparisons are exact, but every pair compares wide position
+    # sums where the default compares short memoized per-pair sums. On direct MJ builds they need
+    # 22-67% more variables than the pairwise comparisons (HCOMB4 YGGFMKQ 495 -> 623, 20 aminos
+    # 11680 -> 19482, 1.3x the build time), and with signed displacements they save 2-17% against
+    # signed displacements alone on HCOMB4/6/8/12 (20 aminos 13295 -> 11035)
+    registers = [[]]
+    for t in range(num_amino - 1):
+        register = registers[-1]
+        width = ((t + 1) * len(dir_funcs)).bit_length()
+        for dir_func in dir_funcs:
+            register = increment_register(register, dir_func(t), width)
+        registers.append(register)
+    return registers
+
+
+def add_registers(a_bits, b_bits, carry=Num(0)):
+    # Ripple-carry full adder over two little-endian registers
+    width = max(len(a_bits), len(b_bits))
+    sum_bits = []
+    for bit in range(width):
+        x = a_bits[bit] if bit < len(a_bits) else Num(0)
+        y = b_bits[bit] if bit < len(b_bits) else Num(0)
+        x_xor_y = Xor(x, y)
+        sum_bits.append(Xor(x_xor_y, carry))
+        carry = Or(And(x, y), And(carry, x_xor_y))
+    sum_bits.append(carry)
+    return sum_bits
+
+
+def registers_equal(a_bits, b_bits):
+    # Bitwise Xnor comparison of two little-endian registers of any width
+    equal = Num(1)
+    for bit in range(max(len(a_bits), len(b_bits))):
+        x = a_bits[bit] if bit < len(a_bits) else Num(0)
+        y = b_bits[bit] if bit < len(b_bits) else Num(0)
+        equal = And(equal, Xnor(x, y))
+    return equal
+
+
+def constant_register(value):
+    # Little-endian register holding a non-negative constant
+    return [Num((value >> bit) & 1) for bit in range(value.bit_length())]
+
+
+def prefix_displacement_equal(plus_registers, minus_registers, amino1, amino2, displacement=0):
+    # Tests (plus - minus) over moves amino1 .. amino2 - 1 == displacement from the shared prefix registers:
+    # plus[amino2] + minus[amino1] == minus[amino2] + plus[amino1] + displacement
+    left_offset = max(-displacement, 0)
+    right_offset = max(displacement, 0)
+
+    left = add_registers(plus_registers[amino2], minus_registers[amino1], Num(left_offset & 1))
+    right = add_registers(minus_registers[amino2], plus_registers[amino1], Num(right_offset & 1))
+    if left_offset >> 1:
+        left = add_registers(left, constant_register(left_offset & ~1))
+    if right_offset >> 1:
+        right = add_registers(right, constant_register(right_offset & ~1))
+
+    return registers_equal(left, right)
+
+
+def extend_register(bits, width):
+    # Little-endian register cut or zero extended to width bits
+    return list(bits[:width]) + [Num(0)] * (width - len(bits))
+
+
+def subtract_registers(a_bits, b_bits, width):
+    # Two's complement a - b over width bits: a + ~b + 1
+    inverted = [Not(bit) for bit in extend_register(b_bits, width)]
+    return add_registers(extend_register(a_bits, width), inverted, Num(1))[:width]
+
+
+def register_equals_constant(register, value):
+    # Tests a two's complement register against a constant with one literal per bit
+    width = len(register)
+    if not -(1 << (width - 1)) <= value < 1 << (width - 1):
+        return Num(0)
+    equal = Num(1)
+    for bit, register_bit in enumerate(register):
+        equal = And(equal, register_bit if value >> bit & 1 else Not(register_bit))
+    return equal
+
+
+class SignedDisplacements:
+    """
+    Signed displacement of amino pairs along each axis, compared against constants.
+
+    Every axis keeps a single two's complement counter of plus moves minus minus moves instead
+    of separate plus and minus sums (with their +1 and +2 variants) compared bit by bit with
+    Xnor, so the contact and overlap tests only match registers against small constants. The
+    registers are wide enough for every reachable displacement, so the tests are exact like the
+    shared register build.
+
+    Parameters
+    ----------
+    axes : dict
+        (plus predicates, minus predicates) of every axis, each called with a move index. A move
+        counts once for every predicate it satisfies.
+    num_amino : int
+        Chain length.
+    contact_offsets : np.ndarray
+        (k, len(axes)) displacements of two aminos in contact, in the order of axes.
+    shared_registers : bool
+        Derive every pair from one signed position register per amino and axis instead of
+        counting the moves between the pair. Smaller than signed displacements alone, see
+        prefix_registers for measured sizes.
+    """
+
+    def __init__(self, axes, num_amino, contact_offsets, shared_registers=False):
+        self.axes = axes
+        self.contact_offsets = [tuple(int(value) for value in offset) for offset in contact_offsets]
+        self.displacements = {}
+        self.positions = None
+        if shared_registers:
+            self.positions = {}
+            for axis, (plus_funcs, minus_funcs) in axes.items():
+                # Positions and their differences stay within +-(num_amino - 1) * moves counted per step
+                width = ((num_amino - 1) * max(len(plus_funcs), len(minus_funcs))).bit_length() + 1
+                plus_registers = prefix_registers(plus_funcs, num_amino)
+                minus_registers = prefix_registers(minus_funcs, num_amino)
+                self.positions[axis] = [subtract_registers(plus, minus, width)
+                                        for plus, minus in zip(plus_registers, minus_registers)]
+
+    def displacement(self, axis, amino1, amino2):
+        # Two's complement position[amino2] - position[amino1] along axis
+        key = (axis, amino1, amino2)
+        if key not in self.displacements:
+            if self.positions is not None:
+                positions = self.positions[axis]
+                register = subtract_registers(positions[amino2], positions[amino1], len(positions[amino2]))
+            else:
+                plus_funcs, minus_funcs = self.axes[axis]
+                plus_bits = [dir_func(t) for t in range(amino1, amino2) for dir_func in plus_funcs]
+                minus_bits = [dir_func(t) for t in range(amino1, amino2) for dir_func in minus_funcs]
+                width = max(len(plus_bits), len(minus_bits)).bit_length() + 1
+                register = subtract_registers(population_count(plus_bits), population_count(minus_bits), width)
+            self.displacements[key] = register
+        return self.displacements[key]
+
+    def displacement_equals(self, amino1, amino2, offset):
+        equal = Num(1)
+        for axis, value in zip(self.axes, offset):
+            equal = And(equal, register_equals_constant(self.displacement(axis, amino1, amino2), value))
+        return equal
+
+    def contact(self, amino1, amino2):
+        # A displacement matches at most one offset, so the Or of the matches is their sum
+        adjacent = Num(0)
+        for offset in self.contact_offsets:
+            adjacent = adjacent + self.displacement_equals(amino1, amino2, offset)
+        return adjacent
+
+    def overlap(self, amino1, amino2):
+        return self.displacement_equals(amino1, amino2, (0,) * len(self.axes))
@@ -0,0 +1,320 @@
+"""
+Direct-to-BQM compiler and exact evaluator of the lattice energy functions.
+
+compile_bqm takes the objective and the gate table of a QUBO/HCOMB*_QUBO.py builder and
+writes them straight into the index/coefficient arrays of a dimod BQM, skipping the pyqubo
+expression and model.compile(). The objective is linear in the gate variables, so nothing is
+quadratized, and the gate penalties come from the GateTable arrays.
+
+evaluate_energy_function evaluates the same energy function with NumPy for batches of free
+qubit assignments. It reproduces the circuits, including the truncated bitwise comparison of
+the pairwise direction sums (or the exact comparison of the shared register and signed
+modes), so the compiled models can be checked against it. compile_polynomial turns its
+energies into the higher-order polynomial over the free qubits alone, and expand_polynomial
+does the same for a builder objective.
+"""
+
+import dimod
+import numpy as np
+
+from Energy import get_energy_matrix
+from Lattices import QUBITS_PER_AMINO, PRESETS, move_table, neighbour_offsets
+
+MAX_FREE_QUBITS = 24
+CHUNK_ROWS = 1 << 16
+
+# Per lattice: interaction gap, overlap gap, compile strength and fixed penalty (None = from energies)
+BUILD_PARAMETERS = {
+    4: (3, 4, 5, None),
+    6: (3, 4, 5, None),
+    8: (2, 3, 1, 40),
+    12: (2, 3, 1, 40),
+}
+
+# Index separation step of the contact and overlap pairs, 2 on the bipartite lattices
+PAIR_STEP = {4: 2, 6: 2, 8: 1, 12: 1}
+
+# Extra comparison bits per axis: HCOMB8 compares the doubled y sums (sum_of_y) on one more bit
+EXTRA_BITS = {
+    4: (0, 0, 0),
+    6: (0, 0, 0),
+    8: (0, 1, 0),
+    12: (0, 0, 0),
+}
+
+
+def compile_bqm(sequence, energy_model, lattice_type, shared_registers=False, signed_displacements=False):
+    """
+    Compile the energy function of a sequence straight into a dimod BQM.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    shared_registers, signed_displacements : bool
+        Builder options, see main.py.
+
+    Returns
+    -------
+    bqm : dimod.BinaryQuadraticModel
+        Binary BQM over the free qubits and gate variables, labelled like the pyqubo models,
+        gate penalties included.
+    gates : GateTable
+        The gate variables of the model.
+    """
+    objective, gates = build_objective(sequence, energy_model, lattice_type, shared_registers,
+                                       signed_displacements)
+    return gates.penalize(objective_bqm(objective)), gates
+
+
+def compile_polynomial(sequence, energy_model, lattice_type, exact=False):
+    """
+    Compile the energy function of a sequence into a higher-order binary polynomial over the free qubits.
+
+    Every free-qubit assignment is evaluated with evaluate_energy_function and the Moebius
+    transform of the energies gives the multilinear coefficients, so there are no gate
+    variables. Limited to MAX_FREE_QUBITS free qubits.
+
+    Parameters
+    ----------
+    sequence, energy_model, lattice_type
+        As in compile_bqm.
+    exact : bool
+        Compare the displacements exactly, as the shared register and signed builds do.
+
+    Returns
+    -------
+    dimod.BinaryPolynomial
+        Binary polynomial over the free qubits.
+    """
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    return multilinear_polynomial(
+        lambda bits: evaluate_energy_function(sequence, energy_model, lattice_type, bits, exact), labels)
+
+
+def expand_polynomial(objective, gates, labels):
+    """
+    Expand a builder objective into a polynomial over the free qubits.
+
+    The objective is evaluated on every free-qubit assignment with its gate variables set to
+    their circuit values, and the energies are turned back into multilinear coefficients.
+
+    Parameters
+    ----------
+    objective : QUBO.BitOps_QUBO.Poly
+        Objective over the free qubits and gate variables.
+    gates : GateTable
+        The gate variables of objective.
+    labels : list
+        Free qubit labels.
+
+    Returns
+    -------
+    dimod.BinaryPolynomial
+        Binary polynomial over the free qubits.
+    """
+    polynomial = dimod.BinaryPolynomial({tuple(term): bias for term, bias in objective.monomials()}, dimod.BINARY)
+    variables = list(dict.fromkeys(labels + gates.labels() + list(polynomial.variables)))
+
+    def evaluate(bits):
+        samples = np.zeros((bits.shape[0], len(variables)), dtype=np.int8)
+        samples[:, :len(labels)] = bits
+        return polynomial.energies((gates.complete(samples, variables), variables))
+
+    # complete() holds every gate variable of a chunk, so the chunks are smaller than the evaluator's
+    return multilinear_polynomial(evaluate, labels, CHUNK_ROWS // 16)
+
+
+def multilinear_polynomial(evaluate, labels, chunk_rows=CHUNK_ROWS):
+    # Polynomial over labels taking the values evaluate gives on the truth table rows
+    if len(labels) > MAX_FREE_QUBITS:
+        raise ValueError(f'{len(labels)} free qubits exceed the polynomial compiler limit of {MAX_FREE_QUBITS}.')
+    energies = np.empty(1 << len(labels))
+    for start in range(0, energies.size, chunk_rows):
+        stop = min(start + chunk_rows, energies.size)
+        energies[start:stop] = evaluate(truth_table(len(labels), start, stop))
+
+    coefficients = multilinear_coefficients(energies)
+    masks = np.flatnonzero(np.abs(coefficients) > 1e-9)
+    return dimod.BinaryPolynomial({tuple(labels[i] for i in range(len(labels)) if mask >> i & 1): coefficients[mask]
+                                   for mask in masks.tolist()}, dimod.BINARY)
+
+
+def multilinear_coefficients(values):
+    # Moebius transform: entry mask becomes the coefficient of the product of the qubits in mask
+    coefficients = values.copy()
+    for bit in range(coefficients.size.bit_length() - 1):
+        view = coefficients.reshape(-1, 2, 1 << bit)
+        view[:, 1, :] -= view[:, 0, :]
+    return coefficients
+
+
+def build_objective(sequence, energy_model, lattice_type, shared_registers=False, signed_displacements=False):
+    # Objective polynomial and GateTable of the lattice's builder
+    from QUBO import HCOMB4_QUBO, HCOMB6_QUBO, HCOMB8_QUBO, HCOMB12_QUBO
+
+    builders = {4: HCOMB4_QUBO, 6: HCOMB6_QUBO, 8: HCOMB8_QUBO, 12: HCOMB12_QUBO}
+    return builders[lattice_type].create_polynomial(sequence, energy_model, shared_registers,
+                                                    signed_displacements=signed_displacements)
+
+
+def objective_bqm(objective):
+    """
+    BQM of a builder objective of degree at most 2, built from index and coefficient arrays.
+
+    Parameters
+    ----------
+    objective : QUBO.BitOps_QUBO.Poly
+        Objective over the free qubits and gate variables.
+
+    Returns
+    -------
+    dimod.BinaryQuadraticModel
+        Binary BQM of the objective.
+    """
+    if objective.degree() > 2:
+        raise ValueError(f'Objective of degree {objective.degree()}, expected a quadratic objective.')
+    labels = sorted({label for term in objective.terms for label in term})
+    index = {label: position for position, label in enumerate(labels)}
+    terms = [([index[label] for label in term], bias) for term, bias in objective.terms.items()]
+
+    offset = sum(bias for term, bias in terms if not term)
+    linear = np.zeros(len(labels))
+    linear[[term[0] for term, _ in terms if len(term) == 1]] = [bias for term, bias in terms if len(term) == 1]
+    pairs = np.array([term for term, _ in terms if len(term) == 2], dtype=np.int64).reshape(-1, 2)
+    biases = np.array([bias for term, bias in terms if len(term) == 2], dtype=np.float64)
+    return dimod.BinaryQuadraticModel.from_numpy_vectors(linear, (pairs[:, 0], pairs[:, 1], biases), offset,
+                                                         dimod.BINARY, variable_order=labels)
+
+
+def free_qubits(num_amino, lattice_type):
+    # Move qubits left free by set_default, only moves 0 .. num_amino - 2 enter the energy
+    presets = PRESETS[lattice_type]
+    return [(t, q) for t in range(num_amino - 1) for q in range(QUBITS_PER_AMINO[lattice_type])
+            if (t, q) not in presets]
+
+
+def qubit_label(t, q):
+    return f'q_{t}{chr(ord("a") + q)}'
+
+
+def truth_table(num_free, start, stop):
+    # Row r assigns bit i of r to free qubit i
+    rows = np.arange(start, stop, dtype=np.int64)
+    return ((rows[:, None] >> np.arange(num_free)) & 1).astype(np.uint8)
+
+
+def move_codes(bits, num_amino, lattice_type):
+    # Restore the preset qubits and read every move code with the first qubit as the high bit
+    qubits = QUBITS_PER_AMINO[lattice_type]
+    num_moves = num_amino - 1
+    all_bits = np.zeros((bits.shape[0], num_moves, qubits), dtype=np.int64)
+    for (t, q), value in PRESETS[lattice_type].items():
+        if t < num_moves:
+            all_bits[:, t, q] = value
+    for column, (t, q) in enumerate(free_qubits(num_amino, lattice_type)):
+        all_bits[:, t, q] = bits[:, column]
+
+    weights = 1 << np.arange(qubits - 1, -1, -1)
+    return all_bits @ weights
+
+
+def evaluate_energy_function(sequence, energy_model, lattice_type, bits, shared_registers=False, pair_step=None):
+    """
+    Energy function of the QUBO builders for a batch of free-qubit assignments.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    bits : np.ndarray
+        (num_samples, num_free) 0/1 array ordered like free_qubits.
+    shared_registers : bool
+        Use exact displacement comparisons instead of the truncated pairwise ones.
+    pair_step : int or None
+        Index separation step of the pairs, PAIR_STEP of the lattice by default.
+
+    Returns
+    -------
+    np.ndarray
+        Energy of every assignment, ancillas taken at their consistent values.
+    """
+    num_amino = len(sequence)
+    interaction_gap, overlap_gap, _, fixed_penalty = BUILD_PARAMETERS[lattice_type]
+    energy_matrix = get_energy_matrix(sequence, energy_model)
+    pair_step = pair_step or PAIR_STEP[lattice_type]
+
+    contact_pairs = [(amino1, amino2) for amino1 in range(num_amino)
+                     for amino2 in range(amino1 + interaction_gap, num_amino, pair_step)
+                     if energy_matrix[amino1][amino2] != 0]
+    overlap_pairs = [(amino1, amino2) for amino1 in range(num_amino)
+                     for amino2 in range(amino1 + overlap_gap, num_amino, pair_step)]
+    energy_values = np.array([energy_matrix[amino1][amino2] for amino1, amino2 in contact_pairs])
+    penalty = fixed_penalty if fixed_penalty is not None else (sum(energy_values) * -1) + 1
+
+    vectors = move_table(lattice_type)[move_codes(bits, num_amino, lattice_type)]
+    positions = np.zeros((bits.shape[0], num_amino, 3), dtype=np.int64)
+    positions[:, 1:] = np.cumsum(vectors, axis=1)
+    extra_bits = EXTRA_BITS[lattice_type]
+
+    energy = np.zeros(bits.shape[0])
+    if contact_pairs:
+        contacts = np.zeros((bits.shape[0], len(contact_pairs)), dtype=bool)
+        for offset in neighbour_offsets(lattice_type):
+            contacts |= displacement_matches(positions, contact_pairs, offset, extra_bits, shared_registers)
+        energy += contacts @ energy_values
+
+    if overlap_pairs:
+        overlaps = displacement_matches(positions, overlap_pairs, np.zeros(3, dtype=np.int64), extra_bits,
+                                        shared_registers)
+        energy += penalty * overlaps.any(axis=1)
+
+    # Redundant codes move nowhere, opposite consecutive moves walk back onto the previous amino
+    moving = vectors.any(axis=2)
+    energy += penalty * (~moving).any(axis=1)
+    back = moving[:, :-1] & ~(vectors[:, :-1] + vectors[:, 1:]).any(axis=2)
+    energy += penalty * back.any(axis=1)
+
+    return energy
+
+
+def displacement_matches(positions, pairs, offset, extra_bits, exact):
+    # Tests position[amino2] - position[amino1] == offset on every axis of every pair.
+    # The pairwise circuits only compare the low ceil(log2(L + |offset|)) bits of the sums,
+    # i.e. they test equality modulo a power of two
+    amino1 = np.array([pair[0] for pair in pairs])
+    amino2 = np.array([pair[1] for pair in pairs])
+    difference = positions[:, amino2] - positions[:, amino1] - offset
+    if exact:
+        return ~difference.any(axis=2)
+
+    masks = np.array([[(1 << ((a2 - a1 + abs(int(component)) - 1).bit_length() + extra)) - 1
+                       for component, extra in zip(offset, extra_bits)]
+                      for a1, a2 in pairs])
+    return ~(difference & masks).any(axis=2)
+
+
+def is_ancilla(label):
+    # Every variable but the move qubits is a gate variable. Product ancillas of older pickles
+    # ('q_0c * q_1a') start like qubits, so the '*' marks them
+    label = str(label)
+    return '*' in label or not label.startswith('q_')
+
+
+def consistent_energies(bqm, gates, labels, bits):
+    # BQM energy of free-qubit assignments with every gate variable set to the value of its circuit
+    variables = list(bqm.variables)
+    columns = {label: column for column, label in enumerate(labels)}
+    sample = np.zeros((bits.shape[0], len(variables)), dtype=np.int8)
+    for index, variable in enumerate(variables):
+        if variable in columns:
+            sample[:, index] = bits[:, columns[variable]]
+    return bqm.energies((gates.complete(sample, variables), variables))
@@ -0,0 +1,270 @@
+"""
+Gate variables of a build and the circuit definitions that fix them.
+
+Inside gate_scope, a gate whose output would exceed degree 1 gets a binary gate variable g
+instead. The gate's definition R (the exact multilinear expansion of the gate over its
+inputs) fixes g = R. Its penalty P is zero when g = R and at least 1 otherwise:
+    And: 3g + ab - 2ag - 2bg
+    Or:  a + b + ab + g - 2ag - 2bg
+    Xor: (a + b - 2c - g)^2, with c = And(a, b)
+
+Every penalty is a non-negative integer, zero exactly when its gate variable agrees with
+the gate's inputs. Each penalty is scaled by 1 + the weight (sum of absolute objective
+coefficients) of its gate and of the gates reading it directly. Flipping a gate variable of
+a consistent assignment, alone or together with the gates that read it, therefore raises the
+energy, and the consistent assignments keep the energies of the circuits. The bound is per
+gate and does not add up the weights of everything downstream, so the coefficients stay
+within a small multiple of the objective's. It does not make every inconsistent assignment
+costlier than its completion, so an annealed sample is only scored after complete().
+
+A GateTable holds the gates as arrays over variable labels, so it pickles next to its BQM.
+Solvers use it to turn the gate definitions into CQM constraints and to set the gate
+variables of samples to their consistent values.
+"""
+
+import dimod
+import numpy as np
+
+
+class GateTable:
+    """
+    Gate variables of one build with their definitions and penalties.
+
+    Parameters
+    ----------
+    variables : list
+        Labels of every variable the gates refer to (free qubits and gate variables).
+    outputs : np.ndarray
+        Index into variables of the gate variable of every gate, in build order.
+    depths : np.ndarray
+        Depth of every gate: 1 + the largest depth of the gate variables in its definition,
+        free qubits have depth 0. A gate only reads gates of smaller depth.
+    definitions : tuple
+        (indptr, terms, coefficients) of the definition polynomials: the terms of gate i are
+        rows indptr[i]:indptr[i + 1] of terms, variable indices padded with -1.
+    penalties : tuple
+        (indptr, terms, coefficients) of the penalty polynomials, stored like definitions.
+    """
+
+    def __init__(self, variables, outputs, depths, definitions, penalties):
+        self.variables = variables
+        self.outputs = outputs
+        self.depths = depths
+        self.definitions = definitions
+        self.penalties = penalties
+
+    def __len__(self):
+        return len(self.outputs)
+
+    def labels(self):
+        # Gate variable labels in build order
+        return [self.variables[output] for output in self.outputs.tolist()]
+
+    def strengths(self, weights):
+        """
+        Penalty strength of every gate.
+
+        Parameters
+        ----------
+        weights : np.ndarray
+            Objective weight of every variable of the table: the sum of the absolute
+            coefficients of the objective terms that contain it.
+
+        Returns
+        -------
+        np.ndarray
+            1 + the weight of the gate variable and of the gate variables of the gates that
+            read it directly.
+        """
+        indptr, terms, _ = self.penalties
+        gate_of = np.full(len(self.variables) + 1, -1, dtype=np.int64)
+        gate_of[self.outputs] = np.arange(len(self))
+        # A gate reads every gate variable of its penalty but its own, the helper And of a Xor included
+        readers = np.repeat(np.arange(len(self)), np.diff(indptr))[:, None]
+        sources = gate_of[terms]
+        edges = np.unique(np.stack([sources.ravel(), np.broadcast_to(readers, sources.shape).ravel()], axis=1),
+                          axis=0)
+        edges = edges[(edges[:, 0] >= 0) & (edges[:, 0] != edges[:, 1])]
+
+        gate_weights = weights[self.outputs].astype(np.float64)
+        strengths = 1.0 + gate_weights
+        np.add.at(strengths, edges[:, 0], gate_weights[edges[:, 1]])
+        return strengths
+
+    def penalty_bqm(self, strengths=None):
+        """
+        Sum of the gate penalties (quadratic with the default degree) as a BQM.
+
+        Parameters
+        ----------
+        strengths : np.ndarray or None
+            Scale of the penalty of every gate, 1 by default.
+
+        Returns
+        -------
+        dimod.BinaryQuadraticModel
+            The scaled penalties, labelled like the build.
+        """
+        indptr, terms, coefficients = self.penalties
+        if strengths is not None:
+            coefficients = coefficients * np.repeat(strengths, np.diff(indptr))
+        if terms.shape[1] > 2:
+            raise ValueError('Gate penalties above degree 2, the build was not quadratic.')
+        terms = np.pad(terms, ((0, 0), (0, 2 - terms.shape[1])), constant_values=-1)
+        offset = coefficients[terms[:, 0] < 0].sum()
+        linear_rows = (terms[:, 0] >= 0) & (terms[:, 1] < 0)
+        linear = np.bincount(terms[linear_rows, 0], coefficients[linear_rows], len(self.variables))
+        quadratic_rows = terms[:, 1] >= 0
+        # Equal pairs of different gates are summed once
+        pairs, inverse = np.unique(terms[quadratic_rows], axis=0, return_inverse=True)
+        biases = np.bincount(inverse.ravel(), coefficients[quadratic_rows], len(pairs))
+        return dimod.BinaryQuadraticModel.from_numpy_vectors(linear, (pairs[:, 0], pairs[:, 1], biases), offset,
+                                                             dimod.BINARY, variable_order=self.variables)
+
+    def penalize(self, bqm):
+        """
+        Add the gate penalties to an objective BQM at a strength that keeps its ground states.
+
+        Parameters
+        ----------
+        bqm : dimod.BinaryQuadraticModel
+            Objective over the free qubits and gate variables, binary.
+
+        Returns
+        -------
+        dimod.BinaryQuadraticModel
+            New BQM, objective + the penalties at their strengths.
+        """
+        penalized = bqm.copy()
+        if len(self):
+            weights = self.objective_weights(((u,), bias) for u, bias in bqm.linear.items())
+            weights += self.objective_weights(((u, v), bias) for (u, v), bias in bqm.quadratic.items())
+            penalized.update(self.penalty_bqm(self.strengths(weights)))
+        return penalized
+
+    def objective_weights(self, terms):
+        # Sum of |bias| of the (variables, bias) terms over every variable of the table they contain
+        index = {label: position for position, label in enumerate(self.variables)}
+        weights = np.zeros(len(self.variables))
+        for variables, bias in terms:
+            for variable in variables:
+                if variable in index:
+                    weights[index[variable]] += abs(bias)
+        return weights
+
+    def constraints(self):
+        """
+        Gate definitions as CQM constraints g - (R - c) == c, c the constant term of R.
+
+        Returns
+        -------
+        generator
+            (gate label, terms, rhs) per gate: terms as (u, bias) and (u, v, bias) tuples for
+            ConstrainedQuadraticModel.add_constraint_from_iterable, rhs the constant c.
+        """
+        indptr, terms, coefficients = self.definitions
+        if terms.shape[1] > 2:
+            raise ValueError('Gate definitions above degree 2, the build was not quadratic.')
+        variables = self.variables
+        rows = [tuple(variables[index] for index in row if index >= 0) for row in terms.tolist()]
+        biases = (-coefficients).tolist()
+        for gate, output in enumerate(self.outputs.tolist()):
+            gate_terms = [(variables[output], 1.0)]
+            rhs = 0.0
+            for row in range(indptr[gate], indptr[gate + 1]):
+                if rows[row]:
+                    gate_terms.append((*rows[row], biases[row]))
+                else:
+                    rhs -= biases[row]
+            yield variables[output], gate_terms, rhs
+
+    def complete(self, samples, variables):
+        """
+        Set the gate variables of samples to the values their circuits give.
+
+        Gates are evaluated depth by depth, each depth in one vectorized step over all samples.
+        Free qubits missing from variables read as 0.
+
+        Parameters
+        ----------
+        samples : np.ndarray
+            (num_samples, len(variables)) 0/1 array.
+        variables : list
+            Labels of the columns of samples.
+
+        Returns
+        -------
+        np.ndarray
+            Copy of samples with every gate variable column consistent.
+        """
+        samples = np.array(samples, dtype=np.int8)
+        if not len(self):
+            return samples
+        column = {label: index for index, label in enumerate(variables)}
+        present = np.array([index for index, label in enumerate(self.variables) if label in column], dtype=np.int64)
+        columns = np.array([column[self.variables[index]] for index in present.tolist()], dtype=np.int64)
+
+        # The last column stays 1, so the -1 padding of the term rows multiplies by one
+        values = np.ones((samples.shape[0], len(self.variables) + 1), dtype=np.int64)
+        values[:, :-1] = 0
+        values[:, present] = samples[:, columns]
+
+        indptr, terms, coefficients = self.definitions
+        coefficients = np.rint(coefficients).astype(np.int64)
+        order = np.argsort(self.depths, kind='stable')
+        boundaries = np.flatnonzero(np.diff(self.depths[order])) + 1
+        for level in np.split(order, boundaries):
+            counts = indptr[level + 1] - indptr[level]
+            rows = np.repeat(indptr[level] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            term_values = values[:, terms[rows]].prod(axis=2) * coefficients[rows]
+            starts = np.cumsum(counts) - counts
+            values[:, self.outputs[level]] = np.add.reduceat(term_values, starts, axis=1)
+
+        samples[:, columns] = values[:, present]
+        return samples
+
+
+def table_arrays(polynomials, index):
+    # (indptr, terms, coefficients) of a list of term dicts {label tuple: coefficient}
+    width = max((len(term) for terms in polynomials for term in terms), default=0)
+    counts = [len(terms) for terms in polynomials]
+    rows = [[index[label] for label in term] + [-1] * (width - len(term)) for terms in polynomials for term in terms]
+    coefficients = [coefficient for terms in polynomials for coefficient in terms.values()]
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return (indptr, np.array(rows, dtype=np.int64).reshape(len(rows), width),
+            np.array(coefficients, dtype=np.float64))
+
+
+def build_gate_table(records):
+    """
+    GateTable of the gate records of a build.
+
+    Parameters
+    ----------
+    records : list
+        (gate label, definition terms, penalty terms, depth) per gate in build order, terms as
+        {label tuple: coefficient} dicts.
+
+    Returns
+    -------
+    GateTable
+        The gates as arrays.
+    """
+    variables = []
+    index = {}
+    for label, definition, penalty, _ in records:
+        for terms in (definition, penalty):
+            for term in terms:
+                for variable in term:
+                    if variable not in index:
+                        index[variable] = len(variables)
+                        variables.append(variable)
+        if label not in index:
+            index[label] = len(variables)
+            variables.append(label)
+
+    outputs = np.array([index[label] for label, _, _, _ in records], dtype=np.int64)
+    depths = np.array([depth for _, _, _, depth in records], dtype=np.int64)
+    definitions = table_arrays([definition for _, definition, _, _ in records], index)
+    penalties = table_arrays([penalty for _, _, penalty, _ in records], index)
+    return GateTable(variables, outputs, depths, definitions, penalties)
@@ -12,39 +12,272 @@ import math
 from Energy import get_energy_matrix
 from pyqubo import *
 from QUBO.BitOps_QUBO import sum_of_directions, sum_of_directions_plus_one, initialize_q_vars
+from QUBO.BitOps_QUBO import prefix_registers, prefix_displacement_equal, placeholder_energy_matrix
+from QUBO.BitOps_QUBO import SignedDisplacements
 from pprint import pprint
-from QUBO.BitOps_QUBO import Xnor
-
-
-def create_energy_function(sequence, energy_model):
-    num_amino = len(sequence)
-    global q_vars
-    q_vars = initialize_q_vars(num_amino, 2)
-    q_vars = set_default(q_vars)
-
-    energy_matrix = get_energy_matrix(sequence, energy_model)
-    interactions, energy_values = create_interactions(sequence, energy_matrix)
-    total_interaction_energy = Num(0)
-    for i in range(len(interactions)):
-        interaction_value = interactions[i] * energy_values[i]
-        total_interaction_energy = total_interaction_energy + interaction_value
-
-    penalty = (sum(energy_values) * -1) + 1
-
-    overlap = create_overlap_constraint(num_amino)
-    overlap = Num(penalty) * overlap
-
-    back = create_back_constraint(num_amino)
-    back = Num(penalty) * back
-
-    model = total_interaction_energy + overlap + back
-    model = model.compile(5)
-
-    bqm = model.to_bqm()
-    qubo = model.to_qubo()
-    ising = model.to_ising()
-
-    return model, bqm, qubo, ising
+from QUBO.BitOps_QUBO import And, Or, Not, Xnor, Num, gate_scope, scope_gates
+from Instrumentation import stage, bqm_sizes, qubo_sizes
+from Lattices import neighbour_offsets
+
+
+INTERACTION_GAP = 3
+COMPILE_STRENGTH = 5
+OVERLAP_GAP = 4
+# Bipartite lattice: aminos can only touch at odd index separations and only overlap at even ones,
+# so both pair loops step by two
+PAIR_STEP = 2
+
+
+class HCOMB4Builder:
+    """
+    Builds the HCOMB4 energy function of one chain length.
+
+    The builder owns its qubit table and the direction predicates read from it, so separate
+    builders can run in parallel threads or processes.
+    """
+
+    def __init__(self, num_amino):
+        self.num_amino = num_amino
+        self.q_vars = set_default(initialize_q_vars(num_amino, 2))
+
+    @gate_scope()
+    def create_polynomial(self, sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP, profile=None,
+                          signed_displacements=False):
+        # Uncompiled energy function: the objective over the free qubits and gate variables, and the
+        # GateTable whose penalties fix the gate variables
+        num_amino = len(sequence)
+
+        # Shared registers derive every pair from one position count per amino instead of per-pair adders
+        # Signed displacements replace the plus/minus sums with one two's complement counter per axis
+        with stage(profile, 'position_registers'):
+            registers, displacements = self.create_registers(num_amino, shared_registers, signed_displacements)
+
+        with stage(profile, 'interactions') as entry:
+            energy_matrix = get_energy_matrix(sequence, energy_model)
+            interactions, energy_values = self.create_interactions(sequence, energy_matrix, registers, pair_step,
+                                                                   displacements)
+            total_interaction_energy = Num(0)
+            for i in range(len(interactions)):
+                interaction_value = interactions[i] * energy_values[i]
+                total_interaction_energy = total_interaction_energy + interaction_value
+            entry['circuits'] = len(interactions)
+
+        penalty = get_penalty(energy_values)
+
+        with stage(profile, 'overlap'):
+            overlap = self.create_overlap_constraint(num_amino, registers, pair_step, displacements)
+            overlap = Num(penalty) * overlap
+
+        with stage(profile, 'back'):
+            back = self.create_back_constraint(num_amino)
+            back = Num(penalty) * back
+
+        model = total_interaction_energy + overlap + back
+        return model, scope_gates(variable for term in model.terms for variable in term)
+
+    def create_energy_function(self, sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP,
+                               profile=None, signed_displacements=False):
+        objective, gates = self.create_polynomial(sequence, energy_model, shared_registers, pair_step, profile,
+                                                  signed_displacements)
+        with stage(profile, 'compile'):
+            model = objective.compile(COMPILE_STRENGTH)
+
+        with stage(profile, 'to_bqm') as entry:
+            bqm = gates.penalize(model.to_bqm())
+            entry.update(bqm_sizes(bqm))
+        with stage(profile, 'to_qubo') as entry:
+            qubo = bqm.to_qubo()
+            entry.update(qubo_sizes(qubo))
+        with stage(profile, 'to_ising') as entry:
+            ising = bqm.to_ising()
+            entry.update(qubo_sizes(ising))
+
+        return model, bqm, qubo, ising, gates
+
+    @gate_scope()
+    def create_parametric_model(self, shared_registers=False, signed_displacements=False):
+        # Sequence independent model compiled once per length: the pair energies are Placeholders
+        # named by placeholder_energy_matrix and the penalty is Placeholder('penalty'), both fed to to_bqm
+        num_amino = self.num_amino
+
+        registers, displacements = self.create_registers(num_amino, shared_registers, signed_displacements)
+
+        energy_matrix = placeholder_energy_matrix(num_amino)
+        interactions, energy_values = self.create_interactions(None, energy_matrix, registers,
+                                                               displacements=displacements)
+        total_interaction_energy = Num(0)
+        for i in range(len(interactions)):
+            interaction_value = interactions[i] * energy_values[i]
+            total_interaction_energy = total_interaction_energy + interaction_value
+
+        penalty = Placeholder('penalty')
+
+        overlap = self.create_overlap_constraint(num_amino, registers, displacements=displacements)
+        overlap = overlap * penalty
+
+        back = self.create_back_constraint(num_amino)
+        back = back * penalty
+
+        model = total_interaction_energy + overlap + back
+        compiled = model.compile(COMPILE_STRENGTH)
+        return compiled, scope_gates(compiled.variables)
+
+    def dx_plus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        return And(Not(q_ta), q_tb)
+
+    def dx_minus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        return And(q_ta, Not(q_tb))
+
+    def dy_plus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        return And(q_ta, q_tb)
+
+    def dy_minus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        return And(Not(q_ta), Not(q_tb))
+
+    def axis_directions(self):
+        # Plus and minus direction predicates of every axis
+        return {'x': ([self.dx_plus], [self.dx_minus]), 'y': ([self.dy_plus], [self.dy_minus])}
+
+    def create_registers(self, num_amino, shared_registers=False, signed_displacements=False):
+        # (registers, displacements) of a build, None where the build option is off
+        if signed_displacements:
+            return None, SignedDisplacements(self.axis_directions(), num_amino,
+                                             neighbour_offsets(4)[:, :len(self.axis_directions())],
+                                             shared_registers)
+        return (self.create_position_registers(num_amino) if shared_registers else None), None
+
+    def create_position_registers(self, num_amino):
+        # One running direction count per amino, axis and sign, shared by every pair
+        return {axis: (prefix_registers(plus_funcs, num_amino), prefix_registers(minus_funcs, num_amino))
+                for axis, (plus_funcs, minus_funcs) in self.axis_directions().items()}
+
+    def create_overlap_constraint(self, num_amino, registers=None, pair_step=PAIR_STEP, displacements=None):
+        # Initialize overlap constraint as False
+        overlap = Num(0)
+
+        for amino1 in range(num_amino):
+            for amino2 in range(amino1 + OVERLAP_GAP, num_amino, pair_step):
+                if displacements is not None:
+                    amino_overlap = displacements.overlap(amino1, amino2)
+                elif registers is not None:
+                    amino_overlap = self.register_overlap_indicator(registers, amino1, amino2)
+                else:
+                    amino_overlap = self.overlap_indicator(amino1, amino2)
+                overlap = Or(overlap, amino_overlap)
+
+        return overlap
+
+    def overlap_indicator(self, amino1, amino2):
+        dx_plus_sum = sum_of_directions(self.dx_plus, amino1, amino2)
+        dx_minus_sum = sum_of_directions(self.dx_minus, amino1, amino2)
+        dy_plus_sum = sum_of_directions(self.dy_plus, amino1, amino2)
+        dy_minus_sum = sum_of_directions(self.dy_minus, amino1, amino2)
+
+        bits = math.ceil(math.log2(amino2 - amino1))
+        amino_overlap = Num(1)
+        for bit in range(bits):
+            bit_overlap_flag = Xnor(dx_plus_sum[bit], dx_minus_sum[bit]) # Xnor is equivalent to '=='
+            bit_overlap_flag = And(bit_overlap_flag, Xnor(dy_plus_sum[bit], dy_minus_sum[bit]))
+            amino_overlap = And(amino_overlap, bit_overlap_flag)
+
+        return amino_overlap
+
+    def register_overlap_indicator(self, registers, amino1, amino2):
+        x_equal = prefix_displacement_equal(*registers['x'], amino1, amino2)
+        y_equal = prefix_displacement_equal(*registers['y'], amino1, amino2)
+        return And(x_equal, y_equal)
+
+    def create_back_constraint(self, num_amino):
+        # Initialize back constraint as False
+        back = Num(0)
+        for t in range(num_amino - 2):
+            back = Or(back, And(self.dx_plus(t), self.dx_minus(t + 1)))
+            back = Or(back, And(self.dx_minus(t), self.dx_plus(t + 1)))
+            back = Or(back, And(self.dy_plus(t), self.dy_minus(t + 1)))
+            back = Or(back, And(self.dy_minus(t), self.dy_plus(t + 1)))
+        return back
+
+    def adjacency_indicator(self, amino1, amino2):
+        dx_plus_sum = sum_of_directions(self.dx_plus, amino1, amino2)
+        dx_minus_sum = sum_of_directions(self.dx_minus, amino1, amino2)
+        dy_plus_sum = sum_of_directions(self.dy_plus, amino1, amino2)
+        dy_minus_sum = sum_of_directions(self.dy_minus, amino1, amino2)
+        dx_plus_sum_plus_one = sum_of_directions_plus_one(self.dx_plus, amino1, amino2)
+        dx_minus_sum_plus_one = sum_of_directions_plus_one(self.dx_minus, amino1, amino2)
+        dy_plus_sum_plus_one = sum_of_directions_plus_one(self.dy_plus, amino1, amino2)
+        dy_minus_sum_plus_one = sum_of_directions_plus_one(self.dy_minus, amino1, amino2)
+
+        bits = math.ceil(math.log2(amino2 - amino1))
+
+        x_equal = Num(1)
+        y_equal = Num(1)
+        x_plus_one = Num(1)
+        x_minus_one = Num(1)
+        y_plus_one = Num(1)
+        y_minus_one = Num(1)
+
+        for bit in range(bits):
+            x_equal = And(x_equal, Xnor(dx_plus_sum[bit], dx_minus_sum[bit]))
+            y_equal = And(y_equal, Xnor(dy_plus_sum[bit], dy_minus_sum[bit]))
+
+        bits_2 = math.ceil(math.log2(amino2 - amino1 + 1))
+
+        for bit in range(bits_2):
+            x_plus_one = And(x_plus_one, Xnor(dx_plus_sum_plus_one[bit], dx_minus_sum[bit]))
+            x_minus_one = And(x_minus_one, Xnor(dx_plus_sum[bit], dx_minus_sum_plus_one[bit]))
+            y_plus_one = And(y_plus_one, Xnor(dy_plus_sum_plus_one[bit], dy_minus_sum[bit]))
+            y_minus_one = And(y_minus_one, Xnor(dy_plus_sum[bit], dy_minus_sum_plus_one[bit]))
+
+        x_equal_y_offset = And(x_equal, Or(y_plus_one, y_minus_one))
+        y_equal_x_offset = And(y_equal, Or(x_plus_one, x_minus_one))
+
+        return Or(x_equal_y_offset, y_equal_x_offset)
+
+    def register_adjacency_indicator(self, registers, amino1, amino2):
+        x_equal = prefix_displacement_equal(*registers['x'], amino1, amino2)
+        y_equal = prefix_displacement_equal(*registers['y'], amino1, amino2)
+        x_offset = Or(prefix_displacement_equal(*registers['x'], amino1, amino2, 1),
+                      prefix_displacement_equal(*registers['x'], amino1, amino2, -1))
+        y_offset = Or(prefix_displacement_equal(*registers['y'], amino1, amino2, 1),
+                      prefix_displacement_equal(*registers['y'], amino1, amino2, -1))
+
+        x_equal_y_offset = And(x_equal, y_offset)
+        y_equal_x_offset = And(y_equal, x_offset)
+
+        return Or(x_equal_y_offset, y_equal_x_offset)
+
+    def create_interactions(self, sequence, energy_matrix, registers=None, pair_step=PAIR_STEP, displacements=None):
+        interations = []
+        energy_values = []
+        num_amino = len(energy_matrix)
+
+        for amino1 in range(num_amino):
+            for amino2 in range(amino1 + INTERACTION_GAP, num_amino, pair_step):
+                energy_value = energy_matrix[amino1][amino2]
+                if isinstance(energy_value, Placeholder) or energy_value != 0:
+                    if displacements is not None:
+                        interaction = displacements.contact(amino1, amino2)
+                    elif registers is not None:
+                        interaction = self.register_adjacency_indicator(registers, amino1, amino2)
+                    else:
+                        interaction = self.adjacency_indicator(amino1, amino2)
+                    interations.append(interaction)
+                    energy_values.append(energy_value)
+
+        return interations, energy_values
+
+
+def get_penalty(energy_values):
+    # Exceeds the largest possible interaction energy gain
+    return (sum(energy_values) * -1) + 1
 
 
 def set_default(vars):
@@ -54,120 +287,29 @@ def set_default(vars):
     return vars
 
 
-def dx_plus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    return And(Not(q_ta), q_tb)
-
-
-def dx_minus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    return And(q_ta, Not(q_tb))
-
-
-def dy_plus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    return And(q_ta, q_tb)
-
-
-def dy_minus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    return And(Not(q_ta), Not(q_tb))
-
-def create_overlap_constraint(num_amino):
-    # Initialize overlap constraint as False
-    overlap = Num(0)
+def create_energy_function(sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP, profile=None,
+                           signed_displacements=False):
+    builder = HCOMB4Builder(len(sequence))
+    return builder.create_energy_function(sequence, energy_model, shared_registers, pair_step, profile,
+                                          signed_displacements)
 
-    for amino1 in range(num_amino):
-        for amino2 in range(amino1 + 4, num_amino):
-            dx_plus_sum = sum_of_directions(dx_plus, amino1, amino2)
-            dx_minus_sum = sum_of_directions(dx_minus, amino1, amino2)
-            dy_plus_sum = sum_of_directions(dy_plus, amino1, amino2)
-            dy_minus_sum = sum_of_directions(dy_minus, amino1, amino2)
 
-            bits = math.ceil(math.log2(amino2 - amino1))
-            amino_overlap = Num(1)
-            for bit in range(bits):
-                bit_overlap_flag = Xnor(dx_plus_sum[bit], dx_minus_sum[bit]) # Xnor is equivalent to '=='
-                bit_overlap_flag = And(bit_overlap_flag, Xnor(dy_plus_sum[bit], dy_minus_sum[bit]))
-                amino_overlap = And(amino_overlap, bit_overlap_flag)
-            overlap = Or(overlap, amino_overlap)
+def create_polynomial(sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP, profile=None,
+                      signed_displacements=False):
+    builder = HCOMB4Builder(len(sequence))
+    return builder.create_polynomial(sequence, energy_model, shared_registers, pair_step, profile,
+                                     signed_displacements)
 
-    return overlap
 
-
-def create_back_constraint(num_amino):
-    # Initialize back constraint as False
-    back = Num(0)
-    for t in range(num_amino - 2):
-        back = Or(back, And(dx_plus(t), dx_minus(t + 1)))
-        back = Or(back, And(dx_minus(t), dx_plus(t + 1)))
-        back = Or(back, And(dy_plus(t), dy_minus(t + 1)))
-        back = Or(back, And(dy_minus(t), dy_plus(t + 1)))
-    return back
-
-def adjacency_indicator(amino1, amino2):
-    dx_plus_sum = sum_of_directions(dx_plus, amino1, amino2)
-    dx_minus_sum = sum_of_directions(dx_minus, amino1, amino2)
-    dy_plus_sum = sum_of_directions(dy_plus, amino1, amino2)
-    dy_minus_sum = sum_of_directions(dy_minus, amino1, amino2)
-    dx_plus_sum_plus_one = sum_of_directions_plus_one(dx_plus, amino1, amino2)
-    dx_minus_sum_plus_one = sum_of_directions_plus_one(dx_minus, amino1, amino2)
-    dy_plus_sum_plus_one = sum_of_directions_plus_one(dy_plus, amino1, amino2)
-    dy_minus_sum_plus_one = sum_of_directions_plus_one(dy_minus, amino1, amino2)
-
-    bits = math.ceil(math.log2(amino2 - amino1))
-
-    x_equal = Num(1)
-    y_equal = Num(1)
-    x_plus_one = Num(1)
-    x_minus_one = Num(1)
-    y_plus_one = Num(1)
-    y_minus_one = Num(1)
-
-    for bit in range(bits):
-        x_equal = And(x_equal, Xnor(dx_plus_sum[bit], dx_minus_sum[bit]))
-        y_equal = And(y_equal, Xnor(dy_plus_sum[bit], dy_minus_sum[bit]))
-
-    bits_2 = math.ceil(math.log2(amino2 - amino1 + 1))
-
-    for bit in range(bits_2):
-        x_plus_one = And(x_plus_one, Xnor(dx_plus_sum_plus_one[bit], dx_minus_sum[bit]))
-        x_minus_one = And(x_minus_one, Xnor(dx_plus_sum[bit], dx_minus_sum_plus_one[bit]))
-        y_plus_one = And(y_plus_one, Xnor(dy_plus_sum_plus_one[bit], dy_minus_sum[bit]))
-        y_minus_one = And(y_minus_one, Xnor(dy_plus_sum[bit], dy_minus_sum_plus_one[bit]))
-
-    x_equal_y_offset = And(x_equal, Or(y_plus_one, y_minus_one))
-    y_equal_x_offset = And(y_equal, Or(x_plus_one, x_minus_one))
-
-    return Or(x_equal_y_offset, y_equal_x_offset)
-
-
-def create_interactions(sequence, energy_matrix):
-    interations = []
-    energy_values = []
-    num_amino = len(sequence)
-
-    for amino1 in range(num_amino):
-        for amino2 in range(amino1 + 3, num_amino):
-            energy_value = energy_matrix[amino1][amino2]
-            if energy_value != 0:
-                interaction = adjacency_indicator(amino1, amino2)
-                interations.append(interaction)
-                energy_values.append(energy_value)
-
-    return interations, energy_values
+def create_parametric_model(num_amino, shared_registers=False, signed_displacements=False):
+    return HCOMB4Builder(num_amino).create_parametric_model(shared_registers, signed_displacements)
 
 
 if __name__ == '__main__':
     sequence = 'GAAA'
     energy_model = 'HP'  # Placeholder
-    bqm, qubo, ising = create_energy_function(sequence, energy_model)
+    model, bqm, qubo, ising, gates = create_energy_function(sequence, energy_model)
 
     pprint(bqm)
     pprint(qubo)
     pprint(ising)
-
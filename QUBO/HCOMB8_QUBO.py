@@ -17,238 +17,397 @@ from Energy import get_energy_matrix
 from pyqubo import *
 from QUBO.BitOps_QUBO import (sum_of_directions, sum_of_directions_plus_one,
                          initialize_q_vars, sum_of_y, sum_of_y_plus_one, sum_of_y_plus_two)
+from QUBO.BitOps_QUBO import prefix_registers, prefix_displacement_equal, placeholder_energy_matrix
+from QUBO.BitOps_QUBO import SignedDisplacements
 from pprint import pprint
-from QUBO.BitOps_QUBO import Xnor
+from QUBO.BitOps_QUBO import And, Or, Not, Xnor, Num, gate_scope, scope_gates
+from Instrumentation import stage, bqm_sizes, qubo_sizes
+from Lattices import neighbour_offsets
+
+INTERACTION_GAP = 2
+COMPILE_STRENGTH = 1
+OVERLAP_GAP = 3
+# Not bipartite, every separation can touch or overlap
+PAIR_STEP = 1
+
+
+class HCOMB8Builder:
+    """
+    Builds the HCOMB8 energy function of one chain length.
+
+    The builder owns its qubit table and the direction predicates read from it, so separate
+    builders can run in parallel threads or processes.
+    """
+
+    def __init__(self, num_amino):
+        self.num_amino = num_amino
+        self.q_vars = set_default(initialize_q_vars(num_amino, 3))
+
+    @gate_scope()
+    def create_polynomial(self, sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP, profile=None,
+                          signed_displacements=False):
+        # Uncompiled energy function: the objective over the free qubits and gate variables, and the
+        # GateTable whose penalties fix the gate variables
+        num_amino = len(sequence)
+
+        # Shared registers derive every pair from one position count per amino instead of per-pair adders
+        # Signed displacements replace the plus/minus sums with one two's complement counter per axis
+        with stage(profile, 'position_registers'):
+            registers, displacements = self.create_registers(num_amino, shared_registers, signed_displacements)
+
+        with stage(profile, 'interactions') as entry:
+            energy_matrix = get_energy_matrix(sequence, energy_model)
+            interactions, energy_values = self.create_interactions(sequence, energy_matrix, registers, pair_step,
+                                                                   displacements)
+            total_interaction_energy = Num(0)
+            for i in range(len(interactions)):
+                interaction_value = interactions[i] * energy_values[i]
+                total_interaction_energy = total_interaction_energy + interaction_value
+            entry['circuits'] = len(interactions)
+
+        penalty = get_penalty(energy_values)
+
+        with stage(profile, 'back'):
+            back = self.create_back_constraint(num_amino)
+            back = Num(penalty) * back
+
+        with stage(profile, 'overlap'):
+            overlap = self.create_overlap_constraint(num_amino, registers, pair_step, displacements)
+            overlap = Num(penalty) * overlap
+
+        model = total_interaction_energy + overlap + back
+        return model, scope_gates(variable for term in model.terms for variable in term)
+
+    def create_energy_function(self, sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP,
+                               profile=None, signed_displacements=False):
+        objective, gates = self.create_polynomial(sequence, energy_model, shared_registers, pair_step, profile,
+                                                  signed_displacements)
+        with stage(profile, 'compile'):
+            model = objective.compile(COMPILE_STRENGTH)
+
+        with stage(profile, 'to_bqm') as entry:
+            bqm = gates.penalize(model.to_bqm())
+            entry.update(bqm_sizes(bqm))
+        with stage(profile, 'to_qubo') as entry:
+            qubo = bqm.to_qubo()
+            entry.update(qubo_sizes(qubo))
+        with stage(profile, 'to_ising') as entry:
+            ising = bqm.to_ising()
+            entry.update(qubo_sizes(ising))
+
+        return model, bqm, qubo, ising, gates
+
+    @gate_scope()
+    def create_parametric_model(self, shared_registers=False, signed_displacements=False):
+        # Sequence independent model compiled once per length: the pair energies are Placeholders
+        # named by placeholder_energy_matrix and the penalty is Placeholder('penalty'), both fed to to_bqm
+        num_amino = self.num_amino
+
+        registers, displacements = self.create_registers(num_amino, shared_registers, signed_displacements)
+
+        energy_matrix = placeholder_energy_matrix(num_amino)
+        interactions, energy_values = self.create_interactions(None, energy_matrix, registers,
+                                                               displacements=displacements)
+        total_interaction_energy = Num(0)
+        for i in range(len(interactions)):
+            interaction_value = interactions[i] * energy_values[i]
+            total_interaction_energy = total_interaction_energy + interaction_value
+
+        penalty = Placeholder('penalty')
+
+        overlap = self.create_overlap_constraint(num_amino, registers, displacements=displacements)
+        overlap = overlap * penalty
+
+        back = self.create_back_constraint(num_amino)
+        back = back * penalty
+
+        model = total_interaction_energy + overlap + back
+        compiled = model.compile(COMPILE_STRENGTH)
+        return compiled, scope_gates(compiled.variables)
+
+    def dx_plus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        return And(Not(q_ta), q_tb)
+
+    def dx_minus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        return And(q_ta, Not(q_tb))
+
+    def dy_plus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        q_tc = self.q_vars[(t, 2)]
+        return Or(And(q_ta, And(q_tb, q_tc)),
+                  Or(And(Not(q_ta), And(q_tb, q_tc)),
+                     And(q_ta, And(Not(q_tb), q_tc))))
+
+    def dy_minus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        q_tc = self.q_vars[(t, 2)]
+        return Or(And(Not(q_ta), And(Not(q_tb), Not(q_tc))),
+                  Or(And(q_ta, And(Not(q_tb), Not(q_tc))),
+                     And(Not(q_ta), And(q_tb, Not(q_tc)))))
+
+    def dy_plus_plus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        q_tc = self.q_vars[(t, 2)]
+        return And(q_ta, And(q_tb, q_tc))
+
+    def dy_minus_minus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        q_tc = self.q_vars[(t, 2)]
+        return And(Not(q_ta), And(Not(q_tb), Not(q_tc)))
+
+    def dz_plus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        q_tc = self.q_vars[(t, 2)]
+        return And(Not(q_ta), And(Not(q_tb), q_tc))
+
+    def dz_minus(self, t):
+        q_ta = self.q_vars[(t, 0)]
+        q_tb = self.q_vars[(t, 1)]
+        q_tc = self.q_vars[(t, 2)]
+        return And(q_ta, And(q_tb, Not(q_tc)))
+
+    def create_back_constraint(self, num_amino):
+        # Initialize back constraint as False
+        back = Num(0)
+
+        for t in range(num_amino - 2):
+            q_ta = self.q_vars[(t, 0)]
+            q_tb = self.q_vars[(t, 1)]
+            q_tc = self.q_vars[(t, 2)]
+            q_t2a = self.q_vars[(t + 1, 0)]
+            q_t2b = self.q_vars[(t + 1, 1)]
+            q_t2c = self.q_vars[(t + 1, 2)]
+
+            back = Or(back, And(Not(q_ta), And(q_tb, And(q_tc, And(q_t2a, And(Not(q_t2b), Not(q_t2c))))))) # ne
+            back = Or(back, And(q_ta, And(Not(q_tb), And(Not(q_tc), And(Not(q_t2a), And(q_t2b, q_t2c)))))) # sw
+
+            back = Or(back, And(q_ta, And(Not(q_tb), And(q_tc, And(Not(q_t2a), And(q_t2b, Not(q_t2c))))))) # nw
+            back = Or(back, And(Not(q_ta), And(q_tb, And(Not(q_tc), And(q_t2a, And(Not(q_t2b), q_t2c)))))) # se
+
+            back = Or(back, And(self.dy_plus_plus(t), self.dy_minus_minus(t + 1))) # n
+            back = Or(back, And(self.dy_minus_minus(t), self.dy_plus_plus(t + 1))) # s
+            back = Or(back, And(self.dz_plus(t), self.dz_minus(t + 1))) # u
+            back = Or(back, And(self.dz_minus(t), self.dz_plus(t + 1))) # d
+
+        return back
+
+    def axis_directions(self):
+        # Plus and minus direction predicates of every axis
+        # y counts north and south twice, matching sum_of_y
+        return {'x': ([self.dx_plus], [self.dx_minus]),
+                'y': ([self.dy_plus, self.dy_plus_plus], [self.dy_minus, self.dy_minus_minus]),
+                'z': ([self.dz_plus], [self.dz_minus])}
+
+    def create_registers(self, num_amino, shared_registers=False, signed_displacements=False):
+        # (registers, displacements) of a build, None where the build option is off
+        if signed_displacements:
+            return None, SignedDisplacements(self.axis_directions(), num_amino,
+                                             neighbour_offsets(8)[:, :len(self.axis_directions())],
+                                             shared_registers)
+        return (self.create_position_registers(num_amino) if shared_registers else None), None
+
+    def create_position_registers(self, num_amino):
+        # One running direction count per amino, axis and sign, shared by every pair
+        return {axis: (prefix_registers(plus_funcs, num_amino), prefix_registers(minus_funcs, num_amino))
+                for axis, (plus_funcs, minus_funcs) in self.axis_directions().items()}
+
+    def create_overlap_constraint(self, num_amino, registers=None, pair_step=PAIR_STEP, displacements=None):
+        # Initialize overlap constraint as False
+        overlap = Num(0)
+
+        for amino1 in range(num_amino):
+            for amino2 in range(amino1 + OVERLAP_GAP, num_amino, pair_step):
+                if displacements is not None:
+                    amino_overlap = displacements.overlap(amino1, amino2)
+                elif registers is not None:
+                    amino_overlap = self.register_overlap_indicator(registers, amino1, amino2)
+                else:
+                    amino_overlap = self.overlap_indicator(amino1, amino2)
+                overlap = Or(overlap, amino_overlap)
+
+        return overlap
+
+    def overlap_indicator(self, amino1, amino2):
+        dx_plus_sum = sum_of_directions(self.dx_plus, amino1, amino2)
+        dx_minus_sum = sum_of_directions(self.dx_minus, amino1, amino2)
+        dy_plus_sum = sum_of_y(self.dy_plus, self.dy_plus_plus, amino1, amino2)
+        dy_minus_sum = sum_of_y(self.dy_minus, self.dy_minus_minus, amino1, amino2)
+        dz_plus_sum = sum_of_directions(self.dz_plus, amino1, amino2)
+        dz_minus_sum = sum_of_directions(self.dz_minus, amino1, amino2)
+
+        bits = math.ceil(math.log2(amino2 - amino1))
+        amino_overlap = Num(1)
+        for bit in range(bits):
+            bit_overlap_flag = Xnor(dx_plus_sum[bit], dx_minus_sum[bit]) # Xnor is equivalent to '=='
+            bit_overlap_flag = And(bit_overlap_flag, Xnor(dz_plus_sum[bit], dz_minus_sum[bit]))
+            amino_overlap = And(amino_overlap, bit_overlap_flag)
+
+        bits_2 = math.ceil(math.log2(amino2 - amino1)) + 1
+        for bit in range(bits_2):
+            bit_overlap_flag = Xnor(dy_plus_sum[bit], dy_minus_sum[bit])
+            amino_overlap = And(amino_overlap, bit_overlap_flag)
+
+        return amino_overlap
+
+    def register_overlap_indicator(self, registers, amino1, amino2):
+        x_equal = prefix_displacement_equal(*registers['x'], amino1, amino2)
+        y_equal = prefix_displacement_equal(*registers['y'], amino1, amino2)
+        z_equal = prefix_displacement_equal(*registers['z'], amino1, amino2)
+        return And(And(x_equal, z_equal), y_equal)
+
+    def adjacency_indicator(self, amino1, amino2):
+        dx_plus_sum = sum_of_directions(self.dx_plus, amino1, amino2)
+        dx_minus_sum = sum_of_directions(self.dx_minus, amino1, amino2)
+        dy_plus_sum = sum_of_y(self.dy_plus, self.dy_plus_plus, amino1, amino2)
+        dy_minus_sum = sum_of_y(self.dy_minus, self.dy_minus_minus, amino1, amino2)
+        dz_plus_sum = sum_of_directions(self.dz_plus, amino1, amino2)
+        dz_minus_sum = sum_of_directions(self.dz_minus, amino1, amino2)
+
+        dx_plus_sum_plus_one = sum_of_directions_plus_one(self.dx_plus, amino1, amino2)
+        dx_minus_sum_plus_one = sum_of_directions_plus_one(self.dx_minus, amino1, amino2)
+        dy_plus_sum_plus_one = sum_of_y_plus_one(self.dy_plus, self.dy_plus_plus, amino1, amino2)
+        dy_minus_sum_plus_one = sum_of_y_plus_one(self.dy_minus, self.dy_minus_minus, amino1, amino2)
+        dz_plus_sum_plus_one = sum_of_directions_plus_one(self.dz_plus, amino1, amino2)
+        dz_minus_sum_plus_one = sum_of_directions_plus_one(self.dz_minus, amino1, amino2)
+
+        dy_plus_sum_plus_two = sum_of_y_plus_two(self.dy_plus, self.dy_plus_plus, amino1, amino2)
+        dy_minus_sum_plus_two = sum_of_y_plus_two(self.dy_minus, self.dy_minus_minus, amino1, amino2)
+
+        x_equal = Num(1)
+        y_equal = Num(1)
+        z_equal = Num(1)
+
+        x_plus_one = Num(1)
+        x_minus_one = Num(1)
+        y_plus_one = Num(1)
+        y_minus_one = Num(1)
+        z_plus_one = Num(1)
+        z_minus_one = Num(1)
+
+        y_plus_two = Num(1)
+        y_minus_two = Num(1)
+
+        bits = math.ceil(math.log2(amino2 - amino1))
+
+        for bit in range(bits):
+            x_equal = And(x_equal, Xnor(dx_plus_sum[bit], dx_minus_sum[bit]))
+            z_equal = And(z_equal, Xnor(dz_plus_sum[bit], dz_minus_sum[bit]))
+
+        bits = math.ceil(math.log2(amino2 - amino1)) + 1
+        for bit in range(bits):
+            y_equal = And(y_equal, Xnor(dy_plus_sum[bit], dy_minus_sum[bit]))
+
+        bits = math.ceil(math.log2(amino2 - amino1 + 1))
+        for bit in range(bits):
+            x_plus_one = And(x_plus_one, Xnor(dx_plus_sum_plus_one[bit], dx_minus_sum[bit]))
+            x_minus_one = And(x_minus_one, Xnor(dx_plus_sum[bit], dx_minus_sum_plus_one[bit]))
+            z_plus_one = And(z_plus_one, Xnor(dz_plus_sum_plus_one[bit], dz_minus_sum[bit]))
+            z_minus_one = And(z_minus_one, Xnor(dz_plus_sum[bit], dz_minus_sum_plus_one[bit]))
+
+        bits = math.ceil(math.log2(amino2 - amino1 + 1)) + 1
+        for bit in range(bits):
+            y_plus_one = And(y_plus_one, Xnor(dy_plus_sum_plus_one[bit], dy_minus_sum[bit]))
+            y_minus_one = And(y_minus_one, Xnor(dy_plus_sum[bit], dy_minus_sum_plus_one[bit]))
+
+        bits = math.ceil(math.log2(amino2 - amino1 + 2)) + 1
+        for bit in range(bits):
+            y_plus_two = And(y_plus_two, Xnor(dy_plus_sum_plus_two[bit], dy_minus_sum[bit]))
+            y_minus_two = And(y_minus_two, Xnor(dy_plus_sum[bit], dy_minus_sum_plus_two[bit]))
+
+        # xz equal and y offset by 2
+        xz_equal_y_offset = And(And(x_equal, z_equal), Or(y_plus_two, y_minus_two))
+        # xy equal and z offset by 1
+        xy_equal_z_offset = And(And(x_equal, y_equal), Or(z_plus_one, z_minus_one))
+        # z equal and x offset by 1 and y offset by 1
+        z_equal_xy_offset = And(And(z_equal, Or(x_plus_one, x_minus_one)), Or(y_plus_one, y_minus_one))
+
+        return Or(xz_equal_y_offset, Or(xy_equal_z_offset, z_equal_xy_offset))
+
+    def register_adjacency_indicator(self, registers, amino1, amino2):
+        x_equal = prefix_displacement_equal(*registers['x'], amino1, amino2)
+        y_equal = prefix_displacement_equal(*registers['y'], amino1, amino2)
+        z_equal = prefix_displacement_equal(*registers['z'], amino1, amino2)
+        x_offset = Or(prefix_displacement_equal(*registers['x'], amino1, amino2, 1),
+                      prefix_displacement_equal(*registers['x'], amino1, amino2, -1))
+        y_offset = Or(prefix_displacement_equal(*registers['y'], amino1, amino2, 1),
+                      prefix_displacement_equal(*registers['y'], amino1, amino2, -1))
+        z_offset = Or(prefix_displacement_equal(*registers['z'], amino1, amino2, 1),
+                      prefix_displacement_equal(*registers['z'], amino1, amino2, -1))
+        y_offset_two = Or(prefix_displacement_equal(*registers['y'], amino1, amino2, 2),
+                          prefix_displacement_equal(*registers['y'], amino1, amino2, -2))
+
+        # xz equal and y offset by 2
+        xz_equal_y_offset = And(And(x_equal, z_equal), y_offset_two)
+        # xy equal and z offset by 1
+        xy_equal_z_offset = And(And(x_equal, y_equal), z_offset)
+        # z equal and x offset by 1 and y offset by 1
+        z_equal_xy_offset = And(And(z_equal, x_offset), y_offset)
+
+        return Or(xz_equal_y_offset, Or(xy_equal_z_offset, z_equal_xy_offset))
+
+    def create_interactions(self, sequence, energy_matrix, registers=None, pair_step=PAIR_STEP, displacements=None):
+        interations = []
+        energy_values = []
+        num_amino = len(energy_matrix)
+
+        for amino1 in range(num_amino):
+            for amino2 in range(amino1 + INTERACTION_GAP, num_amino, pair_step):
+                energy_value = energy_matrix[amino1][amino2]
+                if isinstance(energy_value, Placeholder) or energy_value != 0:
+                    if displacements is not None:
+                        interaction = displacements.contact(amino1, amino2)
+                    elif registers is not None:
+                        interaction = self.register_adjacency_indicator(registers, amino1, amino2)
+                    else:
+                        interaction = self.adjacency_indicator(amino1, amino2)
+                    interations.append(interaction)
+                    energy_values.append(energy_value)
+
+        return interations, energy_values
+
+
+def get_penalty(energy_values):
+    # Fixed penalty, large enough for every energy model on this lattice
+    return 40
 
-def create_energy_function(sequence, energy_model):
-    num_amino = len(sequence)
-    global q_vars
-    q_vars = initialize_q_vars(num_amino, 3)
-    q_vars = set_default(q_vars)
 
-    energy_matrix = get_energy_matrix(sequence, energy_model)
-    interactions, energy_values = create_interactions(sequence, energy_matrix)
-    total_interaction_energy = Num(0)
-    for i in range(len(interactions)):
-        interaction_value = interactions[i] * energy_values[i]
-        total_interaction_energy = total_interaction_energy + interaction_value
-
-    penalty = 40
-
-    back = create_back_constraint(num_amino)
-    back = Num(penalty) * back
+def set_default(vars):
+    vars[(0, 0)] = Num(0)
+    vars[(0, 1)] = Num(0)
+    return vars
 
-    overlap = create_overlap_constraint(num_amino)
-    overlap = Num(penalty) * overlap
 
-    model = total_interaction_energy + overlap + back
-    model = model.compile(1)
+def create_energy_function(sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP, profile=None,
+                           signed_displacements=False):
+    builder = HCOMB8Builder(len(sequence))
+    return builder.create_energy_function(sequence, energy_model, shared_registers, pair_step, profile,
+                                          signed_displacements)
 
-    bqm = model.to_bqm()
-    qubo = model.to_qubo()
-    ising = model.to_ising()
 
-    return model, bqm, qubo, ising
+def create_polynomial(sequence, energy_model, shared_registers=False, pair_step=PAIR_STEP, profile=None,
+                      signed_displacements=False):
+    builder = HCOMB8Builder(len(sequence))
+    return builder.create_polynomial(sequence, energy_model, shared_registers, pair_step, profile,
+                                     signed_displacements)
 
-def set_default(vars):
-    vars[(0, 0)] = Num(0)
-    vars[(0, 1)] = Num(0)
-    return vars
 
-def dx_plus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    return And(Not(q_ta), q_tb)
-
-def dx_minus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    return And(q_ta, Not(q_tb))
-
-def dy_plus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    q_tc = q_vars[(t, 2)]
-    return Or(And(q_ta, And(q_tb, q_tc)),
-              Or(And(Not(q_ta), And(q_tb, q_tc)),
-                 And(q_ta, And(Not(q_tb), q_tc))))
-
-def dy_minus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    q_tc = q_vars[(t, 2)]
-    return Or(And(Not(q_ta), And(Not(q_tb), Not(q_tc))),
-              Or(And(q_ta, And(Not(q_tb), Not(q_tc))),
-                 And(Not(q_ta), And(q_tb, Not(q_tc)))))
-
-def dy_plus_plus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    q_tc = q_vars[(t, 2)]
-    return And(q_ta, And(q_tb, q_tc))
-
-def dy_minus_minus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    q_tc = q_vars[(t, 2)]
-    return And(Not(q_ta), And(Not(q_tb), Not(q_tc)))
-
-def dz_plus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    q_tc = q_vars[(t, 2)]
-    return And(Not(q_ta), And(Not(q_tb), q_tc))
-
-def dz_minus(t):
-    q_ta = q_vars[(t, 0)]
-    q_tb = q_vars[(t, 1)]
-    q_tc = q_vars[(t, 2)]
-    return And(q_ta, And(q_tb, Not(q_tc)))
-
-
-def create_back_constraint(num_amino):
-    # Initialize back constraint as False
-    back = Num(0)
-
-    for t in range(num_amino - 2):
-        q_ta = q_vars[(t, 0)]
-        q_tb = q_vars[(t, 1)]
-        q_tc = q_vars[(t, 2)]
-        q_t2a = q_vars[(t + 1, 0)]
-        q_t2b = q_vars[(t + 1, 1)]
-        q_t2c = q_vars[(t + 1, 2)]
-
-        back = Or(back, And(Not(q_ta), And(q_tb, And(q_tc, And(q_t2a, And(Not(q_t2b), Not(q_t2c))))))) # ne
-        back = Or(back, And(q_ta, And(Not(q_tb), And(Not(q_tc), And(Not(q_t2a), And(q_t2b, q_t2c)))))) # sw
-
-        back = Or(back, And(q_ta, And(Not(q_tb), And(q_tc, And(Not(q_t2a), And(q_t2b, Not(q_t2c))))))) # nw
-        back = Or(back, And(Not(q_ta), And(q_tb, And(Not(q_tc), And(q_t2a, And(Not(q_t2b), q_t2c)))))) # se
-
-        back = Or(back, And(dy_plus_plus(t), dy_minus_minus(t + 1))) # n
-        back = Or(back, And(dy_minus_minus(t), dy_plus_plus(t + 1))) # s
-        back = Or(back, And(dz_plus(t), dz_minus(t + 1))) # u
-        back = Or(back, And(dz_minus(t), dz_plus(t + 1))) # d
-
-    return back
-
-def create_overlap_constraint(num_amino):
-    # Initialize overlap constraint as False
-    overlap = Num(0)
-
-    for amino1 in range(num_amino):
-        for amino2 in range(amino1 + 3, num_amino):
-            dx_plus_sum = sum_of_directions(dx_plus, amino1, amino2)
-            dx_minus_sum = sum_of_directions(dx_minus, amino1, amino2)
-            dy_plus_sum = sum_of_y(dy_plus, dy_plus_plus, amino1, amino2)
-            dy_minus_sum = sum_of_y(dy_minus, dy_minus_minus, amino1, amino2)
-            dz_plus_sum = sum_of_directions(dz_plus, amino1, amino2)
-            dz_minus_sum = sum_of_directions(dz_minus, amino1, amino2)
-
-            bits = math.ceil(math.log2(amino2 - amino1))
-            amino_overlap = Num(1)
-            for bit in range(bits):
-                bit_overlap_flag = Xnor(dx_plus_sum[bit], dx_minus_sum[bit]) # Xnor is equivalent to '=='
-                bit_overlap_flag = And(bit_overlap_flag, Xnor(dz_plus_sum[bit], dz_minus_sum[bit]))
-                amino_overlap = And(amino_overlap, bit_overlap_flag)
-
-            bits_2 = math.ceil(math.log2(amino2 - amino1)) + 1
-            for bit in range(bits_2):
-                bit_overlap_flag = Xnor(dy_plus_sum[bit], dy_minus_sum[bit])
-                amino_overlap = And(amino_overlap, bit_overlap_flag)
-
-            overlap = Or(overlap, amino_overlap)
-
-    return overlap
-
-def adjacency_indicator(amino1, amino2):
-    dx_plus_sum = sum_of_directions(dx_plus, amino1, amino2)
-    dx_minus_sum = sum_of_directions(dx_minus, amino1, amino2)
-    dy_plus_sum = sum_of_y(dy_plus, dy_plus_plus, amino1, amino2)
-    dy_minus_sum = sum_of_y(dy_minus, dy_minus_minus, amino1, amino2)
-    dz_plus_sum = sum_of_directions(dz_plus, amino1, amino2)
-    dz_minus_sum = sum_of_directions(dz_minus, amino1, amino2)
-
-    dx_plus_sum_plus_one = sum_of_directions_plus_one(dx_plus, amino1, amino2)
-    dx_minus_sum_plus_one = sum_of_directions_plus_one(dx_minus, amino1, amino2)
-    dy_plus_sum_plus_one = sum_of_y_plus_one(dy_plus, dy_plus_plus, amino1, amino2)
-    dy_minus_sum_plus_one = sum_of_y_plus_one(dy_minus, dy_minus_minus, amino1, amino2)
-    dz_plus_sum_plus_one = sum_of_directions_plus_one(dz_plus, amino1, amino2)
-    dz_minus_sum_plus_one = sum_of_directions_plus_one(dz_minus, amino1, amino2)
-
-    dy_plus_sum_plus_two = sum_of_y_plus_two(dy_plus, dy_plus_plus, amino1, amino2)
-    dy_minus_sum_plus_two = sum_of_y_plus_two(dy_minus, dy_minus_minus, amino1, amino2)
-
-    x_equal = Num(1)
-    y_equal = Num(1)
-    z_equal = Num(1)
-
-    x_plus_one = Num(1)
-    x_minus_one = Num(1)
-    y_plus_one = Num(1)
-    y_minus_one = Num(1)
-    z_plus_one = Num(1)
-    z_minus_one = Num(1)
-
-    y_plus_two = Num(1)
-    y_minus_two = Num(1)
-
-    bits = math.ceil(math.log2(amino2 - amino1))
-
-    for bit in range(bits):
-        x_equal = And(x_equal, Xnor(dx_plus_sum[bit], dx_minus_sum[bit]))
-        z_equal = And(z_equal, Xnor(dz_plus_sum[bit], dz_minus_sum[bit]))
-
-    bits = math.ceil(math.log2(amino2 - amino1)) + 1
-    for bit in range(bits):
-        y_equal = And(y_equal, Xnor(dy_plus_sum[bit], dy_minus_sum[bit]))
-
-    bits = math.ceil(math.log2(amino2 - amino1 + 1))
-    for bit in range(bits):
-        x_plus_one = And(x_plus_one, Xnor(dx_plus_sum_plus_one[bit], dx_minus_sum[bit]))
-        x_minus_one = And(x_minus_one, Xnor(dx_plus_sum[bit], dx_minus_sum_plus_one[bit]))
-        z_plus_one = And(z_plus_one, Xnor(dz_plus_sum_plus_one[bit], dz_minus_sum[bit]))
-        z_minus_one = And(z_minus_one, Xnor(dz_plus_sum[bit], dz_minus_sum_plus_one[bit]))
-
-    bits = math.ceil(math.log2(amino2 - amino1 + 1)) + 1
-    for bit in range(bits):
-        y_plus_one = And(y_plus_one, Xnor(dy_plus_sum_plus_one[bit], dy_minus_sum[bit]))
-        y_minus_one = And(y_minus_one, Xnor(dy_plus_sum[bit], dy_minus_sum_plus_one[bit]))
-
-    bits = math.ceil(math.log2(amino2 - amino1 + 2)) + 1
-    for bit in range(bits):
-        y_plus_two = And(y_plus_two, Xnor(dy_plus_sum_plus_two[bit], dy_minus_sum[bit]))
-        y_minus_two = And(y_minus_two, Xnor(dy_plus_sum[bit], dy_minus_sum_plus_two[bit]))
-
-    # xz equal and y offset by 2
-    xz_equal_y_offset = And(And(x_equal, z_equal), Or(y_plus_two, y_minus_two))
-    # xy equal and z offset by 1
-    xy_equal_z_offset = And(And(x_equal, y_equal), Or(z_plus_one, z_minus_one))
-    # z equal and x offset by 1 and y offset by 1
-    z_equal_xy_offset = And(And(z_equal, Or(x_plus_one, x_minus_one)), Or(y_plus_one, y_minus_one))
-
-    return Or(xz_equal_y_offset, Or(xy_equal_z_offset, z_equal_xy_offset))
-
-
-def create_interactions(sequence, energy_matrix):
-    interations = []
-    energy_values = []
-    num_amino = len(sequence)
-
-    for amino1 in range(num_amino):
-        for amino2 in range(amino1 + 2, num_amino):
-            energy_value = energy_matrix[amino1][amino2]
-            if energy_value != 0:
-                interaction = adjacency_indicator(amino1, amino2)
-                interations.append(interaction)
-                energy_values.append(energy_value)
-
-    return interations, energy_values
+def create_parametric_model(num_amino, shared_registers=False, signed_displacements=False):
+    return HCOMB8Builder(num_amino).create_parametric_model(shared_registers, signed_displacements)
 
 
 if __name__ == '__main__':
     sequence = 'GAAA'
     energy_model = 'HP'  # Placeholder
-    bqm, qubo, ising = create_energy_function(sequence, energy_model)
+    model, bqm, qubo, ising, gates = create_energy_function(sequence, energy_model)
 
     pprint(bqm)
     pprint(qubo)
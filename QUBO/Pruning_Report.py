@@ -0,0 +1,78 @@
+"""
+Size savings of the parity pruning on the bipartite lattices.
+
+On HCOMB4 and HCOMB6 the builders skip contact circuits at even index separations and
+overlap circuits at odd ones (PAIR_STEP = 2). The report builds the same sequence with and
+without the pruning and counts what was avoided.
+"""
+
+import time
+
+from Energy import get_energy_matrix
+from QUBO.Direct_BQM import is_ancilla
+from QUBO import HCOMB4_QUBO, HCOMB6_QUBO, HCOMB8_QUBO, HCOMB12_QUBO
+
+BUILDERS = {4: HCOMB4_QUBO, 6: HCOMB6_QUBO, 8: HCOMB8_QUBO, 12: HCOMB12_QUBO}
+
+
+def count_circuits(sequence, energy_model, builder, pair_step):
+    num_amino = len(sequence)
+    energy_matrix = get_energy_matrix(sequence, energy_model)
+    contacts = sum(1 for amino1 in range(num_amino)
+                   for amino2 in range(amino1 + builder.INTERACTION_GAP, num_amino, pair_step)
+                   if energy_matrix[amino1][amino2] != 0)
+    overlaps = sum(1 for amino1 in range(num_amino)
+                   for amino2 in range(amino1 + builder.OVERLAP_GAP, num_amino, pair_step))
+    return contacts, overlaps
+
+
+def count_terms(bqm):
+    return {
+        'variables': len(bqm.variables),
+        'ancillas': sum(1 for var in bqm.variables if is_ancilla(var)),
+        'linear_terms': len(bqm.linear),
+        'quadratic_terms': len(bqm.quadratic),
+    }
+
+
+def pruning_report(sequence, energy_model, lattice_type, shared_registers=False):
+    """
+    Compare the pruned and unpruned builds of a sequence.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    shared_registers : bool
+        Build with the shared position registers.
+
+    Returns
+    -------
+    dict
+        Counts of the full build, the pruned build and the difference between them.
+    """
+    builder = BUILDERS[lattice_type]
+    report = {}
+    for name, pair_step in (('full', 1), ('pruned', builder.PAIR_STEP)):
+        start = time.time()
+        model, bqm, qubo, ising, gates = builder.create_energy_function(sequence, energy_model, shared_registers,
+                                                                        pair_step)
+        build_seconds = time.time() - start
+        contacts, overlaps = count_circuits(sequence, energy_model, builder, pair_step)
+        report[name] = {'contact_circuits': contacts, 'overlap_circuits': overlaps, **count_terms(bqm),
+                        'build_seconds': build_seconds}
+
+    report['avoided'] = {key: report['full'][key] - report['pruned'][key] for key in report['full']}
+    return report
+
+
+if __name__ == '__main__':
+    from pprint import pprint
+
+    for lattice_type, sequence in [(4, 'GAAGAAG'), (6, 'GAAGA')]:
+        print(f'HCOMB{lattice_type} {sequence}')
+        pprint(pruning_report(sequence, 'HP', lattice_type))
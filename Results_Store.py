@@ -0,0 +1,222 @@
+"""
+Columnar on-disk store of annealer sample sets.
+
+Every saved sample set is a run directory Results/{run_id}/ of plain .npy arrays: the samples
+bit-packed with np.packbits (one row per record, sorted by energy), the energies, occurrences
+and any other per-sample vector (is_feasible...), and a small header with the variable
+labels. The arrays open memory-mapped, so the best k samples of a run read and unpack k rows
+only. One JSON line per run in Results/catalog.jsonl holds the run's metadata (sequence,
+lattice type, energy model, penalty, solver, timings, best energy...), so finding runs reads
+the catalog and never a sample set.
+
+The timestamped Results/*.pkl pickles of earlier versions still load through load_samples.
+
+Examples
+--------
+python Results_Store.py --sequence YGGFM --lattice-type 12
+"""
+
+import argparse
+import json
+import os
+import pickle
+import time
+import uuid
+
+import dimod
+import numpy as np
+
+RESULTS_DIRECTORY = 'Results'
+CATALOG_FILE = 'catalog.jsonl'
+HEADER_FILE = 'header.json'
+SAMPLES_FILE = 'samples.npy'
+
+
+class ResultsStore:
+    """
+    Run directories of bit-packed sample sets and their catalog.
+
+    Parameters
+    ----------
+    directory : str
+        Directory holding the runs and the catalog.
+    """
+
+    def __init__(self, directory=RESULTS_DIRECTORY):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def catalog_path(self):
+        return os.path.join(self.directory, CATALOG_FILE)
+
+    def run_path(self, run_id):
+        return os.path.join(self.directory, run_id)
+
+    def save(self, samples, name='Samples', **metadata):
+        """
+        Store a sample set as a new run.
+
+        Parameters
+        ----------
+        samples : dimod.SampleSet
+            Samples to store. Every one-dimensional data vector is kept.
+        name : str
+            Prefix of the run id, e.g. 'Samples' or 'Polished'.
+        **metadata
+            JSON-serializable fields of the catalog record (sequence, energy_model,
+            lattice_type, penalty, solver, timings...).
+
+        Returns
+        -------
+        str
+            Id of the new run.
+        """
+        run_id = f'{name}_{int(time.time())}_{uuid.uuid4().hex[:8]}'
+        record = samples.record
+        order = np.argsort(record.energy, kind='stable')
+        sample = record.sample[order]
+        if samples.vartype is dimod.SPIN:
+            sample = (sample + 1) // 2
+        vectors = [field for field in record.dtype.names if field != 'sample' and record[field].ndim == 1]
+
+        # Write into a temporary directory and rename it, a run is either complete or missing
+        temporary_path = f'{self.run_path(run_id)}.{os.getpid()}.tmp'
+        os.makedirs(temporary_path)
+        np.save(os.path.join(temporary_path, SAMPLES_FILE), np.packbits(sample.astype(np.uint8), axis=1))
+        for field in vectors:
+            np.save(os.path.join(temporary_path, f'{field}.npy'), record[field][order])
+        header = {'variables': list(samples.variables), 'vartype': samples.vartype.name, 'vectors': vectors}
+        with open(os.path.join(temporary_path, HEADER_FILE), 'w') as f:
+            json.dump(header, f)
+        os.replace(temporary_path, self.run_path(run_id))
+
+        entry = {
+            'run_id': run_id,
+            'name': name,
+            'timestamp': time.time(),
+            'rows': len(record),
+            'samples': int(record.num_occurrences.sum()),
+            'num_variables': len(samples.variables),
+            'best_energy': float(record.energy.min()) if len(record) else None,
+            **metadata,
+        }
+        if 'is_feasible' in vectors:
+            feasible = record.is_feasible
+            entry['feasible_rows'] = int(feasible.sum())
+            entry['best_feasible_energy'] = float(record.energy[feasible].min()) if feasible.any() else None
+        # One short line per write, appends of concurrent runs do not interleave
+        with open(self.catalog_path(), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        return run_id
+
+    def catalog(self, **filters):
+        """
+        Catalog records of the stored runs.
+
+        Parameters
+        ----------
+        **filters
+            Field values a record must have, e.g. sequence='YGGFM', lattice_type=12.
+
+        Returns
+        -------
+        list of dict
+            Matching records, oldest first.
+        """
+        if not os.path.exists(self.catalog_path()):
+            return []
+        with open(self.catalog_path()) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return [record for record in records
+                if all(record.get(field) == value for field, value in filters.items())]
+
+    def columns(self, run_id):
+        """
+        Memory-mapped arrays of a run.
+
+        Parameters
+        ----------
+        run_id : str
+            Id returned by save.
+
+        Returns
+        -------
+        header : dict
+            Variable labels, vartype name and the stored vectors.
+        arrays : dict
+            'samples' (rows x ceil(num_variables / 8) packed bits) and every stored vector
+            ('energy', 'num_occurrences'...), rows sorted by energy.
+        """
+        path = self.run_path(run_id)
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+        arrays = {'samples': np.load(os.path.join(path, SAMPLES_FILE), mmap_mode='r')}
+        for field in header['vectors']:
+            arrays[field] = np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r')
+        return header, arrays
+
+    def load(self, run_id, top_k=None):
+        """
+        Sample set of a run.
+
+        Parameters
+        ----------
+        run_id : str
+            Id returned by save.
+        top_k : int or None
+            Load only the top_k lowest energy rows.
+
+        Returns
+        -------
+        dimod.SampleSet
+            The stored rows, lowest energy first.
+        """
+        header, arrays = self.columns(run_id)
+        rows = slice(None, top_k)
+        sample = np.unpackbits(arrays['samples'][rows], axis=1, count=len(header['variables']))
+        vartype = dimod.Vartype[header['vartype']]
+        if vartype is dimod.SPIN:
+            sample = 2 * sample.astype(np.int8) - 1
+        vectors = {field: np.array(arrays[field][rows]) for field in header['vectors']}
+        return dimod.SampleSet.from_samples((sample, header['variables']), vartype, **vectors)
+
+
+def load_samples(source, top_k=None):
+    """
+    Sample set of a run id, a run directory or a legacy pickle.
+
+    Parameters
+    ----------
+    source : str
+        Run id in Results, path of a run directory, or path of a pickled dimod.SampleSet
+        (.pkl) written by earlier versions.
+    top_k : int or None
+        Load only the top_k lowest energy rows of a stored run (pickles load whole).
+
+    Returns
+    -------
+    dimod.SampleSet
+        The samples.
+    """
+    if source.endswith('.pkl'):
+        with open(source, 'rb') as f:
+            return pickle.load(f)
+    if os.path.isdir(source):
+        directory, run_id = os.path.split(os.path.normpath(source))
+        return ResultsStore(directory or '.').load(run_id, top_k)
+    return ResultsStore().load(source, top_k)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='List the stored runs')
+    parser.add_argument('--directory', type=str, default=RESULTS_DIRECTORY, help='Results directory')
+    parser.add_argument('--sequence', type=str, default=None, help='Only runs of this sequence')
+    parser.add_argument('--energy-model', type=str, default=None, help='Only runs of this energy model')
+    parser.add_argument('--lattice-type', type=int, default=None, help='Only runs on this lattice')
+    parser.add_argument('--name', type=str, default=None, help="Only runs of this kind, e.g. 'Polished'")
+
+    args = parser.parse_args()
+    filters = {'sequence': args.sequence, 'energy_model': args.energy_model, 'lattice_type': args.lattice_type,
+               'name': args.name}
+    for record in ResultsStore(args.directory).catalog(**{k: v for k, v in filters.items() if v is not None}):
+        print(json.dumps(record))
@@ -1,58 +1,122 @@
-import pickle
+import os
 import numpy as np
 
-def sample_analysis(samples):
-    bit_samples = samples.record.sample
-
-    print(len(samples.variables))
-    columns_to_delete = []
-
-    for x in range(len(samples.variables)):
-        if '*' in samples.variables[x]:
-            columns_to_delete.append(x)
-
-    print(len(columns_to_delete))
-
-    for element in reversed(columns_to_delete):
-        bit_samples = np.delete(bit_samples, element, 1)
-
-    bitstring_samples = []
-    for bit_sample in bit_samples:
-        bitstring_samples.append(''.join([str(int(bit)) for bit in bit_sample]))
-
-    # Assuming bit_samples, samples.record.num_occurrences, and samples.record.energy are lists or arrays of the same length
-    for bit_sample, occurrence, energy in zip(bitstring_samples, samples.record.num_occurrences, samples.record.energy):
-        print(bit_sample, occurrence, energy)
+from QUBO.Direct_BQM import is_ancilla
+from Results_Store import load_samples
+
+TOP_K = 20
+
+
+def sample_analysis(samples, top_k=TOP_K, output_directory=None):
+    """
+    Summarize a sample set by its distinct conformations.
+
+    The ancilla columns are dropped with one boolean mask and every row is bit-packed, so
+    duplicate bitstrings are counted with np.unique on a few bytes per row instead of on
+    strings. Only the top_k most frequent and the top_k lowest energy bitstrings are
+    unpacked, printed and plotted.
+
+    Parameters
+    ----------
+    samples : dimod.SampleSet
+        Samples to analyze, ancillas are ignored.
+    top_k : int
+        Bitstrings listed and plotted per ranking.
+    output_directory : str or None
+        Write the plots to occurrences.png and energies.png in this directory with the
+        non-interactive backend instead of showing them.
+
+    Returns
+    -------
+    dict
+        Sample and distinct bitstring counts, and the most frequent and the lowest energy
+        bitstrings as (bitstring, occurrences, energy) tuples.
+    """
+    variables = list(samples.variables)
+    qubit_mask = np.array([not is_ancilla(var) for var in variables], dtype=bool)
+    print(len(variables))
+    print(np.count_nonzero(~qubit_mask))
+
+    bit_samples = samples.record.sample[:, qubit_mask].astype(np.uint8)
+    num_bits = bit_samples.shape[1]
+    if not bit_samples.size:
+        print('No samples to analyze')
+        return {'samples': int(samples.record.num_occurrences.sum()), 'distinct': 0, 'most_frequent': [],
+                'lowest_energy': []}
+    packed = np.packbits(bit_samples, axis=1)
+    packed = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+
+    # Occurrences add up over duplicate rows, a bitstring keeps its lowest energy
+    unique_rows, inverse = np.unique(packed, return_inverse=True)
+    inverse = inverse.ravel()
+    occurrences = np.bincount(inverse, weights=samples.record.num_occurrences, minlength=len(unique_rows))
+    energies = np.full(len(unique_rows), np.inf)
+    np.minimum.at(energies, inverse, samples.record.energy)
+
+    def bitstrings(indices):
+        rows = np.frombuffer(unique_rows[indices].tobytes(), dtype=np.uint8).reshape(len(indices), -1)
+        bits = np.unpackbits(rows, axis=1, count=num_bits)
+        return [''.join(row) for row in bits.astype(str).tolist()]
+
+    most_frequent = np.argsort(-occurrences, kind='stable')[:top_k]
+    lowest_energy = np.argsort(energies, kind='stable')[:top_k]
+    summary = {
+        'samples': int(samples.record.num_occurrences.sum()),
+        'distinct': len(unique_rows),
+        'most_frequent': list(zip(bitstrings(most_frequent), occurrences[most_frequent].astype(int).tolist(),
+                                  energies[most_frequent].tolist())),
+        'lowest_energy': list(zip(bitstrings(lowest_energy), occurrences[lowest_energy].astype(int).tolist(),
+                                  energies[lowest_energy].tolist())),
+    }
+
+    print(f"{summary['samples']} samples, {summary['distinct']} distinct bitstrings")
+    for title in ('most_frequent', 'lowest_energy'):
+        print(f'Top {top_k} {title.replace("_", " ")}:')
+        for bitstring, occurrence, energy in summary[title]:
+            print(bitstring, occurrence, energy)
 
     # Create Matplot lib graph x-axis is bitstring_samples, y-axis is samples.record.num_occurrences
+    if output_directory is not None:
+        from Visualize import use_headless_backend
+        use_headless_backend()
+        os.makedirs(output_directory, exist_ok=True)
     import matplotlib.pyplot as plt
 
     # Plot for Number of Occurrences
-    plt.bar(bitstring_samples, samples.record.num_occurrences)
+    bitstring_samples, num_occurrences, _ = zip(*summary['most_frequent'])
+    plt.figure()
+    plt.bar(bitstring_samples, num_occurrences)
     plt.xlabel('Bitstring Samples')
     plt.ylabel('Number of Occurrences')
-    plt.title('Bitstring Samples vs Number of Occurrences')
+    plt.title(f'Top {top_k} Bitstring Samples vs Number of Occurrences')
     plt.xticks(rotation=90, fontsize=8)  # Rotate labels and adjust font size
     plt.tight_layout()  # Adjust layout to prevent clipping
-    plt.show()
+    show_or_save(plt, output_directory, 'occurrences.png')
 
     # Plot for Energy
-    plt.bar(bitstring_samples, samples.record.energy)
+    bitstring_samples, _, sample_energies = zip(*summary['lowest_energy'])
+    plt.figure()
+    plt.bar(bitstring_samples, sample_energies)
     plt.xlabel('Bitstring Samples')
     plt.ylabel('Energy')
-    plt.title('Bitstring Samples vs Energy')
+    plt.title(f'Top {top_k} Bitstring Samples vs Energy')
     plt.xticks(rotation=90, fontsize=8)  # Rotate labels and adjust font size
     plt.tight_layout()  # Adjust layout to prevent clipping
-    plt.show()
+    show_or_save(plt, output_directory, 'energies.png')
+
+    return summary
 
 
+def show_or_save(plt, output_directory, file_name):
+    if output_directory is None:
+        plt.show()
+    else:
+        plt.savefig(os.path.join(output_directory, file_name))
+        plt.close()
 
-def unpickle_file(file_path):
-  with open(file_path, 'rb') as f:
-    return pickle.load(f)
 
 if __name__ == '__main__':
-    samples = unpickle_file('Results/Samples_1731334129.pkl')
+    samples = load_samples('Results/Samples_1731334129.pkl')
 
     sample_analysis(samples)
 
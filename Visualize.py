@@ -1,151 +1,131 @@
 import argparse
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Decoder import free_bits, lattice_contacts, lattice_positions
 from Energy import encode_hp, encode_hpab
+from Lattices import PRESETS, QUBITS_PER_AMINO
+from Results_Store import load_samples
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
+TOP_K = 20
+IMAGE_FORMATS = ['png', 'svg']
+
+
+def use_headless_backend():
+    # Non-interactive Agg backend: figures are only ever written to files, no display needed
+    matplotlib.use('Agg')
 
-def visualize(sequence, energy_model, lattice_type, binary_output):
-    # Uses Matplotlib to visualize the protein sequence on a lattice
+
+def visualize(sequence, energy_model, lattice_type, binary_output, path=None, fig=None):
+    # Uses Matplotlib to visualize the protein sequence on a lattice. With a path the figure is written
+    # to the file instead of shown, and a figure passed in is cleared and redrawn instead of created
 
     if lattice_type == 4:
-        visualize_4(sequence, energy_model, binary_output)
+        return visualize_4(sequence, energy_model, binary_output, path, fig)
     elif lattice_type == 6:
-        visualize_6(sequence, energy_model, binary_output)
+        return visualize_6(sequence, energy_model, binary_output, path, fig)
     elif lattice_type == 8:
-        visualize_8(sequence, energy_model, binary_output)
+        return visualize_8(sequence, energy_model, binary_output, path, fig)
     else:
-        visualize_12(sequence, energy_model, binary_output)
-
+        return visualize_12(sequence, energy_model, binary_output, path, fig)
 
-def get_interaction_coords(coordinates):
-    # cycle through the coordinates and return pairs of coordinates that are 1 unit apart
-    interaction_coords = []
-    connection_coords = []
 
-    for i in range(len(coordinates)):
-        for j in range(i+2, len(coordinates)):
-            if close_to_one(math.dist(coordinates[i], coordinates[j])):
-                interaction_coords.append((coordinates[i], coordinates[j]))
+def get_interaction_coords(coordinates, positions, lattice_type):
+    # Pairs of drawn coordinates in contact (found in the occupancy hash of Decoder.lattice_contacts from the
+    # integer lattice positions) and of consecutive aminos joined by a real move
+    _, amino1, amino2, _ = lattice_contacts(positions[None], lattice_type)
+    interaction_coords = [(coordinates[i], coordinates[j]) for i, j in zip(amino1.tolist(), amino2.tolist())]
 
-    for i in range(len(coordinates) - 1):
-        j = i + 1
-        if close_to_one(math.dist(coordinates[i], coordinates[j])):
-            connection_coords.append((coordinates[i], coordinates[j]))
+    moving = (positions[1:] != positions[:-1]).any(axis=1)
+    connection_coords = [(coordinates[i], coordinates[i + 1]) for i in np.flatnonzero(moving).tolist()]
 
     return (interaction_coords, connection_coords)
 
 
-def close_to_one(num):
-    if 0.98 < num < 1.02:
-        return True
-    return False
-
-
-def visualize_4(sequence, energy_model, binary_output):
+# Per lattice scale from the integer move vectors of Lattices.py to unit bond lengths: the square (4)
+# and cubic (6) lattices are already unit, the triangular prismatic (8) lattice stores sqrt(3)/2 and 1/2
+# steps in x and y as 1, and the FCC (12) lattice stores sqrt(2)/2 steps as 1
+AXIS_SCALES = {
+    4: (1.0, 1.0, 1.0),
+    6: (1.0, 1.0, 1.0),
+    8: (math.sqrt(3) / 2, 1 / 2, 1.0),
+    12: (math.sqrt(2) / 2, math.sqrt(2) / 2, math.sqrt(2) / 2),
+}
+
+
+def num_amino_of_bits(num_bits, lattice_type):
+    # Chain length whose free move qubits number num_bits
+    presets = len(PRESETS[lattice_type])
+    num_amino, remainder = divmod(num_bits + presets, QUBITS_PER_AMINO[lattice_type])
+    if remainder:
+        raise ValueError(f'{num_bits} bits are not a whole number of HCOMB{lattice_type} moves.')
+    return num_amino + 1
+
+
+def cartesian_coordinates(bits, lattice_type, return_positions=False):
+    """
+    Cartesian coordinates of a batch of conformations.
+
+    Parameters
+    ----------
+    bits : np.ndarray
+        (num_samples, num_bits) free move qubits ordered like free_qubits (the QUBO output
+        bitstrings), the preset qubits are restored.
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    return_positions : bool
+        Also return the integer lattice positions the coordinates are scaled from.
+
+    Returns
+    -------
+    coordinates : np.ndarray
+        (num_samples, num_amino, 3) coordinates with unit bonds, the first amino at the
+        origin and z = 0 on the square lattice. Redundant move codes do not move.
+    positions : np.ndarray
+        (num_samples, num_amino, 3) integer lattice positions, only with return_positions.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    num_amino = num_amino_of_bits(bits.shape[1], lattice_type)
+    positions, _ = lattice_positions(bits, num_amino, lattice_type)
+    coordinates = positions * np.array(AXIS_SCALES[lattice_type])
+    return (coordinates, positions) if return_positions else coordinates
+
+
+def visualize_4(sequence, energy_model, binary_output, path=None, fig=None):
     # Visualizes the protein sequence on a square lattice
-    moves = {
-        '01': [1, 0],
-        '10': [-1, 0],
-        '11': [0, 1],
-        '00': [0, -1]
-    }
-
-    binary = '01' + binary_output[0] + '1' + binary_output[1:]
-    coordinates = generate_carteisan_coordinates(binary, moves, 2)
-    color_sequences = encoded_sequence(energy_model, sequence)
-    interaction_coords, connection_coords = get_interaction_coords(coordinates)
-    plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords)
+    return visualize_lattice(sequence, energy_model, 4, binary_output, path, fig)
 
 
-def visualize_6(sequence, energy_model, binary_output):
+def visualize_6(sequence, energy_model, binary_output, path=None, fig=None):
     # Visualizes the protein sequence on a cubic lattice
-    moves = {
-        '000': [1, 0, 0],
-        '001': [-1, 0, 0],
-        '010': [0, 1, 0],
-        '011': [0, -1, 0],
-        '100': [0, 0, 1],
-        '101': [0, 0, -1]
-    }
-
-    binary = '000' + binary_output[0] + '00' + binary_output[1:]
-    coordinates = generate_carteisan_coordinates(binary, moves, 3)
-    color_sequences = encoded_sequence(energy_model, sequence)
-    interaction_coords, connection_coords = get_interaction_coords(coordinates)
-    plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords)
+    return visualize_lattice(sequence, energy_model, 6, binary_output, path, fig)
 
 
-def visualize_8(sequence, energy_model, binary_output):
+def visualize_8(sequence, energy_model, binary_output, path=None, fig=None):
     # Visualizes the protein sequence on a trianguler prismatic lattice
-    sqrt3_2 = math.sqrt(3) / 2
-    moves = {
-        '111': [0, 1, 0],
-        '000': [0, -1, 0],
-        '011': [sqrt3_2, 1/2, 0],
-        '100': [-1 * sqrt3_2, -1/2, 0],
-        '101': [-1 * sqrt3_2, 1/2, 0],
-        '010': [sqrt3_2, -1/2, 0],
-        '001': [0, 0, 1],
-        '110': [0, 0, -1]
-    }
-
-    binary = '00' + binary_output
-    coordinates = generate_carteisan_coordinates(binary, moves, 3)
-    color_sequences = encoded_sequence(energy_model, sequence)
-    interaction_coords, connection_coords = get_interaction_coords(coordinates)
-    plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords)
+    return visualize_lattice(sequence, energy_model, 8, binary_output, path, fig)
 
 
-def visualize_12(sequence, energy_model, binary_output):
+def visualize_12(sequence, energy_model, binary_output, path=None, fig=None):
     # Visualizes the protein sequence on a FCC lattice
-    sqrt2_2 = math.sqrt(2) / 2
-    moves = {
-        '1011': [sqrt2_2, sqrt2_2, 0],
-        '1111': [-1 * sqrt2_2, sqrt2_2, 0],
-        '1010': [sqrt2_2, -1 * sqrt2_2, 0],
-        '1110': [-1 * sqrt2_2, -1 * sqrt2_2, 0],
-        '0111': [0, sqrt2_2, sqrt2_2],
-        '0101': [0, -1 * sqrt2_2, sqrt2_2],
-        '0110': [0, sqrt2_2, -1 * sqrt2_2],
-        '0100': [0, -1 * sqrt2_2, -1 * sqrt2_2],
-        '1001': [sqrt2_2, 0, sqrt2_2],
-        '1101': [-1 * sqrt2_2, 0, sqrt2_2],
-        '1000': [sqrt2_2, 0, -1 * sqrt2_2],
-        '1100': [-1 * sqrt2_2, 0, -1 * sqrt2_2]
-    }
-
-    binary = '10111' + binary_output[0] + binary_output[1] + '1' + binary_output[2:]
-    coordinates = generate_carteisan_coordinates(binary, moves, 4)
-    color_sequences = encoded_sequence(energy_model, sequence)
-    interaction_coords, connection_coords = get_interaction_coords(coordinates)
-    plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords)
-
+    return visualize_lattice(sequence, energy_model, 12, binary_output, path, fig)
 
-def generate_carteisan_coordinates(binary, moves, bits_per_move):
-    if bits_per_move == 2:
-        # Generates the cartesian coordinates of the protein sequence
-        x, y = 0, 0
-        coordinates = [(x, y)]
 
-        for i in range(0, len(binary), 2):
-            move = binary[i:i + 2]
-            x += moves[move][0]
-            y += moves[move][1]
-            coordinates.append((x, y))
-    else:
-        # Generates the cartesian coordinates of the protein sequence
-        x, y, z = 0, 0, 0
-        coordinates = [(x, y, z)]
-
-        for i in range(0, len(binary), bits_per_move):
-            move = binary[i:i+bits_per_move]
-            x += moves[move][0]
-            y += moves[move][1]
-            z += moves[move][2]
-            coordinates.append((x, y, z))
-
-    return coordinates
+def visualize_lattice(sequence, energy_model, lattice_type, binary_output, path=None, fig=None):
+    bits = np.frombuffer(binary_output.encode(), dtype=np.uint8)[None] - ord('0')
+    coordinates, positions = cartesian_coordinates(bits, lattice_type, return_positions=True)
+    # The square lattice is drawn in 2D
+    dimensions = 2 if lattice_type == 4 else 3
+    coordinates = [tuple(coordinate) for coordinate in coordinates[0, :, :dimensions].tolist()]
+    color_sequences = encoded_sequence(energy_model, sequence)
+    interaction_coords, connection_coords = get_interaction_coords(coordinates, positions[0], lattice_type)
+    return plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords, path, fig)
 
 
 def encoded_sequence(energy_model, sequence):
@@ -161,9 +141,15 @@ def encoded_sequence(energy_model, sequence):
     return encode_sequence
 
 
-def plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords):
+def plot_lattice(coordinates, color_sequences, interaction_coords, connection_coords, path=None, fig=None):
     num_of_dimensions = len(coordinates[0])
 
+    # Reuse the figure of the previous frame when given, creating figures dominates batch rendering
+    if fig is None:
+        fig = plt.figure()
+    else:
+        fig.clf()
+
     # Map unique characters to colors
     unique_chars = sorted(list(set(color_sequences)))
     predefined_colors = ['red', 'blue', 'green', 'yellow', 'cyan']
@@ -177,7 +163,7 @@ def plot_lattice(coordinates, color_sequences, interaction_coords, connection_co
 
     if num_of_dimensions == 2:
         # Create a 2D plot
-        fig, ax = plt.subplots()
+        ax = fig.add_subplot(111)
         # Unzip the coordinates
         x, y = zip(*coordinates)
         # Plot the nodes with colors
@@ -205,7 +191,6 @@ def plot_lattice(coordinates, color_sequences, interaction_coords, connection_co
 
     elif num_of_dimensions == 3:
         # Create a 3D plot
-        fig = plt.figure()
         ax = fig.add_subplot(111, projection='3d')
         # Unzip the coordinates
         x, y, z = zip(*coordinates)
@@ -236,8 +221,75 @@ def plot_lattice(coordinates, color_sequences, interaction_coords, connection_co
     else:
         raise ValueError("Coordinates must be either 2D or 3D")
 
-    plt.show()
-
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path)
+    return fig
+
+
+
+def render_conformations(sampleset, sequence, energy_model, lattice_type, directory, top_k=TOP_K,
+                         image_format='png', workers=None):
+    """
+    Write images of the lowest energy conformations of a sample set without a display.
+
+    Parameters
+    ----------
+    sampleset : dimod.SampleSet
+        Samples over the move qubits of sequence (ancillas are ignored).
+    sequence : str
+        Amino acid sequence.
+    energy_model : str
+        Energy model ('HP', 'HPAB', 'WHPAB' or 'MJ').
+    lattice_type : int
+        Lattice type (4, 6, 8 or 12).
+    directory : str
+        Output directory, created when missing.
+    top_k : int
+        Number of distinct conformations rendered, lowest energy first. Samples with redundant
+        move codes are skipped.
+    image_format : str
+        'png' or 'svg'.
+    workers : int or None
+        Process pool size, the number of CPUs by default (never more than the frames).
+
+    Returns
+    -------
+    list of str
+        Paths of the written images, lowest energy first.
+    """
+    bits = free_bits(sampleset.record.sample, list(sampleset.variables), len(sequence), lattice_type)
+    # Redundant move codes have no lattice vector to draw
+    _, valid_moves = lattice_positions(bits, len(sequence), lattice_type)
+    rows, inverse = np.unique(bits[valid_moves], axis=0, return_inverse=True)
+    energies = np.full(len(rows), np.inf)
+    np.minimum.at(energies, inverse.ravel(), sampleset.record.energy[valid_moves])
+    order = np.argsort(energies, kind='stable')[:top_k]
+
+    os.makedirs(directory, exist_ok=True)
+    frames = [(''.join(rows[index].astype(str)),
+               os.path.join(directory, f'{sequence}_HCOMB{lattice_type}_{rank:03d}.{image_format}'))
+              for rank, index in enumerate(order.tolist())]
+    if not frames:
+        return []
+
+    # Every worker renders an interleaved share of the frames on one reused figure
+    workers = min(workers or os.cpu_count() or 1, len(frames))
+    jobs = [(sequence, energy_model, lattice_type, frames[worker::workers]) for worker in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as executor:
+        list(executor.map(render_frames, jobs))
+    return [path for _, path in frames]
+
+
+def render_frames(job):
+    # Runs in a pool worker: draws every frame of the job on the same figure and saves it
+    sequence, energy_model, lattice_type, frames = job
+    fig = None
+    for binary_output, path in frames:
+        fig = visualize(sequence, energy_model, lattice_type, binary_output, path, fig)
+    plt.close(fig)
+    return len(frames)
 
 
 if __name__ == '__main__':
@@ -245,8 +297,25 @@ if __name__ == '__main__':
     parser.add_argument('sequence', type=str, help='Protein sequence')
     parser.add_argument('energy_model', type=str, choices=['HP', 'HPAB', 'WHPAB', 'MJ'], help='Energy model')
     parser.add_argument('lattice_type', type=int, choices=[4, 6, 8, 12], help='Lattice type')
-    parser.add_argument('binary_output', type=str, help='Binary move output from QUBO')
-
+    parser.add_argument('binary_output', type=str, nargs='?', default=None, help='Binary move output from QUBO')
+    parser.add_argument('--samples', type=str, default=None, metavar='RUN',
+                        help='Render the top-k conformations of a stored run (id or directory, or a legacy .pkl) '
+                             'instead of binary_output')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the image to this file (a directory with --samples) instead of showing it')
+    parser.add_argument('--top-k', type=int, default=TOP_K, help='Conformations rendered with --samples')
+    parser.add_argument('--format', type=str, choices=IMAGE_FORMATS, default='png', help='Image format with --samples')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: CPU count)')
 
     args = parser.parse_args()
-    visualize(args.sequence, args.energy_model, args.lattice_type, args.binary_output)
+    if args.samples is not None:
+        sampleset = load_samples(args.samples)
+        paths = render_conformations(sampleset, args.sequence, args.energy_model, args.lattice_type,
+                                     args.output or 'Images', args.top_k, args.format, args.workers)
+        print(f'{len(paths)} images written')
+    elif args.binary_output is None:
+        parser.error('binary_output or --samples is required')
+    else:
+        if args.output is not None:
+            use_headless_backend()
+        visualize(args.sequence, args.energy_model, args.lattice_type, args.binary_output, args.output)
@@ -1,23 +1,25 @@
 import argparse
 import time
-import pickle
 
-from Annealer import annealer
-from Energy import encode_hp, encode_hpab, get_energy_matrix
+from Annealer import annealer, hubo_annealer, save_samples
+from BQM_Cache import BQMCache, build_polynomial, get_bqm, get_build_mode
+from Canonical import canonical_form, reverse_sampleset
+from Decoder import validate
+from Instrumentation import Profile, stage
+from Energy import encode_sequence, get_energy_matrix
 from Binary import HCOMB4, HCOMB6, HCOMB8, HCOMB12
-from QUBO import HCOMB4_QUBO, HCOMB6_QUBO, HCOMB8_QUBO, HCOMB12_QUBO
+from Polish import polish
+from QUBO import Parametric_QUBO
+from QUBO.BitOps_QUBO import ADDERS, DEFAULT_ADDER
 from Sample_Analysis import sample_analysis
+from Visualize import render_conformations
 
 
-def main(sequence, energy_model, lattice_type, binary):
-    if energy_model == 'HP':
-        encoded_sequence = encode_hp(sequence)
-    elif energy_model == 'HPAB':
-        encoded_sequence = encode_hpab(sequence)
-    elif energy_model == 'WHPAB':
-        encoded_sequence = encode_hpab(sequence)
-    else:
-        encoded_sequence = sequence
+def main(sequence, energy_model, lattice_type, binary, shared_registers=False, direct=False, parametric=False,
+         use_cache=True, sampler='hybrid', sampler_parameters=None, profile_path=None, adder=DEFAULT_ADDER,
+         signed_displacements=False, hubo=False, constraint_labels=False, polish_samples=False,
+         render_directory=None, verbose=False):
+    encoded_sequence = encode_sequence(sequence, energy_model)
 
     length = len(sequence)
 
@@ -43,24 +45,83 @@ def main(sequence, energy_model, lattice_type, binary):
         print(f'ENERGY_FUNCTION:\n{energy_function}')
         exit(0)
 
-    if lattice_type == 4:
-        model, bqm, qubo, ising = HCOMB4_QUBO.create_energy_function(sequence, energy_model)
-    elif lattice_type == 6:
-        model, bqm, qubo, ising = HCOMB6_QUBO.create_energy_function(sequence, energy_model)
-    elif lattice_type == 8:
-        model, bqm, qubo, ising = HCOMB8_QUBO.create_energy_function(sequence, energy_model)
+    profile = None
+    if profile_path is not None:
+        profile = Profile(sequence, energy_model=energy_model, lattice_type=lattice_type,
+                          build_mode=get_build_mode(shared_registers, direct, parametric, signed_displacements,
+                                                    adder),
+                          sampler='hubo' if hubo else sampler,
+                          adder=adder)
+
+    # Build and solve the canonical orientation, shared by every equivalent sequence
+    key, canonical_sequence, reverse = canonical_form(sequence, energy_model, lattice_type,
+                                                      shared_registers or signed_displacements)
+    print(f'CANONICAL_KEY:\t\t{key}' + (' (reversed)' if reverse else ''))
+
+    timings = {}
+    start = time.perf_counter()
+    if hubo:
+        # Solve the polynomial locally without quadratizing it
+        polynomial = build_polynomial(canonical_sequence, energy_model, lattice_type, shared_registers, direct,
+                                      profile, adder, signed_displacements)
+        timings['build_seconds'] = time.perf_counter() - start
+        samples = hubo_annealer(polynomial, profile, verbose, **(sampler_parameters or {}))
     else:
-        model, bqm, qubo, ising = HCOMB12_QUBO.create_energy_function(sequence, energy_model)
+        cache = BQMCache() if use_cache else None
+        bqm, gates = get_bqm(canonical_sequence, energy_model, lattice_type, shared_registers, direct, parametric,
+                             cache, profile, adder, signed_displacements)
+        if cache is not None:
+            print(f'BQM_CACHE:\t\t{cache.stats()}')
+        timings['build_seconds'] = time.perf_counter() - start
+
+        # RUN D Wave Annealer
+        samples = annealer(bqm, gates, sampler, profile, constraint_labels, verbose, **(sampler_parameters or {}))
+    timings['solve_seconds'] = time.perf_counter() - start - timings['build_seconds']
+
+    if reverse:
+        samples = reverse_sampleset(samples, length, lattice_type)
+
+    # Catalog fields of the stored runs, the samples are stored in the orientation of sequence
+    run_metadata = {
+        'sequence': sequence,
+        'energy_model': energy_model,
+        'lattice_type': lattice_type,
+        'penalty': float(Parametric_QUBO.create_feed_dict(canonical_sequence, energy_model, lattice_type)['penalty']),
+        'solver': 'hubo' if hubo else sampler,
+        'build_mode': get_build_mode(shared_registers, direct, parametric, signed_displacements, adder),
+        'canonical_key': key,
+    }
+    run_id = save_samples(samples, 'Samples', timings=timings, **run_metadata)
+    print(f'RESULTS:\t\t{run_id}')
+
+    # Feasibility and energies of the decoded conformations, independent of the solver
+    print(f'DECODED:\t\t{validate(samples, sequence, energy_model, lattice_type)}')
+
+    if polish_samples:
+        # Local search on the decoded conformations, kept next to the raw samples
+        start = time.perf_counter()
+        with stage(profile, 'polish') as entry:
+            polished = polish(samples, sequence, energy_model, lattice_type)
+            entry['samples'] = len(polished)
+        polish_seconds = time.perf_counter() - start
+        print(f'POLISHED:\t\t{validate(polished, sequence, energy_model, lattice_type)}')
+        polished_id = save_samples(polished, 'Polished', timings={'polish_seconds': polish_seconds}, parent=run_id,
+                                   **run_metadata)
+        print(f'RESULTS:\t\t{polished_id}')
 
-    # Pickle the quadratic problem
-    with open(f'Results/{sequence}_{lattice_type}_{energy_model}_BQM_{int(time.time())}.pkl', 'wb') as f:
-        pickle.dump(bqm, f)
+    if render_directory is not None:
+        # Headless images of the lowest energy conformations, polished ones when available
+        with stage(profile, 'render') as entry:
+            paths = render_conformations(polished if polish_samples else samples, sequence, energy_model,
+                                         lattice_type, render_directory)
+            entry['images'] = len(paths)
+        print(f'RENDERED:\t\t{len(paths)} images in {render_directory}')
 
-    # RUN D Wave Annealer
-    samples = annealer(bqm)
+    if profile is not None:
+        profile.emit(None if profile_path == '-' else profile_path)
 
     # Run Sample Analysis
-    sample_analysis(samples)
+    sample_analysis(samples, output_directory=render_directory)
 
 
 if __name__ == '__main__':
@@ -69,6 +130,38 @@ if __name__ == '__main__':
     parser.add_argument('energy_model', type=str, choices=['HP', 'HPAB', 'WHPAB', 'MJ'], help='Energy model')
     parser.add_argument('lattice_type', type=int, choices=[4, 6, 8, 12], help='Lattice type')
     parser.add_argument('--binary', action='store_true', help='Use Binary model')
+    parser.add_argument('--shared-registers', action='store_true',
+                        help='Derive pair displacements from shared per-amino position registers')
+    parser.add_argument('--signed-displacements', action='store_true',
+                        help="Compare one two's complement displacement per axis against constants")
+    parser.add_argument('--direct', action='store_true',
+                        help='Compile the BQM directly from NumPy arrays instead of the pyqubo expression')
+    parser.add_argument('--parametric', action='store_true',
+                        help='Feed the sequence energies into a model compiled once per lattice and length')
+    parser.add_argument('--no-cache', action='store_true', help='Rebuild the BQM instead of using the BQM cache')
+    parser.add_argument('--local', action='store_true',
+                        help='Solve offline with the built-in simulated annealer instead of LeapHybridCQMSampler')
+    parser.add_argument('--hubo', action='store_true',
+                        help='Solve the higher-order polynomial with the built-in annealer, without quadratization')
+    parser.add_argument('--constraint-labels', action='store_true',
+                        help='Name the CQM gate constraints after their gate variables and print them')
+    parser.add_argument('--verbose', action='store_true', help='Print the model and its variables before solving')
+    parser.add_argument('--polish', action='store_true',
+                        help='Improve the samples by lattice local search and save them next to the raw samples')
+    parser.add_argument('--render', type=str, default=None, metavar='DIR',
+                        help='Write the analysis plots and the top conformations to DIR instead of showing them')
+    parser.add_argument('--num-reads', type=int, default=100, help='Reads of the local annealer')
+    parser.add_argument('--num-sweeps', type=int, default=1000, help='Sweeps per read of the local annealer')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the local annealer')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, metavar='PATH',
+                        help='Append per-stage time, memory and sizes as a JSON line to PATH (stdout without PATH)')
+    parser.add_argument('--adder', type=str, choices=ADDERS, default=DEFAULT_ADDER,
+                        help='Population count of the direction sums: half adder cascade or compressor tree')
 
     args = parser.parse_args()
-    main(args.sequence, args.energy_model, args.lattice_type, args.binary)
+    main(args.sequence, args.energy_model, args.lattice_type, args.binary, args.shared_registers, args.direct,
+         args.parametric, not args.no_cache,
+         'local' if args.local else 'hybrid',
+         {'num_reads': args.num_reads, 'num_sweeps': args.num_sweeps, 'seed': args.seed}, args.profile,
+         args.adder, args.signed_displacements, args.hubo, args.constraint_labels, args.polish, args.render,
+         args.verbose)
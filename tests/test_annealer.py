@@ -0,0 +1,29 @@
+import numpy as np
+
+from Annealer import create_cqm
+from BQM_Cache import get_bqm
+
+
+def test_constraints_hold_on_consistent_samples():
+    bqm, gates = get_bqm('YGGF', 'MJ', 12, direct=True)
+    cqm = create_cqm(bqm, gates)
+    assert len(cqm.constraints) == len(gates)
+
+    # Random assignments are feasible exactly when their gate variables follow their circuits, and
+    # completing them makes every one of them feasible
+    variables = list(bqm.variables)
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 2, (200, len(variables))).astype(np.int8)
+    # Half the rows already consistent, so both sides of the equivalence are exercised
+    samples[::2] = gates.complete(samples[::2], variables)
+    completed = gates.complete(samples, variables)
+    for row, completed_row in zip(samples, completed):
+        sample = dict(zip(variables, row.tolist()))
+        assert cqm.check_feasible(sample) == np.array_equal(row, completed_row)
+        assert cqm.check_feasible(dict(zip(variables, completed_row.tolist())))
+
+
+def test_constraint_labels():
+    bqm, gates = get_bqm('YGGF', 'MJ', 12, direct=True)
+    cqm = create_cqm(bqm, gates, labels=True)
+    assert set(cqm.constraints) == set(gates.labels())
@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pytest
+
+from Batch import read_sequences, run_batch
+from QUBO.Direct_BQM import evaluate_energy_function
+
+
+def test_read_fasta(tmp_path):
+    path = tmp_path / 'seqs.fa'
+    path.write_text('>first description\nYGG\nfm\n\n>\nGAAGA\n>third\nKLLKKV\n')
+    assert list(read_sequences(str(path))) == [('first', 'YGGFM'), ('2', 'GAAGA'), ('third', 'KLLKKV')]
+
+
+def test_read_csv(tmp_path):
+    path = tmp_path / 'seqs.csv'
+    path.write_text('ID,Sequence\na,yggfm\nb,\nc,GAAGA\n')
+    assert list(read_sequences(str(path))) == [('a', 'YGGFM'), ('c', 'GAAGA')]
+
+    # Files without a known extension are sniffed, rows without a name column are numbered
+    path = tmp_path / 'seqs.txt'
+    path.write_text('sequence\nYGGFM\nGAAGA\n')
+    assert list(read_sequences(str(path))) == [('1', 'YGGFM'), ('2', 'GAAGA')]
+
+    path.write_text('name\nYGGFM\n')
+    with pytest.raises(ValueError):
+        list(read_sequences(str(path)))
+
+
+def test_run_batch(tmp_path):
+    input_path = tmp_path / 'seqs.fa'
+    input_path.write_text('>a\nYGGFM\n>b\nGAAGA\n>bad\nYGGBZ\n>c\nKLLKKV\n')
+    output_path = tmp_path / 'results.jsonl'
+    assert run_batch(str(input_path), str(output_path), 'MJ', 4, workers=2, direct=True, use_cache=False) == 4
+
+    results = {result['name']: result for result in map(json.loads, output_path.read_text().splitlines())}
+    assert set(results) == {'a', 'b', 'bad', 'c'}
+    assert 'error' in results['bad']
+    for name in ('a', 'b', 'c'):
+        # The reported energy is the energy of the reported conformation
+        result = results[name]
+        bits = np.array([[int(bit) for bit in result['bitstring']]], dtype=np.uint8)
+        assert result['best_energy'] == pytest.approx(
+            evaluate_energy_function(result['sequence'], 'MJ', 4, bits)[0])
+
+
+def test_run_batch_solves_equivalent_sequences_once(tmp_path):
+    # KIIKKV has the HP string of KLLKKV, VKKLLK is its reverse
+    input_path = tmp_path / 'seqs.fa'
+    input_path.write_text('>a\nKLLKKV\n>b\nKIIKKV\n>c\nVKKLLK\n')
+    output_path = tmp_path / 'results.jsonl'
+    assert run_batch(str(input_path), str(output_path), 'HP', 4, workers=1, direct=True, use_cache=False) == 3
+
+    results = list(map(json.loads, output_path.read_text().splitlines()))
+    assert sum(result['reused'] for result in results) == 2
+    assert len({result['best_energy'] for result in results}) == 1
+    for result in results:
+        bits = np.array([[int(bit) for bit in result['bitstring']]], dtype=np.uint8)
+        assert result['best_energy'] == pytest.approx(
+            evaluate_energy_function(result['sequence'], 'HP', 4, bits)[0])
@@ -0,0 +1,61 @@
+import itertools
+import math
+
+import pytest
+
+from BQM_Cache import build_bqm
+from Benchmark import benchmark_case, compare, make_corpus, time_to_solution
+from QUBO.Direct_BQM import build_objective, objective_bqm
+
+
+def test_corpus_is_reproducible():
+    corpus = make_corpus()
+    assert corpus == make_corpus()
+    assert [len(sequence) for sequence in corpus] == [4, 4, 5, 5]
+    assert make_corpus(seed=1) != corpus
+
+
+def test_time_to_solution():
+    assert time_to_solution(2.0, 100, 0.0) is None
+    assert time_to_solution(2.0, 100, 1.0) == 2.0
+    assert time_to_solution(2.0, 100, 0.5) == 2.0
+    # One read in a thousand succeeds: log(0.01) / log(0.999 ** 100) batches
+    assert time_to_solution(2.0, 100, 0.001) == pytest.approx(2.0 * math.log(0.01) / (100 * math.log(0.999)))
+
+
+def test_benchmark_case_finds_ground_state():
+    result = benchmark_case('YGGFM', 'MJ', 4, num_reads=20, num_sweeps=200)
+    assert result['build_mode'] == 'pyqubo'
+    assert result['best_energy'] == result['ground_energy']
+    assert result['success_probability'] > 0
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6])
+def test_benchmark_case_reaches_ground_state_through_gate_variables(lattice_type):
+    result = benchmark_case('YGGFMK', 'MJ', lattice_type, direct=True)
+    assert result['best_energy'] == result['ground_energy']
+    assert result['success_probability'] > 0
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6, 8, 12])
+def test_gate_penalties_stay_near_the_objective(lattice_type):
+    # With penalties scaled by everything downstream, YGGFMK reached coefficients of 1257 on HCOMB8
+    # and 1568 on HCOMB12 against 40 in the objective
+    objective, _ = build_objective('YGGFMK', 'MJ', lattice_type)
+    bqm, _ = build_bqm('YGGFMK', 'MJ', lattice_type, direct=True)
+
+    def largest(model):
+        return max(abs(bias) for bias in itertools.chain(model.linear.values(), model.quadratic.values()))
+
+    assert largest(bqm) <= 5 * largest(objective_bqm(objective))
+
+
+def test_compare_flags_regressions():
+    case = {'lattice_type': 4, 'energy_model': 'MJ', 'sequence': 'YGGFM', 'build_mode': 'direct'}
+    baseline = {'results': [{**case, 'build_seconds': 1.0, 'variables': 10, 'best_energy': -5.0}]}
+    current = {'results': [{**case, 'build_seconds': 1.05, 'variables': 11, 'best_energy': -4.0}]}
+    rows = {row['metric']: row for row in compare(current, baseline)}
+    assert not rows['build_seconds']['regression']
+    assert rows['variables']['regression'] and rows['variables']['ratio'] == pytest.approx(1.1)
+    assert rows['best_energy']['regression']
+    assert not any(row['regression'] for row in compare(baseline, baseline))
@@ -0,0 +1,68 @@
+import itertools
+import pickle
+
+import dimod
+import pytest
+
+import BQM_Cache
+from BQM_Cache import BQMCache, cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing access times, so the LRU order does not depend on the timer resolution
+    ticks = itertools.count()
+    monkeypatch.setattr(BQM_Cache.time, 'time', lambda: float(next(ticks)))
+
+
+def small_bqm(bias):
+    return dimod.BinaryQuadraticModel({'q_1a': bias, 'q_2a': -bias}, {('q_1a', 'q_2a'): 2.0}, 0.5, dimod.BINARY)
+
+
+def test_hit_and_miss(tmp_path, clock):
+    cache = BQMCache(str(tmp_path))
+    builds = []
+    bqm = cache.get_or_build('a', lambda: builds.append('a') or small_bqm(1.0))
+    assert cache.get_or_build('a', lambda: builds.append('a') or small_bqm(1.0)) == bqm
+    assert builds == ['a']
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    # The index persists, a new cache over the directory sees the entry and the counts
+    reopened = BQMCache(str(tmp_path))
+    assert reopened.get('a') == bqm
+    assert reopened.stats() == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, 'entries': 1,
+                                'bytes': cache.stats()['bytes']}
+
+
+def test_least_recently_used_is_evicted(tmp_path, clock):
+    entry_bytes = len(pickle.dumps(small_bqm(1.0)))
+    cache = BQMCache(str(tmp_path), max_bytes=2 * entry_bytes)
+    cache.put('a', small_bqm(1.0))
+    cache.put('b', small_bqm(2.0))
+    assert cache.get('a') is not None
+
+    cache.put('c', small_bqm(3.0))
+    assert set(cache.index['entries']) == {'a', 'c'}
+    assert not (tmp_path / 'b.pkl').exists()
+    assert cache.get('b') is None
+    assert cache.stats()['bytes'] <= 2 * entry_bytes
+
+
+def test_entry_larger_than_the_bound_is_kept(tmp_path, clock):
+    # The newest entry survives its own eviction pass even when it alone exceeds the bound
+    cache = BQMCache(str(tmp_path), max_bytes=1)
+    cache.put('a', small_bqm(1.0))
+    cache.put('b', small_bqm(2.0))
+    assert set(cache.index['entries']) == {'b'}
+
+
+def test_keys():
+    key = cache_key('YGGFM', 'HP', 4, 5.0, 5.0)
+    # Sequences with the same encoding share an entry
+    assert cache_key('KAALV', 'HP', 4, 5.0, 5.0) == key
+    assert cache_key('YGGFM', 'HP', 4, 5.0, 5.0, 'pyqubo') == key
+    # Every other field separates entries
+    assert len({key, cache_key('YGGFM', 'MJ', 4, 5.0, 5.0), cache_key('KAALV', 'MJ', 4, 5.0, 5.0),
+                cache_key('YGGFM', 'HPAB', 4, 5.0, 5.0), cache_key('YGGFM', 'HP', 6, 5.0, 5.0),
+                cache_key('YGGFM', 'HP', 4, 6.0, 5.0), cache_key('YGGFM', 'HP', 4, 5.0, 6.0),
+                cache_key('YGGFM', 'HP', 4, 5.0, 5.0, 'direct'), cache_key('YGGFMG', 'HP', 4, 5.0, 5.0)}) == 9
@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from QUBO import HCOMB4_QUBO, HCOMB6_QUBO, HCOMB12_QUBO
+
+BUILDERS = [(HCOMB4_QUBO, HCOMB4_QUBO.HCOMB4Builder), (HCOMB6_QUBO, HCOMB6_QUBO.HCOMB6Builder),
+            (HCOMB12_QUBO, HCOMB12_QUBO.HCOMB12Builder)]
+SEQUENCES = ['GAAGA', 'YGGFM', 'KLLKKV', 'LKKL']
+
+
+@pytest.mark.parametrize('module, builder_class', BUILDERS)
+def test_builders_own_their_qubits(module, builder_class):
+    # A second builder of another length leaves the qubit table of the first untouched
+    first = builder_class(5)
+    qubits = dict(first.q_vars)
+    builder_class(7)
+    assert first.q_vars == qubits
+    assert max(t for t, _ in first.q_vars) == 4
+
+
+def test_parallel_builds_match_sequential_builds():
+    sequential = [HCOMB4_QUBO.create_energy_function(sequence, 'MJ')[1] for sequence in SEQUENCES]
+    with ThreadPoolExecutor(max_workers=len(SEQUENCES)) as executor:
+        parallel = list(executor.map(lambda sequence: HCOMB4_QUBO.create_energy_function(sequence, 'MJ')[1],
+                                     SEQUENCES))
+    assert parallel == sequential
@@ -0,0 +1,69 @@
+import dimod
+import numpy as np
+import pytest
+
+from Canonical import canonical_form, reverse_conformations, reverse_sampleset
+from Lattices import move_table
+from QUBO.Direct_BQM import evaluate_energy_function, free_qubits, move_codes, qubit_label, truth_table
+
+SEQUENCE = 'KLLKKV'
+
+
+def reversed_problem(lattice_type):
+    # The orientation of SEQUENCE that canonical_form reverses, and its canonical sequence
+    for sequence in (SEQUENCE, SEQUENCE[::-1]):
+        _, canonical_sequence, reverse = canonical_form(sequence, 'HP', lattice_type, True)
+        if reverse:
+            return sequence, canonical_sequence
+    raise AssertionError('canonical_form reversed neither orientation')
+
+
+def self_avoiding(bits, num_amino, lattice_type):
+    vectors = move_table(lattice_type)[move_codes(bits, num_amino, lattice_type)]
+    positions = np.concatenate([np.zeros((len(bits), 1, 3), dtype=np.int64), np.cumsum(vectors, axis=1)], axis=1)
+    return np.array([len(np.unique(walk, axis=0)) == num_amino for walk in positions])
+
+
+def test_reverse_shares_key():
+    assert canonical_form(SEQUENCE, 'HP', 4)[0] == canonical_form(SEQUENCE[::-1], 'HP', 4)[0]
+    assert canonical_form('KIIKKV', 'HP', 4)[0] == canonical_form(SEQUENCE, 'HP', 4)[0]
+    # The truncated HCOMB8 comparisons are not symmetric, only the exact build reverses
+    assert canonical_form(SEQUENCE, 'HP', 8) == ('HP:PHHPPH', SEQUENCE, False)
+    assert canonical_form(SEQUENCE, 'HP', 8, True)[2]
+    # MJ sequences reverse when the energies of their residue pairs are symmetric
+    assert canonical_form('YGGFM', 'MJ', 4)[0] == canonical_form('MFGGY', 'MJ', 4)[0]
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6, 8, 12])
+def test_reverse_conformations_keep_energy(lattice_type):
+    sequence, canonical_sequence = reversed_problem(lattice_type)
+    assert canonical_sequence == sequence[::-1]
+    num_free = len(free_qubits(len(sequence), lattice_type))
+    bits = truth_table(num_free, 0, 1 << min(num_free, 14))
+    feasible = self_avoiding(bits, len(sequence), lattice_type)
+    assert feasible.any()
+
+    # Every self-avoiding walk of the canonical sequence is the same fold of the original one
+    reversed_bits, resolved = reverse_conformations(bits[feasible], len(sequence), lattice_type)
+    assert resolved.all()
+    assert self_avoiding(reversed_bits, len(sequence), lattice_type).all()
+    np.testing.assert_allclose(evaluate_energy_function(sequence, 'HP', lattice_type, reversed_bits, True),
+                               evaluate_energy_function(canonical_sequence, 'HP', lattice_type, bits[feasible], True))
+
+
+def test_reverse_sampleset_drops_unresolved():
+    lattice_type = 12
+    sequence, canonical_sequence = reversed_problem(lattice_type)
+    variables = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    bits = truth_table(len(variables), 0, 1 << len(variables))
+    energies = evaluate_energy_function(canonical_sequence, 'HP', lattice_type, bits, True)
+    samples = dimod.SampleSet.from_samples((bits, variables), dimod.BINARY, energy=energies)
+
+    # Every kept sample carries the energy of its conformation on the original chain
+    reversed_samples = reverse_sampleset(samples, len(sequence), lattice_type)
+    _, resolved = reverse_conformations(bits, len(sequence), lattice_type)
+    assert 0 < resolved.sum() < len(bits)
+    assert reversed_samples.record.num_occurrences.sum() == resolved.sum()
+    reversed_bits = reversed_samples.record.sample[:, [reversed_samples.variables.index(v) for v in variables]]
+    np.testing.assert_allclose(evaluate_energy_function(sequence, 'HP', lattice_type, reversed_bits, True),
+                               reversed_samples.record.energy)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import Decoder
+from Decoder import CONTACT_GAP, decode, lattice_contacts, lattice_positions
+from Lattices import neighbour_offsets
+from QUBO.Direct_BQM import free_qubits, qubit_label
+
+
+def random_bits(num_amino, lattice_type, num_samples=200):
+    rng = np.random.default_rng(num_amino * lattice_type)
+    return rng.integers(0, 2, (num_samples, len(free_qubits(num_amino, lattice_type))), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6, 8, 12])
+def test_hash_matches_pairwise_contacts(lattice_type):
+    num_amino = 9
+    positions, _ = lattice_positions(random_bits(num_amino, lattice_type), num_amino, lattice_type)
+    rows, amino1, amino2, collided = lattice_contacts(positions, lattice_type)
+
+    expected = set()
+    offsets = {tuple(offset) for offset in neighbour_offsets(lattice_type).tolist()}
+    for row, walk in enumerate(positions.tolist()):
+        for i in range(num_amino):
+            for j in range(i + CONTACT_GAP, num_amino):
+                if tuple(b - a for a, b in zip(walk[i], walk[j])) in offsets:
+                    expected.add((row, i, j))
+    assert sorted(zip(rows.tolist(), amino1.tolist(), amino2.tolist())) == sorted(expected)
+    assert all(amino1 < amino2)
+    np.testing.assert_array_equal(collided, [len({tuple(site) for site in walk}) < num_amino
+                                             for walk in positions.tolist()])
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6, 8, 12])
+def test_decode_paths_agree(lattice_type, monkeypatch):
+    sequence = 'YGGFMKLLKAVWWGHRTQ'
+    bits = random_bits(len(sequence), lattice_type)
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    results = []
+    for ratio in (0, 10 ** 9):
+        monkeypatch.setattr(Decoder, 'HASH_PAIR_RATIO', ratio)
+        results.append(decode(bits, labels, sequence, 'MJ', lattice_type))
+    for hashed, pairwise in zip(*results):
+        np.testing.assert_array_equal(hashed, pairwise)
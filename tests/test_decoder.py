@@ -0,0 +1,38 @@
+import dimod
+import numpy as np
+import pytest
+
+from Decoder import decode, validate
+from QUBO.Direct_BQM import evaluate_energy_function, free_qubits, qubit_label, truth_table
+
+CASES = [(4, 'YGGFMQ', 'MJ'), (6, 'GAAGGA', 'HPAB'), (8, 'GAAGA', 'HP'), (12, 'YGGFM', 'MJ')]
+
+
+def all_samples(sequence, lattice_type):
+    variables = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    return truth_table(len(variables), 0, 1 << len(variables)), variables
+
+
+@pytest.mark.parametrize('lattice_type, sequence, energy_model', CASES)
+def test_decode_matches_exact_energy_function(lattice_type, sequence, energy_model):
+    bits, variables = all_samples(sequence, lattice_type)
+    _, feasible, energies = decode(bits, variables, sequence, energy_model, lattice_type, chunk_rows=1000)
+    expected = evaluate_energy_function(sequence, energy_model, lattice_type, bits, True)
+
+    # The exact energy function adds its penalty to exactly the infeasible walks
+    assert feasible.any()
+    np.testing.assert_allclose(energies[feasible], expected[feasible])
+    assert np.all(expected[~feasible] > energies[~feasible])
+
+
+@pytest.mark.parametrize('lattice_type, sequence, energy_model', CASES)
+def test_validate_counts_mismatches(lattice_type, sequence, energy_model):
+    bits, variables = all_samples(sequence, lattice_type)
+    expected = evaluate_energy_function(sequence, energy_model, lattice_type, bits, True)
+    samples = dimod.SampleSet.from_samples((bits, variables), dimod.BINARY, energy=expected)
+    report = validate(samples, sequence, energy_model, lattice_type)
+    assert report['energy_mismatches'] == 0
+    assert report['best_true_energy'] == expected.min()
+
+    samples = dimod.SampleSet.from_samples((bits, variables), dimod.BINARY, energy=expected + 1)
+    assert validate(samples, sequence, energy_model, lattice_type)['energy_mismatches'] == report['feasible']
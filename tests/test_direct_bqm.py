@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from BQM_Cache import build_bqm
+from QUBO.Direct_BQM import compile_bqm, consistent_energies, evaluate_energy_function, free_qubits, qubit_label
+from QUBO.Direct_BQM import truth_table
+
+
+def all_assignments(sequence, lattice_type):
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    return labels, truth_table(len(labels), 0, 1 << len(labels))
+
+
+@pytest.mark.parametrize('lattice_type, sequence, energy_model, shared_registers', [
+    (4, 'GAAGA', 'HP', False), (4, 'GAAGA', 'HP', True), (4, 'YGGFM', 'MJ', False), (4, 'YGGFM', 'MJ', True),
+    (6, 'GAAGA', 'HPAB', False), (8, 'AGHWK', 'MJ', False), (12, 'GAAA', 'HP', False), (12, 'GAAA', 'HP', True)])
+def test_direct_matches_pyqubo(lattice_type, sequence, energy_model, shared_registers):
+    labels, bits = all_assignments(sequence, lattice_type)
+    direct_bqm, direct_gates = build_bqm(sequence, energy_model, lattice_type, shared_registers, direct=True)
+    pyqubo_bqm, pyqubo_gates = build_bqm(sequence, energy_model, lattice_type, shared_registers)
+    np.testing.assert_allclose(consistent_energies(direct_bqm, direct_gates, labels, bits),
+                               consistent_energies(pyqubo_bqm, pyqubo_gates, labels, bits))
+
+
+@pytest.mark.parametrize('shared_registers', [False, True])
+@pytest.mark.parametrize('lattice_type, sequence, energy_model', [(4, 'YGGFM', 'MJ'), (6, 'GAAGA', 'HPAB'),
+                                                                   (8, 'GAAA', 'HP'), (12, 'YGGFM', 'MJ')])
+def test_direct_matches_energy_function(lattice_type, sequence, energy_model, shared_registers):
+    # With ancillas at their products the BQM is the energy function on every assignment
+    labels, bits = all_assignments(sequence, lattice_type)
+    bqm, gates = compile_bqm(sequence, energy_model, lattice_type, shared_registers)
+    expected = evaluate_energy_function(sequence, energy_model, lattice_type, bits, shared_registers)
+    np.testing.assert_allclose(consistent_energies(bqm, gates, labels, bits), expected)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from Energy import ALPHABETS, encode_hp, encode_hpab, encode_sequences, get_energy_hp_table, get_energy_hpab_table
+from Energy import get_energy_matrix, get_energy_mj_table, get_energy_whpab_table
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def reference_energy_matrix(sequence, energy_model):
+    # Pair by pair table lookups, MJ energies ranked -1 for the weakest distinct value down to -k
+    if energy_model == 'MJ':
+        table = get_energy_mj_table()
+        matrix = np.array([[table[a][b] for b in sequence] for a in sequence], dtype=float)
+        ranks = {energy: -1 - rank for rank, energy in enumerate(sorted(set(matrix.ravel()), reverse=True))}
+        return np.vectorize(ranks.get)(matrix).astype(float)
+    table = {'HP': get_energy_hp_table, 'HPAB': get_energy_hpab_table, 'WHPAB': get_energy_whpab_table}[energy_model]()
+    encoded = encode_hp(sequence) if energy_model == 'HP' else encode_hpab(sequence)
+    return np.array([[table[a + b] for b in encoded] for a in encoded], dtype=float)
+
+
+@pytest.mark.parametrize('energy_model', ['HP', 'HPAB', 'WHPAB', 'MJ'])
+def test_matches_pairwise_lookups(energy_model):
+    rng = np.random.default_rng(11)
+    for length in (1, 2, 7, 30):
+        sequence = ''.join(rng.choice(list(AMINO_ACIDS), size=length))
+        np.testing.assert_array_equal(get_energy_matrix(sequence, energy_model),
+                                      reference_energy_matrix(sequence, energy_model))
+
+
+def test_unknown_letters():
+    with pytest.raises(ValueError):
+        get_energy_matrix('YGGBM', 'MJ')
+    with pytest.raises(ValueError):
+        get_energy_matrix('YGGFM', 'XY')
+    # HP and HPAB put letters outside their classes in the last class
+    np.testing.assert_array_equal(get_energy_matrix('YGGBM', 'HP'), get_energy_matrix('YGGKM', 'HP'))
+    np.testing.assert_array_equal(get_energy_matrix('YGGBM', 'HPAB'), get_energy_matrix('YGGKM', 'HPAB'))
+
+
+def test_encoders_match_letter_classes():
+    sequence = AMINO_ACIDS + 'BXZ'
+    assert encode_hp(sequence) == ''.join('H' if letter in 'AGILMFPWV' else 'P' for letter in sequence)
+    assert encode_hpab(sequence) == ''.join('H' if letter in 'AGILMFPWV' else 'P' if letter in 'NQSTY'
+                                            else 'A' if letter in 'DE' else 'B' for letter in sequence)
+
+
+@pytest.mark.parametrize('energy_model', ['HP', 'HPAB', 'MJ'])
+def test_encode_sequences_streams_a_file(tmp_path, energy_model):
+    path = tmp_path / 'sequences.txt'
+    path.write_text('yggfm\n\n  GAAGA \nKLLKKV\n')
+    with open(path) as f:
+        encoded = list(encode_sequences(f, energy_model))
+    assert len(encoded) == 3
+    for (letters, codes), sequence in zip(encoded, ['YGGFM', 'GAAGA', 'KLLKKV']):
+        assert ''.join(ALPHABETS[energy_model][code] for code in codes) == letters
+        assert letters == {'HP': encode_hp, 'HPAB': encode_hpab, 'MJ': str}[energy_model](sequence)
+
+
+def test_encode_sequences_rejects_unknown_residues():
+    encoded = encode_sequences(['YGGFM', 'YGXFM'], 'HP')
+    assert next(encoded)[0] == 'PHHHH'
+    with pytest.raises(ValueError, match='Sequence 2'):
+        next(encoded)
@@ -0,0 +1,117 @@
+import itertools
+
+import dimod
+import numpy as np
+import pytest
+
+from BQM_Cache import get_build_mode
+from QUBO.BitOps_QUBO import ADDERS, And, Not, Num, Or, Var, Xnor, Xor, adder_scope, gate_count, gate_scope
+from QUBO.BitOps_QUBO import population_count, scope_gates
+
+TRUTH_TABLES = [(And, lambda a, b: a & b), (Or, lambda a, b: a | b), (Xor, lambda a, b: a ^ b),
+                (Xnor, lambda a, b: 1 - (a ^ b))]
+
+
+def value(polynomial, assignment):
+    return int(sum(coefficient * all(assignment[label] for label in monomial)
+               for monomial, coefficient in polynomial.monomials()))
+
+
+@pytest.mark.parametrize('gate, truth_table', TRUTH_TABLES)
+def test_gates_are_multilinear(gate, truth_table):
+    a, b = Var('test_a'), Var('test_b')
+    for bits in itertools.product([0, 1], repeat=2):
+        assignment = dict(zip(['test_a', 'test_b'], bits))
+        assert value(gate(a, b), assignment) == truth_table(*bits)
+    assert value(Not(a), {'test_a': 0}) == 1
+    # x * x = x keeps the output multilinear
+    assert And(a, a) is a and Xor(a, a) is Num(0)
+
+
+def test_gates_are_built_once_per_scope():
+    a, b, c = Var('test_a'), Var('test_b'), Var('test_c')
+    with gate_scope():
+        start = gate_count()
+        first = Or(And(a, b), c)
+        assert Or(c, And(b, a)) is first
+        assert gate_count() - start == 2
+        # Outputs above degree 1 become gate variables
+        assert first.degree() == 1 and len(scope_gates()) == 2
+        other = And(And(a, c), b)
+        assert len(scope_gates()) == 4
+        # Only the gates the given variables read, directly or through other gates, are kept
+        assert len(scope_gates(variable for term in first.terms for variable in term)) == 2
+        assert len(scope_gates(variable for term in other.terms for variable in term)) == 2
+        assert len(scope_gates(['test_a'])) == 0
+    # Outside a scope gates expand fully
+    assert Or(And(a, b), c).degree() == 3
+
+
+@pytest.mark.parametrize('adder', ADDERS)
+@pytest.mark.parametrize('num_bits', [1, 2, 3, 4, 6, 7])
+def test_population_count(adder, num_bits):
+    names = [f'test_{i}' for i in range(num_bits)]
+    with gate_scope(), adder_scope(adder):
+        count = population_count([Var(name) for name in names])
+        gates = scope_gates()
+    assert len(count) == num_bits
+
+    # Every assignment of the inputs counts its set bits once the gate variables follow their circuits
+    variables = names + gates.labels()
+    bits = np.array(list(itertools.product([0, 1], repeat=num_bits)), dtype=np.int8)
+    samples = gates.complete(np.hstack([bits, np.zeros((len(bits), len(gates)), dtype=np.int8)]), variables)
+    for row in samples.tolist():
+        assignment = dict(zip(variables, row))
+        assert sum(value(bit, assignment) << i for i, bit in enumerate(count)) == sum(row[:num_bits])
+
+
+def test_adders_build_apart():
+    # The adders build different gate variables, so their builds are cached separately
+    assert get_build_mode() != get_build_mode(adder='tree')
+    with pytest.raises(ValueError):
+        with adder_scope('ripple'):
+            pass
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_gate_penalties_hold_consistent_assignments(seed):
+    # Flipping a gate variable of a consistent assignment, alone or with gates that read it, raises the energy
+    rng = np.random.default_rng(seed)
+    with gate_scope():
+        nodes = [Var(f'q_{i}') for i in range(4)]
+        for _ in range(6):
+            a, b = rng.choice(len(nodes), 2, replace=False)
+            gate = [And, Or, Xor, Xnor][rng.integers(4)]
+            nodes.append(gate(nodes[a] if rng.random() < 0.7 else Not(nodes[a]), nodes[b]))
+        objective = Num(0)
+        for node in nodes[4:]:
+            objective = objective + node * float(rng.integers(-9, 10))
+        gates = scope_gates()
+
+    bqm = dimod.BinaryQuadraticModel(dimod.BINARY)
+    for term, coefficient in objective.terms.items():
+        if not term:
+            bqm.offset += coefficient
+        elif len(term) == 1:
+            bqm.add_linear(term[0], coefficient)
+        else:
+            bqm.add_quadratic(term[0], term[1], coefficient)
+    penalized = gates.penalize(bqm)
+
+    variables = list(penalized.variables)
+    samples = np.array(list(itertools.product([0, 1], repeat=len(variables))), dtype=np.int8)
+    consistent = np.unique(gates.complete(samples, variables), axis=0)
+    energies = penalized.energies((consistent, variables))
+    # Penalties vanish on consistent assignments
+    np.testing.assert_allclose(energies, bqm.energies((consistent, variables)))
+
+    indptr, terms, _ = gates.penalties
+    columns = [variables.index(label) for label in gates.labels()]
+    for gate, output in enumerate(gates.outputs.tolist()):
+        readers = [reader for reader in range(len(gates))
+                   if reader != gate and output in terms[indptr[reader]:indptr[reader + 1]]]
+        for count in range(len(readers) + 1):
+            for followers in itertools.combinations(readers, count):
+                moved = consistent.copy()
+                moved[:, [columns[index] for index in (gate,) + followers]] ^= 1
+                assert np.all(penalized.energies((moved, variables)) >= energies + 1)
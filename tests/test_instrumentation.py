@@ -0,0 +1,49 @@
+import json
+
+from BQM_Cache import BQMCache, get_bqm
+from Instrumentation import Profile, stage
+
+
+def stage_names(profile):
+    return [entry['stage'] for entry in profile.record['stages']]
+
+
+def test_build_stages(tmp_path):
+    cache = BQMCache(str(tmp_path / 'Cache'))
+    profile = Profile('YGGFM', lattice_type=4)
+    get_bqm('YGGFM', 'MJ', 4, cache=cache, profile=profile)
+    assert stage_names(profile) == ['cache_lookup', 'position_registers', 'interactions', 'overlap', 'back',
+                                    'compile', 'to_bqm', 'to_qubo', 'to_ising']
+    entries = {entry['stage']: entry for entry in profile.record['stages']}
+    assert entries['cache_lookup']['hit'] is False
+    assert entries['interactions']['circuits'] > 0 and entries['interactions']['gate_nodes'] > 0
+    assert entries['to_bqm']['variables'] == entries['to_bqm']['ancillas'] + 5
+    for entry in entries.values():
+        assert entry['seconds'] >= 0 and entry['peak_growth_bytes'] >= 0
+        assert entry['max_rss_bytes'] >= entry['rss_bytes'] > 0
+
+    # A cache hit skips the build stages
+    profile = Profile('YGGFM')
+    get_bqm('YGGFM', 'MJ', 4, cache=cache, profile=profile)
+    assert stage_names(profile) == ['cache_lookup']
+    assert profile.record['stages'][0]['hit'] is True
+
+
+def test_emit_appends_one_record(tmp_path):
+    path = tmp_path / 'profile.jsonl'
+    for name in ('first', 'second'):
+        profile = Profile(name, energy_model='MJ')
+        with profile.stage('work') as entry:
+            entry['items'] = 3
+        profile.emit(str(path))
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['name'] for record in records] == ['first', 'second']
+    assert records[0]['energy_model'] == 'MJ'
+    assert records[0]['stages'][0]['items'] == 3
+    assert records[0]['total_seconds'] == records[0]['stages'][0]['seconds']
+
+
+def test_no_profile_measures_nothing():
+    with stage(None, 'work') as entry:
+        entry['items'] = 3
+    assert entry == {'items': 3}
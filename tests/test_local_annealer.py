@@ -0,0 +1,84 @@
+import itertools
+
+import dimod
+import numpy as np
+import pytest
+
+from Annealer import annealer
+from Local_Annealer import LocalAnnealer, colour_variables, neighbour_lists
+from QUBO.Direct_BQM import compile_bqm, evaluate_energy_function, free_qubits, truth_table
+
+
+def brute_force_minimum(bqm):
+    variables = list(bqm.variables)
+    samples = np.array(list(itertools.product([0, 1], repeat=len(variables))), dtype=np.int8)
+    return bqm.energies((samples, variables)).min()
+
+
+def ground_energy(sequence, energy_model, lattice_type):
+    num_free = len(free_qubits(len(sequence), lattice_type))
+    return evaluate_energy_function(sequence, energy_model, lattice_type, truth_table(num_free, 0, 1 << num_free)).min()
+
+
+def test_finds_ground_state():
+    bqm = dimod.generators.gnp_random_bqm(14, 0.5, dimod.BINARY, random_state=3)
+    sampleset = LocalAnnealer().sample(bqm, num_reads=50, num_sweeps=500, seed=1)
+    assert len(sampleset) == 50
+    np.testing.assert_allclose(sampleset.record.energy, bqm.energies(sampleset))
+    assert sampleset.first.energy == pytest.approx(brute_force_minimum(bqm))
+
+
+def test_spin_models_get_spin_samples():
+    bqm = dimod.generators.gnp_random_bqm(12, 0.5, dimod.SPIN, random_state=8)
+    sampleset = LocalAnnealer().sample(bqm, num_reads=20, num_sweeps=300, seed=2)
+    assert sampleset.vartype is dimod.SPIN
+    assert set(np.unique(sampleset.record.sample)) <= {-1, 1}
+    np.testing.assert_allclose(sampleset.record.energy, bqm.energies(sampleset))
+    assert sampleset.first.energy == pytest.approx(bqm.energies(dimod.ExactSolver().sample(bqm)).min())
+
+
+def test_seed_reproduces_samples():
+    bqm = dimod.generators.gnp_random_bqm(10, 0.5, dimod.BINARY, random_state=4)
+    first = LocalAnnealer().sample(bqm, num_reads=5, num_sweeps=50, seed=7)
+    second = LocalAnnealer().sample(bqm, num_reads=5, num_sweeps=50, seed=7)
+    np.testing.assert_array_equal(first.record.sample, second.record.sample)
+
+
+def test_colour_classes_are_uncoupled():
+    bqm = dimod.generators.gnp_random_bqm(30, 0.3, dimod.BINARY, random_state=5)
+    _, (row, col, _), _ = bqm.to_numpy_vectors(variable_order=list(bqm.variables))
+    adjacency = np.zeros((30, 30), dtype=bool)
+    adjacency[row, col] = adjacency[col, row] = True
+    indptr, neighbours, _ = neighbour_lists(np.concatenate([row, col]), np.concatenate([col, row]),
+                                            np.ones(2 * len(row)), 30)
+    classes = colour_variables(indptr, neighbours)
+    assert sorted(np.concatenate(classes).tolist()) == list(range(30))
+    for colour_class in classes:
+        assert not adjacency[np.ix_(colour_class, colour_class)].any()
+
+
+def test_custom_schedule_needs_betas():
+    bqm = dimod.generators.gnp_random_bqm(4, 0.5, dimod.BINARY, random_state=6)
+    with pytest.raises(ValueError):
+        LocalAnnealer().sample(bqm, beta_schedule_type='custom')
+    sampleset = LocalAnnealer().sample(bqm, beta_schedule_type='custom', beta_schedule=[0.1, 1.0, 10.0])
+    assert sampleset.info['num_sweeps'] == 3
+
+
+def test_completed_samples_reach_ground_state():
+    # Scored with their gate variables completed, the reads of the penalized build reach the ground state
+    bqm, gates = compile_bqm('YGGF', 'MJ', 12)
+    samples = LocalAnnealer().sample(bqm, num_reads=50, num_sweeps=1000, seed=1)
+    variables = list(samples.variables)
+    completed = gates.complete(samples.record.sample, variables)
+    assert bqm.energies((completed, variables)).min() == pytest.approx(ground_energy('YGGF', 'MJ', 12))
+
+
+def test_local_annealer_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Results').mkdir()
+    bqm, gates = compile_bqm('YGGFM', 'MJ', 4)
+    samples = annealer(bqm, gates, sampler='local', num_reads=50, num_sweeps=500, seed=1)
+    assert samples.first.energy == pytest.approx(ground_energy('YGGFM', 'MJ', 4))
+    # main.py stores the samples once they are mapped back, annealer itself writes nothing
+    assert not list((tmp_path / 'Results').iterdir())
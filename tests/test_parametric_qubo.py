@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from QUBO import Parametric_QUBO
+from QUBO.Direct_BQM import consistent_energies, evaluate_energy_function, free_qubits, qubit_label, truth_table
+
+
+@pytest.mark.parametrize('lattice_type, energy_model, sequences', [
+    (4, 'MJ', ['YGGFM', 'GAAGA', 'KPPRW']), (4, 'HP', ['YGGFM', 'GAAGA', 'KPPRW']),
+    (12, 'HPAB', ['YGGF', 'GAAG', 'KPRW'])])
+def test_parametric_matches_energy_function(lattice_type, energy_model, sequences):
+    # Every sequence of a length is fed into one compiled model and scores like its own build
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequences[0]), lattice_type)]
+    bits = truth_table(len(labels), 0, 1 << len(labels))
+    for sequence in sequences:
+        bqm, gates = Parametric_QUBO.create_bqm(sequence, energy_model, lattice_type)
+        expected = evaluate_energy_function(sequence, energy_model, lattice_type, bits)
+        np.testing.assert_allclose(consistent_energies(bqm, gates, labels, bits), expected)
+
+
+def test_models_compile_once_per_length():
+    model = Parametric_QUBO.get_parametric_model(4, 5)
+    assert Parametric_QUBO.get_parametric_model(4, 5) is model
+    assert Parametric_QUBO.get_parametric_model(4, 5, shared_registers=True) is not model
@@ -0,0 +1,57 @@
+import dimod
+import numpy as np
+import pytest
+
+from Decoder import decode
+from Polish import polish
+from Results_Store import ResultsStore
+from QUBO.Direct_BQM import evaluate_energy_function, free_qubits, qubit_label, truth_table
+
+CASES = [(4, 'YGGFMQ', 'MJ'), (6, 'GAAGGA', 'HPAB'), (8, 'GAAGA', 'HP'), (12, 'YGGFM', 'MJ')]
+
+
+@pytest.mark.parametrize('lattice_type, sequence, energy_model', CASES)
+def test_polish_reaches_ground_state(lattice_type, sequence, energy_model):
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    bits = truth_table(len(labels), 0, 1 << len(labels))
+    _, feasible, energies = decode(bits, labels, sequence, energy_model, lattice_type)
+    ground = energies[feasible].min()
+
+    rng = np.random.default_rng(0)
+    samples = dimod.SampleSet.from_samples((rng.integers(0, 2, (200, len(labels))), labels), dimod.BINARY,
+                                           energy=0)
+    polished = polish(samples, sequence, energy_model, lattice_type)
+    assert polished.record.num_occurrences.sum() == 200
+
+    # Polished rows carry the true energies of their conformations
+    polished_bits = polished.record.sample[:, [polished.variables.index(label) for label in labels]]
+    _, polished_feasible, polished_energies = decode(polished_bits, labels, sequence, energy_model, lattice_type)
+    np.testing.assert_array_equal(polished.record.is_feasible, polished_feasible)
+    np.testing.assert_allclose(polished.record.contact_energy, polished_energies)
+    np.testing.assert_allclose(polished.record.energy[polished_feasible], polished_energies[polished_feasible])
+    np.testing.assert_allclose(evaluate_energy_function(sequence, energy_model, lattice_type,
+                                                        polished_bits[polished_feasible], True),
+                               polished_energies[polished_feasible])
+    assert polished_energies[polished_feasible].min() == pytest.approx(ground)
+
+
+def test_infeasible_rows_rank_after_feasible_ones(tmp_path):
+    # Folding back onto an amino fakes contacts below the ground state
+    sequence, energy_model, lattice_type = 'YGGFMQ', 'MJ', 4
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    bits = truth_table(len(labels), 0, 1 << len(labels))
+    _, feasible, energies = decode(bits, labels, sequence, energy_model, lattice_type)
+    assert energies[~feasible].min() < energies[feasible].min()
+
+    # Without sweeps polishing only replaces redundant move codes
+    polished = polish(dimod.SampleSet.from_samples((bits, labels), dimod.BINARY, energy=0), sequence,
+                      energy_model, lattice_type, max_sweeps=0)
+    record = polished.record
+    assert not record.is_feasible.all()
+    assert record.energy[~record.is_feasible].min() > record.energy[record.is_feasible].max()
+    assert record.contact_energy[~record.is_feasible].min() == pytest.approx(energies[~feasible].min())
+
+    store = ResultsStore(str(tmp_path))
+    store.save(polished, 'Polished', sequence=sequence)
+    entry = store.catalog()[0]
+    assert entry['best_energy'] == entry['best_feasible_energy'] == pytest.approx(energies[feasible].min())
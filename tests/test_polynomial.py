@@ -0,0 +1,51 @@
+import dimod
+import numpy as np
+import pytest
+
+from BQM_Cache import build_polynomial
+from Local_Annealer import LocalPolyAnnealer
+from QUBO.Direct_BQM import evaluate_energy_function, free_qubits, qubit_label, truth_table
+
+
+@pytest.mark.parametrize('direct', [False, True])
+@pytest.mark.parametrize('lattice_type, sequence, energy_model', [(4, 'YGGFM', 'MJ'), (6, 'GAAGA', 'HPAB'),
+                                                                  (8, 'AGHWK', 'MJ'), (12, 'YGGF', 'HP')])
+def test_polynomial_matches_energy_function(lattice_type, sequence, energy_model, direct):
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    bits = truth_table(len(labels), 0, 1 << len(labels))
+    polynomial = build_polynomial(sequence, energy_model, lattice_type, direct=direct)
+    # Only free qubits, no gate variables
+    assert set(polynomial.variables) <= set(labels)
+    columns = [labels.index(variable) for variable in polynomial.variables]
+    np.testing.assert_allclose(polynomial.energies((bits[:, columns], list(polynomial.variables))),
+                               evaluate_energy_function(sequence, energy_model, lattice_type, bits))
+
+
+def test_poly_annealer_finds_ground_state():
+    sequence = 'YGGFM'
+    polynomial = build_polynomial(sequence, 'MJ', 12, direct=True)
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), 12)]
+    ground = evaluate_energy_function(sequence, 'MJ', 12, truth_table(len(labels), 0, 1 << len(labels))).min()
+    samples = LocalPolyAnnealer().sample_poly(polynomial, num_reads=50, num_sweeps=500, seed=1)
+    assert samples.first.energy == pytest.approx(ground)
+    # Reported energies are the polynomial energies of the samples
+    np.testing.assert_allclose(polynomial.energies((samples.record.sample, samples.variables)),
+                               samples.record.energy)
+
+
+def test_poly_annealer_is_seeded():
+    polynomial = dimod.BinaryPolynomial({('a', 'b', 'c'): -3, ('a',): 1, ('b', 'c'): 1}, dimod.BINARY)
+    first = LocalPolyAnnealer().sample_poly(polynomial, num_reads=10, num_sweeps=20, seed=4)
+    second = LocalPolyAnnealer().sample_poly(polynomial, num_reads=10, num_sweeps=20, seed=4)
+    np.testing.assert_array_equal(first.record.sample, second.record.sample)
+    assert first.first.energy == -1
+
+
+def test_poly_annealer_keeps_spin_vartype():
+    polynomial = dimod.BinaryPolynomial({('a', 'b', 'c'): -3, ('a',): 1, ('b', 'c'): 1, (): 2}, dimod.SPIN)
+    samples = LocalPolyAnnealer().sample_poly(polynomial, num_reads=10, num_sweeps=50, seed=3)
+    assert samples.vartype is dimod.SPIN
+    assert set(np.unique(samples.record.sample)) <= {-1, 1}
+    np.testing.assert_allclose(polynomial.energies((samples.record.sample, samples.variables)),
+                               samples.record.energy)
+    assert samples.first.energy == -3
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from Lattices import move_table
+from QUBO import HCOMB4_QUBO, HCOMB6_QUBO, HCOMB8_QUBO, HCOMB12_QUBO
+from QUBO.Direct_BQM import evaluate_energy_function, free_qubits, move_codes, truth_table
+from QUBO.Pruning_Report import count_circuits
+
+
+def test_pruned_circuit_counts():
+    # GAAGAAG is all H: 10 contact and 6 overlap pairs, of which the odd and even separations remain
+    assert count_circuits('GAAGAAG', 'HP', HCOMB4_QUBO, 1) == (10, 6)
+    assert count_circuits('GAAGAAG', 'HP', HCOMB4_QUBO, HCOMB4_QUBO.PAIR_STEP) == (6, 4)
+    assert count_circuits('GAAGAAG', 'HP', HCOMB6_QUBO, HCOMB6_QUBO.PAIR_STEP) == (6, 4)
+    # HCOMB8 and HCOMB12 are not bipartite and keep every pair
+    assert HCOMB8_QUBO.PAIR_STEP == HCOMB12_QUBO.PAIR_STEP == 1
+
+
+@pytest.mark.parametrize('shared_registers', [False, True])
+@pytest.mark.parametrize('lattice_type, sequence', [(4, 'GAAGAAGA'), (6, 'GAAGAA')])
+def test_pruning_keeps_energies(lattice_type, sequence, shared_registers):
+    # Every self-avoiding walk keeps its energy, the skipped pairs can never touch or overlap
+    num_free = len(free_qubits(len(sequence), lattice_type))
+    bits = truth_table(num_free, 0, 1 << num_free)
+    vectors = move_table(lattice_type)[move_codes(bits, len(sequence), lattice_type)]
+    positions = np.concatenate([np.zeros((len(bits), 1, 3), dtype=np.int64), np.cumsum(vectors, axis=1)], axis=1)
+    feasible = np.array([len(np.unique(walk, axis=0)) == len(sequence) for walk in positions])
+
+    # HP contacts are negative and the penalty outweighs them all, so the penalized walks are the positive
+    # ones. The penalty scales with the number of contact pairs, so only unpenalized energies compare
+    pruned = evaluate_energy_function(sequence, 'HP', lattice_type, bits, shared_registers)
+    full = evaluate_energy_function(sequence, 'HP', lattice_type, bits, shared_registers, pair_step=1)
+    np.testing.assert_array_equal(pruned > 0, full > 0)
+    assert np.all(pruned[~feasible] > 0)
+    scored = feasible & (pruned <= 0)
+    assert scored.any()
+    np.testing.assert_allclose(pruned[scored], full[scored])
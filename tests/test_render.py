@@ -0,0 +1,37 @@
+import os
+
+import dimod
+import matplotlib
+import numpy as np
+import pytest
+
+from QUBO.Direct_BQM import free_qubits, qubit_label
+from Sample_Analysis import sample_analysis
+from Visualize import render_conformations, visualize
+
+matplotlib.use('Agg')
+
+
+def random_samples(sequence, lattice_type, num_samples=20):
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    rng = np.random.default_rng(0)
+    return dimod.SampleSet.from_samples((rng.integers(0, 2, (num_samples, len(labels))), labels), dimod.BINARY,
+                                        energy=rng.normal(size=num_samples))
+
+
+@pytest.mark.parametrize('lattice_type, image_format', [(4, 'png'), (12, 'svg')])
+def test_render_conformations(tmp_path, lattice_type, image_format):
+    samples = random_samples('YGGFM', lattice_type)
+    paths = render_conformations(samples, 'YGGFM', 'MJ', lattice_type, str(tmp_path / 'frames'), top_k=3,
+                                 image_format=image_format, workers=2)
+    assert [os.path.basename(path) for path in paths] == [f'YGGFM_HCOMB{lattice_type}_{rank:03d}.{image_format}'
+                                                          for rank in range(3)]
+    assert all(os.path.getsize(path) > 0 for path in paths)
+
+
+def test_headless_plots(tmp_path):
+    samples = random_samples('YGGFM', 4)
+    visualize('YGGFM', 'MJ', 4, '0' * len(samples.variables), str(tmp_path / 'fold.png'))
+    sample_analysis(samples, top_k=5, output_directory=str(tmp_path / 'analysis'))
+    assert sorted(os.listdir(tmp_path)) == ['analysis', 'fold.png']
+    assert sorted(os.listdir(tmp_path / 'analysis')) == ['energies.png', 'occurrences.png']
@@ -0,0 +1,62 @@
+import dimod
+import numpy as np
+import pytest
+
+from Results_Store import ResultsStore, load_samples
+
+
+def random_samples(vartype, num_rows=50, num_variables=19, seed=0):
+    rng = np.random.default_rng(seed)
+    values = np.array(sorted(vartype.value))
+    samples = values[rng.integers(2, size=(num_rows, num_variables))]
+    variables = [f'q_{i}_0' for i in range(num_variables)]
+    return dimod.SampleSet.from_samples((samples, variables), vartype, energy=rng.normal(size=num_rows),
+                                        num_occurrences=rng.integers(1, 5, size=num_rows),
+                                        is_feasible=rng.random(num_rows) < 0.5)
+
+
+def sorted_rows(sampleset):
+    order = np.argsort(sampleset.record.energy, kind='stable')
+    return sampleset.record[order]
+
+
+@pytest.mark.parametrize('vartype', [dimod.BINARY, dimod.SPIN])
+def test_round_trip(tmp_path, vartype):
+    samples = random_samples(vartype)
+    store = ResultsStore(str(tmp_path))
+    run_id = store.save(samples, sequence='YGGFM', lattice_type=12)
+
+    loaded = store.load(run_id)
+    assert loaded.vartype is vartype
+    assert list(loaded.variables) == list(samples.variables)
+    expected = sorted_rows(samples)
+    for field in ('sample', 'energy', 'num_occurrences', 'is_feasible'):
+        np.testing.assert_array_equal(loaded.record[field], expected[field])
+
+    top = store.load(run_id, top_k=5)
+    np.testing.assert_array_equal(top.record.sample, expected.sample[:5])
+    np.testing.assert_array_equal(load_samples(str(tmp_path / run_id), top_k=5).record.energy, expected.energy[:5])
+
+
+def test_catalog(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    samples = random_samples(dimod.BINARY)
+    first = store.save(samples, sequence='YGGFM', lattice_type=12)
+    second = store.save(samples, name='Polished', sequence='YGGFM', lattice_type=4)
+
+    assert [record['run_id'] for record in store.catalog()] == [first, second]
+    record, = store.catalog(lattice_type=12)
+    assert record['run_id'] == first
+    assert record['rows'] == len(samples)
+    assert record['samples'] == samples.record.num_occurrences.sum()
+    assert record['best_energy'] == samples.record.energy.min()
+    feasible = samples.record.is_feasible
+    assert record['feasible_rows'] == feasible.sum()
+    assert record['best_feasible_energy'] == samples.record.energy[feasible].min()
+    assert store.catalog(name='Polished', sequence='YGGFM')[0]['run_id'] == second
+    assert store.catalog(sequence='GAAGA') == []
+
+
+def test_legacy_pickles_load():
+    samples = load_samples('Results/Samples_1731334129.pkl')
+    assert isinstance(samples, dimod.SampleSet) and len(samples.variables) == 22
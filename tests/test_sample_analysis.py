@@ -0,0 +1,44 @@
+from collections import Counter
+
+import dimod
+import matplotlib
+import numpy as np
+
+from QUBO.Direct_BQM import is_ancilla
+from Results_Store import load_samples
+from Sample_Analysis import sample_analysis
+
+matplotlib.use('Agg')
+
+
+def test_summary_matches_reference():
+    rng = np.random.default_rng(0)
+    variables = ['q_0a', 'q_0b', 'q_0a * q_0b', 'q_1a', 'q_1b', 'q_2a', 'q_2b', 'q_3a', 'q_3b', 'q_4a']
+    samples = dimod.SampleSet.from_samples((rng.integers(0, 2, (500, len(variables))), variables), dimod.BINARY,
+                                           energy=rng.integers(-5, 5, 500), num_occurrences=rng.integers(1, 4, 500))
+    summary = sample_analysis(samples, top_k=5)
+
+    # Occurrences add up over the rows of a bitstring, which keeps its lowest energy
+    occurrences, energies = Counter(), {}
+    qubits = [samples.variables.index(var) for var in samples.variables if '*' not in var]
+    for row, energy, count in zip(samples.record.sample, samples.record.energy, samples.record.num_occurrences):
+        bitstring = ''.join(str(bit) for bit in row[qubits])
+        occurrences[bitstring] += count
+        energies[bitstring] = min(energy, energies.get(bitstring, np.inf))
+
+    assert summary['samples'] == sum(occurrences.values())
+    assert summary['distinct'] == len(occurrences)
+    assert [count for _, count, _ in summary['most_frequent']] == sorted(occurrences.values(), reverse=True)[:5]
+    assert [energy for _, _, energy in summary['lowest_energy']] == sorted(energies.values())[:5]
+    for bitstring, count, energy in summary['most_frequent'] + summary['lowest_energy']:
+        assert occurrences[bitstring] == count and energies[bitstring] == energy
+
+
+def test_legacy_pickle_drops_ancillas():
+    # Older runs only have pyqubo product ancillas such as 'q_0c * q_1a', which read like qubit labels
+    samples = load_samples('Results/Samples_1731334129.pkl')
+    ancillas = [var for var in samples.variables if is_ancilla(var)]
+    assert len(ancillas) == 15 and all('*' in var for var in ancillas)
+
+    summary = sample_analysis(samples, top_k=3)
+    assert {len(bitstring) for bitstring, _, _ in summary['most_frequent']} == {7}
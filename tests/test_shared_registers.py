@@ -0,0 +1,63 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from Energy import get_energy_matrix
+from QUBO import HCOMB4_QUBO, HCOMB6_QUBO
+
+# Move vectors by move code and preset qubits of the builders, from their module docstrings
+LATTICES = {
+    4: (HCOMB4_QUBO, 2, {0b01: (1, 0, 0), 0b10: (-1, 0, 0), 0b11: (0, 1, 0), 0b00: (0, -1, 0)},
+        {(0, 0): 0, (0, 1): 1, (1, 1): 1}),
+    6: (HCOMB6_QUBO, 3, {0b000: (1, 0, 0), 0b001: (-1, 0, 0), 0b010: (0, 1, 0), 0b011: (0, -1, 0),
+                         0b100: (0, 0, 1), 0b101: (0, 0, -1)},
+        {(0, 0): 0, (0, 1): 0, (0, 2): 0, (1, 1): 0, (1, 2): 0}),
+}
+
+
+def consistent_energy(bqm, gates, values):
+    # Energy with every gate variable at the value of its circuit and every pyqubo ancilla 'a * b' set to
+    # the product of the variables it stands for
+    variables = list(bqm.variables)
+    sample = gates.complete([[values.get(variable, 0) for variable in variables]], variables)[0]
+    sample = dict(zip(variables, sample.tolist()))
+    for variable in variables:
+        if '*' in variable:
+            sample[variable] = int(all(sample[label] for label in variable.split(' * ')))
+    return bqm.energy(sample)
+
+
+def conformation_energy(sequence, energy_model, moves):
+    # Contact energy of a self-avoiding walk, None for an invalid move or a collision
+    if any(move is None for move in moves):
+        return None
+    positions = np.vstack([np.zeros(3, dtype=int), np.cumsum(moves, axis=0)])
+    if len({tuple(position) for position in positions}) < len(positions):
+        return None
+    energy_matrix = get_energy_matrix(sequence, energy_model)
+    return sum(energy_matrix[amino1][amino2] for amino1, amino2 in itertools.combinations(range(len(sequence)), 2)
+               if amino2 - amino1 > 1 and np.abs(positions[amino2] - positions[amino1]).sum() == 1)
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6])
+def test_shared_registers_score_every_walk(lattice_type):
+    sequence, energy_model = 'LKKLL', 'HP'
+    builder, qubits, vectors, presets = LATTICES[lattice_type]
+    _, bqm, _, _, gates = builder.create_energy_function(sequence, energy_model, shared_registers=True)
+
+    free = [(t, q) for t in range(len(sequence) - 1) for q in range(qubits) if (t, q) not in presets]
+    for bits in itertools.product([0, 1], repeat=len(free)):
+        codes = dict(presets)
+        codes.update(zip(free, bits))
+        values = {f'q_{t}{chr(ord("a") + q)}': bit for (t, q), bit in codes.items()}
+        moves = [vectors.get(int(''.join(str(codes[(t, q)]) for q in range(qubits)), 2))
+                 for t in range(len(sequence) - 1)]
+
+        # Feasible walks score their exact contact energy, every other walk is penalized above them
+        expected = conformation_energy(sequence, energy_model, moves)
+        energy = consistent_energy(bqm, gates, values)
+        if expected is None:
+            assert energy > 0
+        else:
+            assert energy == pytest.approx(expected)
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from BQM_Cache import get_bqm
+from QUBO.Direct_BQM import consistent_energies, evaluate_energy_function, free_qubits, qubit_label, truth_table
+
+
+@pytest.mark.parametrize('shared_registers', [False, True])
+@pytest.mark.parametrize('lattice_type, sequence, energy_model',
+                         [(4, 'YGGFM', 'MJ'), (6, 'GAAGA', 'HPAB'), (8, 'AGHWK', 'MJ'), (12, 'YGGF', 'HP')])
+def test_signed_builds_are_exact(lattice_type, sequence, energy_model, shared_registers):
+    # The signed counters compare displacements exactly, like the shared register build
+    labels = [qubit_label(t, q) for t, q in free_qubits(len(sequence), lattice_type)]
+    bits = truth_table(len(labels), 0, 1 << len(labels))
+    bqm, gates = get_bqm(sequence, energy_model, lattice_type, shared_registers, signed_displacements=True)
+    np.testing.assert_allclose(consistent_energies(bqm, gates, labels, bits),
+                               evaluate_energy_function(sequence, energy_model, lattice_type, bits, True))
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from Decoder import lattice_positions
+from Lattices import neighbour_offsets
+from QUBO.Direct_BQM import free_qubits
+from Visualize import cartesian_coordinates
+
+
+@pytest.mark.parametrize('lattice_type', [4, 6, 8, 12])
+@pytest.mark.parametrize('num_amino', [5, 7])
+def test_coordinates_have_unit_bonds(lattice_type, num_amino):
+    rng = np.random.default_rng(lattice_type)
+    bits = rng.integers(0, 2, (300, len(free_qubits(num_amino, lattice_type))), dtype=np.uint8)
+    coordinates = cartesian_coordinates(bits, lattice_type)
+    assert coordinates.shape == (300, num_amino, 3)
+    np.testing.assert_array_equal(coordinates[:, 0], 0)
+    if lattice_type == 4:
+        np.testing.assert_array_equal(coordinates[..., 2], 0)
+
+    # Real moves are unit bonds, and aminos touch in space exactly when they are lattice neighbours
+    positions, valid_moves = lattice_positions(bits, num_amino, lattice_type)
+    bonds = np.linalg.norm(np.diff(coordinates[valid_moves], axis=1), axis=-1)
+    np.testing.assert_allclose(bonds, 1)
+    distances = np.linalg.norm(coordinates[:, :, None] - coordinates[:, None], axis=-1)
+    displacements = positions[:, :, None, None] - positions[:, None, :, None]
+    neighbours = (displacements == neighbour_offsets(lattice_type)).all(axis=-1).any(axis=-1)
+    np.testing.assert_array_equal(np.isclose(distances, 1)[valid_moves], neighbours[valid_moves])